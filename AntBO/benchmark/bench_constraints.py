@@ -0,0 +1,43 @@
+"""
+Wall time of the CDRH3 constraint checks, per-sequence `check_constraint_satisfaction` (timed on a subset and
+extrapolated) versus the batched `check_constraint_violations_batch` on the whole (N, L) array.
+
+python benchmark/bench_constraints.py --n_seqs 1000000 --seq_len 11
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_PROJECT = str(Path(os.path.realpath(__file__)).parent.parent)
+sys.path.insert(0, ROOT_PROJECT)
+
+from utilities.constraint_utils import check_constraint_satisfaction, check_constraint_violations_batch
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_seqs', type=int, default=1000000)
+    parser.add_argument('--seq_len', type=int, default=11)
+    parser.add_argument('--n_loop', type=int, default=20000, help='number of sequences checked one at a time')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    x = np.random.RandomState(args.seed).randint(0, 20, (args.n_seqs, args.seq_len))
+
+    t0 = time.time()
+    violations = check_constraint_violations_batch(x)
+    t_batch = time.time() - t0
+
+    n_loop = min(args.n_loop, args.n_seqs)
+    t0 = time.time()
+    satisfied = np.array([check_constraint_satisfaction(seq) for seq in x[:n_loop]])
+    t_loop = (time.time() - t0) * args.n_seqs / n_loop
+
+    assert np.array_equal(satisfied, np.logical_not(violations[:n_loop].any(axis=1)))
+    print(f"{args.n_seqs} sequences of length {args.seq_len}: batched {t_batch:.2f}s, "
+          f"per sequence {t_loop:.2f}s (extrapolated from {n_loop}), speed-up x{t_loop / t_batch:.0f}")
+    print(f"violation rates (run length, charge, N-glycosylation): {np.round(violations.mean(axis=0), 4).tolist()}, "
+          f"feasible {np.logical_not(violations.any(axis=1)).mean():.4f}")
@@ -1,5 +1,7 @@
 # Implementation of various kernels
 
+import inspect
+
 from gpytorch.kernels import Kernel
 from gpytorch.kernels.matern_kernel import MaternKernel
 from gpytorch.kernels.rbf_kernel import RBFKernel
@@ -7,6 +9,12 @@ from gpytorch.constraints import Interval
 import torch
 import numpy as np
 from torch import Tensor
+from torch.utils.checkpoint import checkpoint
+
+
+# non-reentrant checkpointing (torch >= 1.11), the reentrant variant of older versions is used otherwise, it only
+# propagates gradients to the tensors passed explicitly to the checkpointed function
+CHECKPOINT_KWARGS = {'use_reentrant': False} if 'use_reentrant' in inspect.signature(checkpoint).parameters else {}
 
 
 def wrap(x1, x2, integer_dims):
@@ -183,7 +191,7 @@ class FastStringKernel(Kernel):
     """
 
     def __init__(self, seq_length: int, alphabet_size: int, gap_decay=.5, match_decay=.8,
-                 max_subsequence_length: int = 3, normalize=True, **kwargs):
+                 max_subsequence_length: int = 3, normalize=True, max_memory: int = 2 ** 28, **kwargs):
         super(FastStringKernel, self).__init__(has_lengthscale=False, **kwargs)
 
         self.register_parameter(name='match_decay', parameter=torch.nn.Parameter(torch.tensor(match_decay)))
@@ -196,6 +204,8 @@ class FastStringKernel(Kernel):
         self.maxlen = seq_length
         self.alphabet_size = alphabet_size
         self.normalize = normalize
+        # approximate number of bytes allocated by one block of pairwise kernel evaluations
+        self.max_memory = max_memory
 
         self.tril = torch.triu(torch.ones((self.maxlen, self.maxlen), dtype=torch.double), diagonal=1).to(
             kwargs['device'])
@@ -203,6 +213,12 @@ class FastStringKernel(Kernel):
         for i in range(self.maxlen - 1):
             self.exp[i, i + 1:] = torch.arange(self.maxlen - i - 1)
 
+        # caches valid for the hyperparameters in `_cache_key`, only used when no gradient is required
+        self._cache_key = None
+        self._D = None
+        self._self_k = {}  # sequence bytes -> unnormalised k(x, x)
+        self._gram = None  # (X, unnormalised Gram of X) of the last symmetric call
+
     def K_diag(self, X: Tensor):
         r"""
         The diagonal elements of the string kernel are always unity (due to normalisation)
@@ -214,101 +230,155 @@ class FastStringKernel(Kernel):
         Vectorized kernel calc.
         Following notation from Beck (2017), i.e have tensors S,D,Kpp,Kp
         Input is two tensors of shape (# strings , # characters)
-        and we calc the pair-wise kernel calcs between the elements (i.e n kern calcs for two lists of length n)
-        D is the tensor than unrolls the recursion and allows vecotrizaiton
-        """
+        D is the tensor than unrolls the recursion and allows vectorization
 
-        # Turn our inputs into lists of integers using one-hot embedding
-        # first split up strings and pad to fixed length and prep for gpu
-        # pad until all have length of self.maxlen
-        if diag:
-            raise ValueError()
+        Pairs of strings are evaluated in blocks of about `max_memory` bytes (recomputed block by block in the
+        backward pass). When no gradient is required, the self-kernels used for the normalisation and the Gram matrix
+        of the last symmetric call are cached, so that predictions do not recompute the training terms and appending
+        rows to the training data only requires the new rows of the Gram matrix.
+        """
         if X2 is None:
             X2 = X1
-            self.symmetric = True
-        else:
-            self.symmetric = False
-        # keep track of original input sizes
-        X1_shape = X1.shape[0]
-        X2_shape = X2.shape[0]
-
-        # prep the decay tensor D
-        self.D = self._precalc().to(X1)
-
-        # turn into one-hot  i.e. shape (# strings, #characters+1, alphabet size)
-        X1 = torch.nn.functional.one_hot(X1.to(int), self.alphabet_size).to(X1)
-        X2 = torch.nn.functional.one_hot(X2.to(int), self.alphabet_size).to(X2)
-
-        # get indicies of all possible pairings from X and X2
-        # this way allows maximum number of kernel calcs to be squished onto the GPU (rather than just doing individual rows of gram)
-        indicies_2, indicies_1 = torch.meshgrid(torch.arange(0, X2.shape[0]), torch.arange(0, X1.shape[0]))
-        indicies = torch.cat([torch.reshape(indicies_1.T, (-1, 1)), torch.reshape(indicies_2.T, (-1, 1))], axis=1)
-
-        # if symmetric then only calc upper matrix (fill in rest later)
-        if self.symmetric:
-            indicies = indicies[indicies[:, 1] >= indicies[:, 0]]
-
-        X1_full = torch.repeat_interleave(X1.unsqueeze(0), len(indicies), dim=0)[
-            np.arange(len(indicies)), indicies[:, 0]]
-        X2_full = torch.repeat_interleave(X2.unsqueeze(0), len(indicies), dim=0)[
-            np.arange(len(indicies)), indicies[:, 1]]
+        symmetric = X1 is X2 or (X1.shape == X2.shape and torch.equal(X1, X2))
+        use_cache = self._use_cache()
+        D = self._get_D(use_cache).to(X1)
 
-        if not self.symmetric:
-            # also need to calculate some extra kernel evals for the normalization terms
-            X1_full = torch.cat([X1_full, X1, X2], 0)
-            X2_full = torch.cat([X2_full, X1, X2], 0)
-
-        # Make S: the similarity tensor of shape (# strings, #characters, # characters)
-        S = torch.matmul(X1_full, torch.transpose(X2_full, 1, 2))
+        if diag:
+            if symmetric:
+                return torch.ones(X1.shape[0]).to(D)
+            k = self._k_paired(X1, X2, D)
+            return k / torch.sqrt(self._k_self(X1, D, use_cache) * self._k_self(X2, D, use_cache))
 
+        if symmetric:
+            k_results = self._k_gram(X1, D, use_cache)
+            X_diag_Ks = torch.diag(k_results)
+            X2_diag_Ks = X_diag_Ks
+        else:
+            k_results = self._k_cross(X1, X2, D)
+            X_diag_Ks = self._k_self(X1, D, use_cache)
+            X2_diag_Ks = self._k_self(X2, D, use_cache)
+
+        # normalise
+        norm = torch.matmul(X_diag_Ks[:, None], X2_diag_Ks[None, :])
+        return torch.divide(k_results, torch.sqrt(norm))
+
+    def _requires_grad(self):
+        return torch.is_grad_enabled() and (self.match_decay.requires_grad or self.gap_decay.requires_grad)
+
+    def _use_cache(self):
+        if self._requires_grad():
+            return False
+        key = (self.match_decay.item(), self.gap_decay.item())
+        if key != self._cache_key:
+            self._cache_key = key
+            self._D = None
+            self._self_k = {}
+            self._gram = None
+        return True
+
+    def _get_D(self, use_cache):
+        if not use_cache:
+            return self._precalc()
+        if self._D is None:
+            self._D = self._precalc()
+        return self._D
+
+    def _block_size(self, D):
+        """Number of string pairs evaluated at once so that a block takes about `max_memory` bytes."""
+        tensors_per_pair = 2 * self.max_subsequence_length + 2
+        return max(1, self.max_memory // (tensors_per_pair * self.maxlen ** 2 * D.element_size()))
+
+    def _k_from_S(self, S, D, match_decay):
+        """Unnormalised kernel from the similarity tensor S of shape (..., # characters, # characters)."""
         # store squared match coef
-        match_sq = self.match_decay ** 2
+        match_sq = match_decay ** 2
 
-        Kp = torch.ones(*[S.shape[0], self.maxlen, self.maxlen]).to(S)
+        Kp = torch.ones_like(S)
 
         # do all remaining steps
-        for i in torch.arange(self.max_subsequence_length - 1):
+        for i in range(self.max_subsequence_length - 1):
             Kp = torch.multiply(S, Kp)
             Kp = match_sq * Kp
-            Kp = torch.matmul(Kp, self.D)
-            Kp = torch.matmul(self.D.T, Kp)
+            Kp = torch.matmul(Kp, D)
+            Kp = torch.matmul(D.T, Kp)
 
         # final kernel calc
         Kp = torch.multiply(S, Kp)
-        k = Kp.sum((-2, -1)).unsqueeze(1) * match_sq
-
-        # put results into the right places in the gram matrix and normalize
-        if self.symmetric:
-            # if symmetric then only put in top triangle (inc diag)
-            mask = torch.triu(torch.ones((X1_shape, X2_shape)), 0).to(S)
-            non_zero = mask > 0
-            k_results = torch.zeros((X1_shape, X2_shape)).to(S)
-            k_results[non_zero] = k.squeeze()
-            # add in mising elements (lower diagonal)
-            k_results = k_results + k_results.T - torch.diag(k_results.diag())
-
-            # normalise
-            X_diag_Ks = torch.diag(k_results)
-            norm = torch.matmul(X_diag_Ks[:, None], X_diag_Ks[None, :])
-            k_results = torch.divide(k_results, torch.sqrt(norm))
-        else:
-            # otherwise can just reshape into gram matrix
-            # but first take extra kernel calcs off end of k
-
-            # COULD SPEED THIS UP FOR PREDICTIONS, AS MANY NORM TERMS ALREADY IN GRAM
-
-            X_diag_Ks = k[X1_shape * X2_shape:X1_shape * X2_shape + X1_shape].flatten()
-
-            X2_diag_Ks = k[-X2_shape:].flatten()
-
-            k = k[0:X1_shape * X2_shape]
-            k_results = k.reshape(X1_shape, X2_shape)
-
-            # normalise
-            norm = torch.matmul(X_diag_Ks[:, None], X2_diag_Ks[None, :])
-            k_results = torch.divide(k_results, torch.sqrt(norm))
-
-        return k_results
+        return Kp.sum((-2, -1)) * match_sq
+
+    def _k_block(self, X1, X2, D, match_decay):
+        # S[i, j, l, m] = 1 if character l of X1[i] is character m of X2[j]
+        S = (X1.to(int)[:, None, :, None] == X2.to(int)[None, :, None, :]).to(D)
+        return self._k_from_S(S, D, match_decay)
+
+    def _k_block_paired(self, X1, X2, D, match_decay):
+        S = (X1.to(int)[:, :, None] == X2.to(int)[:, None, :]).to(D)
+        return self._k_from_S(S, D, match_decay)
+
+    def _checkpointed(self, fn, X1, X2, D):
+        # the hyperparameters are passed explicitly, the reentrant checkpoint ignores the ones captured by `fn`
+        if self._requires_grad():
+            # only keep the block inputs for the backward pass so that memory stays bounded in training as well
+            return checkpoint(fn, X1, X2, D, self.match_decay, **CHECKPOINT_KWARGS)
+        return fn(X1, X2, D, self.match_decay)
+
+    def _k_cross(self, X1, X2, D):
+        """Unnormalised Gram matrix between X1 and X2 computed block by block."""
+        if X1.shape[0] == 0 or X2.shape[0] == 0:
+            return torch.zeros(X1.shape[0], X2.shape[0]).to(D)
+        block = self._block_size(D)
+        cols = min(X2.shape[0], block)
+        rows = max(1, block // cols)
+        return torch.cat([
+            torch.cat([self._checkpointed(self._k_block, X1[i:i + rows], X2[j:j + cols], D)
+                       for j in range(0, X2.shape[0], cols)], 1)
+            for i in range(0, X1.shape[0], rows)], 0)
+
+    def _k_paired(self, X1, X2, D):
+        """Unnormalised k(X1[i], X2[i]) for all i."""
+        block = self._block_size(D)
+        return torch.cat([self._checkpointed(self._k_block_paired, X1[i:i + block], X2[i:i + block], D)
+                          for i in range(0, X1.shape[0], block)])
+
+    def _k_gram(self, X, D, use_cache):
+        """Unnormalised symmetric Gram matrix of X, only the rows appended to the cached X are computed."""
+        n, n_old = X.shape[0], 0
+        if use_cache and self._gram is not None:
+            X_old, K_old = self._gram
+            if X_old.shape[0] <= n and torch.equal(X[:X_old.shape[0]], X_old.to(X)):
+                n_old = X_old.shape[0]
+
+        # new rows against the old rows and upper triangle (inc diag) of the new rows
+        rows = max(1, self._block_size(D) // n)
+        K_new = []
+        for i in range(n_old, n, rows):
+            X_rows = X[i:i + rows]
+            K_new.append(torch.cat([self._k_cross(X_rows, X[:n_old], D),
+                                    torch.zeros(X_rows.shape[0], i - n_old).to(D),
+                                    self._k_cross(X_rows, X[i:], D)], 1))
+        K_new = torch.cat(K_new, 0) if len(K_new) > 0 else torch.zeros(0, n).to(D)
+        # add in missing elements (lower diagonal)
+        K_new_new = torch.triu(K_new[:, n_old:])
+        K_new = torch.cat([K_new[:, :n_old], K_new_new + torch.triu(K_new_new, 1).T], 1)
+        K = torch.cat([torch.cat([K_old.to(D), K_new[:, :n_old].T], 1), K_new], 0) if n_old > 0 else K_new
+
+        if use_cache:
+            self._gram = (X.detach().clone(), K.detach())
+            self._self_k.update(zip(self._keys(X[n_old:]), K_new_new.diag().tolist()))
+        return K
+
+    def _keys(self, X):
+        return [row.tobytes() for row in X.detach().to(int).cpu().numpy()]
+
+    def _k_self(self, X, D, use_cache):
+        """Unnormalised k(x, x) of the rows of X, the cached values are reused."""
+        if not use_cache:
+            return self._k_paired(X, X, D)
+        keys = self._keys(X)
+        missing = [i for i, key in enumerate(keys) if key not in self._self_k]
+        if len(missing) > 0:
+            self._self_k.update(zip([keys[i] for i in missing], self._k_paired(X[missing], X[missing], D).tolist()))
+        return torch.tensor([self._self_k[key] for key in keys], dtype=torch.double).to(D)
 
     def _precalc(self):
         r"""
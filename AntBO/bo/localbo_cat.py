@@ -10,7 +10,8 @@ from sklearn.preprocessing import power_transform
 from torch.distributions import Normal
 
 from bo.gp import train_gp
-from bo.localbo_utils import random_sample_within_discrete_tr_ordinal
+from bo.localbo_utils import sample_within_discrete_tr_ordinal_batch, greedy_batch_argmin
+from utilities.constraint_utils import check_constraint_violations_batch
 
 
 def hebo_transform(X):
@@ -263,13 +264,22 @@ class CASMOPOLITANCat:
 
         x_center = X[fX.argmin().item(), :][None, :]
 
-        def thompson(n_cand=5000):
+        # `self.n_cand` defaults to 100 * dim for the other acquisition optimisers, Thompson sampling keeps its own
+        # default of 5000 candidates unless `n_cand` is given
+        def thompson(n_cand=self.kwargs.get('n_cand', 5000)):
             """Thompson sampling"""
-            # Generate n_cand of candidates
-            X_cand = np.array([
-                random_sample_within_discrete_tr_ordinal(x_center[0], length, self.config)
-                for _ in range(n_cand)
-            ])
+            # Generate n_cand of candidates, unique and satisfying the CDR constraints
+            X_cand = np.unique(sample_within_discrete_tr_ordinal_batch(x_center[0], length, self.config, n_cand),
+                               axis=0)
+            feasible = np.ones(len(X_cand), dtype=bool)
+            if self.cdr_constraints:
+                feasible = np.logical_not(check_constraint_violations_batch(X_cand).any(axis=1))
+                if feasible.sum() >= self.batch_size:
+                    X_cand, feasible = X_cand[feasible], feasible[feasible]
+            if len(X_cand) < self.batch_size:
+                # fewer distinct sequences than the batch size in the trust region, some are repeated
+                repeated = np.random.randint(len(X_cand), size=self.batch_size - len(X_cand))
+                X_cand, feasible = np.concatenate([X_cand, X_cand[repeated]]), np.concatenate([feasible, feasible[repeated]])
             with torch.no_grad(), gpytorch.settings.max_cholesky_size(self.max_cholesky_size):
                 X_cand_torch = torch.tensor(X_cand, dtype=torch.float32)
                 y_cand = gp.likelihood(gp(X_cand_torch)).sample(
@@ -277,14 +287,12 @@ class CASMOPOLITANCat:
             # Revert the normalization process
             # y_cand = mu + sigma * y_cand
 
-            # Select the best candidates
-            X_next = np.ones((self.batch_size, self.dim))
-            y_next = np.ones((self.batch_size, 1))
-            for i in range(self.batch_size):
-                indbest = np.argmin(y_cand[:, i])
-                X_next[i, :] = deepcopy(X_cand[indbest, :])
-                y_next[i, :] = deepcopy(y_cand[indbest, i])
-                y_cand[indbest, :] = np.inf
+            # Select the best candidates, infeasible candidates (only kept when there are not enough feasible ones)
+            # are ranked after all the feasible ones
+            y_rank = y_cand + np.logical_not(feasible)[:, None] * (np.ptp(y_cand) + 1)
+            selected = greedy_batch_argmin(y_rank, self.batch_size)
+            X_next = X_cand[selected].astype(float)
+            y_next = y_cand[selected, np.arange(len(selected))].reshape(-1, 1)
             return X_next, y_next
 
         def _mace(X, augmented=False, eps=1e-4, maximise=True, kappa=2.0):
@@ -6,6 +6,7 @@ from copy import deepcopy
 
 from bo.bo_utils import check_cdr_constraints, idx_to_AA, N_glycosylation_pattern
 from bo.kernels import *
+from utilities.constraint_utils import check_constraint_violations_batch
 import re
 
 
@@ -44,6 +45,16 @@ def check_cdr_constraints_all(x, x_center_local=None, hamming=None, config=None)
     return int(not (c1)), int(not (c2)), int(not (c3))
 
 
+def check_cdr_constraints_all_batch(x, x_center_local=None, hamming=None, config=None):
+    """Same as `check_cdr_constraints_all` on all rows of `x` at once, returns the (N, 3) or (N, 4) violations."""
+    x = np.atleast_2d(np.asarray(x))
+    violations = check_constraint_violations_batch(x)
+    if x_center_local is not None:
+        c4 = (x != np.asarray(x_center_local).reshape(1, -1)).sum(axis=1) <= hamming
+        return np.column_stack([violations, np.logical_not(c4).astype(int)])
+    return violations
+
+
 def onehot2ordinal(x, categorical_dims):
     """Convert one-hot representation of strings back to ordinal representation."""
     from itertools import chain
@@ -220,6 +231,52 @@ def random_sample_within_discrete_tr_ordinal(x_center, max_hamming_dist, n_categ
     return x_pert
 
 
+def sample_within_discrete_tr_ordinal_batch(x_center, max_hamming_dist, n_categories, n_samples):
+    """Same as `random_sample_within_discrete_tr_ordinal`, drawing `n_samples` perturbations of x_center at once."""
+    n_categories = np.asarray(n_categories)
+    dim = len(n_categories)
+    if max_hamming_dist < 1:
+        bit_change = int(max(max_hamming_dist * dim, 1))
+    else:
+        bit_change = int(min(max_hamming_dist, dim))
+    # bit_change distinct positions per sample: the smallest keys of a random permutation
+    keys = np.random.rand(n_samples, dim)
+    modified_bits = np.argpartition(keys, bit_change - 1, axis=1)[:, :bit_change] if bit_change < dim else \
+        np.tile(np.arange(dim), (n_samples, 1))
+    x_pert = np.tile(np.asarray(x_center), (n_samples, 1))
+    options = (np.random.rand(n_samples, bit_change) * n_categories[modified_bits]).astype(int)
+    np.put_along_axis(x_pert, modified_bits, options, axis=1)
+    return x_pert
+
+
+def pack_ordinal(X, n_categories):
+    """Integer key of each row of X, the sequence read as a mixed-radix number (bytes if it does not fit in int64)."""
+    X = np.asarray(X).astype(np.int64)
+    if np.sum(np.log2(n_categories)) >= 63:
+        return np.array([row.tobytes() for row in X], dtype=object)
+    radix = np.cumprod(np.concatenate([[1], n_categories[:0:-1]]))[::-1].astype(np.int64)
+    return X.dot(radix)
+
+
+def greedy_batch_argmin(y, batch_size):
+    """
+    Indices of the rows selected by taking, for each column i of y in turn, the row of minimum y[:, i] among the
+    rows not selected yet. When the column minima are on distinct rows (the usual case with many candidates), this is
+    a single argmin over the matrix.
+    """
+    batch_size = min(batch_size, y.shape[0])
+    best = np.argmin(y[:, :batch_size], axis=0)
+    if len(np.unique(best)) == batch_size:
+        return best
+    y = y[:, :batch_size].copy()
+    selected = []
+    for i in range(batch_size):
+        indbest = np.argmin(y[:, i])
+        selected.append(indbest)
+        y[indbest, :] = np.inf
+    return np.array(selected)
+
+
 from pymoo.algorithms.moo.nsga2 import NSGA2
 from pymoo.factory import get_mutation, get_crossover, get_termination
 from pymoo.optimize import minimize
@@ -259,8 +316,7 @@ class CDRH3Prob(Problem):
         out["F"] = acq_x
 
         if self.cdr_constraints:
-            c1, c2, c3 = zip(*list(map(lambda seq: check_cdr_constraints_all(seq), x)))
-            out["G"] = np.column_stack([c1, c2, c3])
+            out["G"] = check_cdr_constraints_all_batch(x)
 
 
 class CDRH3ProbHamming(CDRH3Prob):
@@ -288,10 +344,8 @@ class CDRH3ProbHamming(CDRH3Prob):
         out["F"] = acq_x
 
         if self.cdr_constraints:
-            c1, c2, c3, c4 = zip(*list(
-                map(lambda seq: check_cdr_constraints_all(seq, x_center_local=self.x_center_local, hamming=self.hamming,
-                                                          config=self.config), x)))
-            out["G"] = np.column_stack([c1, c2, c3, c4])
+            out["G"] = check_cdr_constraints_all_batch(x, x_center_local=self.x_center_local, hamming=self.hamming,
+                                                       config=self.config)
 
 
 def get_pop(seq_len, pop_size, x_center_local, seed=0):
@@ -338,9 +392,6 @@ def glocal_search(x_center,
     :param step: number of maximum local search steps the algorithm is allowed to take.
     :return:
     """
-    if kwargs['kernel_type'] == 'ssk':
-        pop_size = 20
-
     x_center_local = deepcopy(x_center)
     if biased:
         # True, Do neighbourhood sampling
@@ -437,9 +488,6 @@ def blocal_search(x_center,
     :param step: number of maximum local search steps the algorithm is allowed to take.
     :return:
     """
-    if kwargs['kernel_type'] == 'ssk':
-        pop_size = 20
-
     if f2 is not None or f3 is not None or n_obj > 1:
         eliminate_duplicates = False
 
@@ -526,47 +574,84 @@ def local_search(x_center,
     :return:
     """
 
-    def _ls(hamming):
-        """One restart of local search"""
-        # x0 = deepcopy(x_center)
-        x_center_local = deepcopy(x_center)
-        tol = 100
-        trajectory = np.array([x_center_local])
-        x = x_center_local
-
-        acq_x = f(x).detach().cpu().numpy()
+    n_categories = np.asarray(config)
+    dim = len(n_categories)
+    # all single-position substitutions (position, category) of the 1-Hamming neighbourhood
+    positions = np.repeat(np.arange(dim), n_categories)
+    categories = np.concatenate([np.arange(n) for n in n_categories])
+
+    def _acq(X):
+        acq = f(X).detach().cpu().numpy()
+        assert acq.size == len(X), f"f must return one acquisition value per row, got shape {acq.shape} for {len(X)} rows"
+        return acq.reshape(-1)
+
+    def _feasible(X):
+        hamming = (X != x_center.reshape(1, -1)).sum(axis=1)
+        feasible = (0 < hamming) & (hamming <= max_hamming_dist)
+        if cdr_constraints:
+            feasible &= np.logical_not(check_constraint_violations_batch(X).any(axis=1))
+        return feasible
+
+    def _starts():
+        """x_center and random points of the trust region (satisfying the constraints) for the other restarts"""
+        X0 = [x_center.reshape(1, -1)]
+        n_missing = n_restart - 1
+        for _ in range(10):
+            if n_missing <= 0:
+                break
+            X_rand = sample_within_discrete_tr_ordinal_batch(x_center, max_hamming_dist, config, 10 * n_missing)
+            X_rand = np.unique(X_rand[_feasible(X_rand)], axis=0)
+            X_rand = X_rand[np.random.permutation(len(X_rand))[:n_missing]]
+            X0.append(X_rand)
+            n_missing -= len(X_rand)
+        X0 = np.concatenate(X0, 0).astype(int)
+        if len(X0) < n_restart:
+            X0 = np.concatenate([X0, np.tile(X0[:1], (n_restart - len(X0), 1))], 0)
+        return X0
+
+    def _ls(X):
+        """
+        Best-improvement local search run from all the rows of X at once: at every step the whole 1-Hamming
+        neighbourhood of the restarts still improving is evaluated with a single call of f.
+        """
+        X = X.copy()
+        acq_X = _acq(X)
+        visited = set(pack_ordinal(X, n_categories).tolist())
+        active = np.arange(len(X))
         for i in range(step):
-            tol_ = tol
-            is_valid = False
-            while not is_valid:
-                neighbour = sample_neighbour_ordinal(x, config)
-                if cdr_constraints:
-                    if not check_cdr_constraints(neighbour):
-                        continue
-                if 0 < compute_hamming_dist_ordinal(x_center_local, neighbour, config) <= hamming \
-                        and not any(np.equal(trajectory, neighbour).all(1)):
-                    is_valid = True
-                else:
-                    tol_ -= 1
-            if tol_ < 0:
-                logging.info("Tolerance exhausted on this local search thread.")
-                return x, acq_x
-
-            acq_x = f(x).detach().cpu().numpy()
-            acq_neighbour = f(neighbour).detach().cpu().numpy()
-
-            if acq_neighbour > acq_x:
-                logging.info(''.join([str(int(i)) for i in neighbour.flatten()]) + ' ' + str(acq_neighbour))
-                x = deepcopy(neighbour)
-        logging.info('local search thread ended with highest acquisition %s' % acq_x)
-        return x, acq_x
-
-    X = []
-    fX = []
-    for i in range(n_restart):
-        res = _ls(max_hamming_dist)
-        X.append(res[0])
-        fX.append(res[1])
+            if len(active) == 0:
+                break
+            # (# active, neighbourhood size, dim)
+            neighbours = np.repeat(X[active][:, None, :], len(positions), axis=1)
+            neighbours[:, np.arange(len(positions)), positions] = categories
+            owner = np.repeat(active, len(positions))
+            neighbours = neighbours.reshape(-1, dim)
+            keep = (categories[None, :] != X[active][:, positions]).reshape(-1) & _feasible(neighbours)
+            keys = pack_ordinal(neighbours, n_categories)
+            keep &= np.array([key not in visited for key in keys.tolist()], dtype=bool)
+            neighbours, owner, keys = neighbours[keep], owner[keep], keys[keep]
+
+            improved = []
+            if len(neighbours) > 0:
+                acq_neighbours = _acq(neighbours)
+                for j in active:
+                    idx = np.where(owner == j)[0]
+                    # best improving neighbour not taken by another restart during this step
+                    for best in idx[np.argsort(-acq_neighbours[idx], kind='stable')]:
+                        if acq_neighbours[best] <= acq_X[j]:
+                            break
+                        if keys[best] not in visited:
+                            X[j], acq_X[j] = neighbours[best], acq_neighbours[best]
+                            visited.add(keys[best])
+                            improved.append(j)
+                            logging.info(''.join([str(int(a)) for a in X[j]]) + ' ' + str(acq_X[j]))
+                            break
+            active = np.array(improved, dtype=int)
+        logging.info('local search ended with highest acquisition %s' % acq_X.max())
+        return X, acq_X
+
+    X, fX = _ls(_starts())
+    X = X.astype(float)
 
     top_idices = np.argpartition(np.array(fX).flatten(), -batch_size)[-batch_size:]
     return np.array([x for i, x in enumerate(X) if i in top_idices]), np.array(fX).flatten()[top_idices]
@@ -1,4 +1,11 @@
 import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import warnings
+from concurrent.futures import Future
+from contextlib import contextmanager
 
 # import pymol
 import __main__
@@ -14,6 +21,203 @@ from task.base import BaseTool
 # Black Box Tools
 ############################
 
+@contextmanager
+def closing_connection(conn):
+    try:
+        with conn:  # commits or rolls back
+            yield conn
+    finally:
+        conn.close()
+
+
+class EnergyCache:
+    """
+    Persistent sqlite cache of binding energies keyed by (antigen, CDR3), safe to share between threads and
+    processes: every operation opens its own connection and the database is in WAL mode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS energy "
+                         "(antigen TEXT NOT NULL, cdr3 TEXT NOT NULL, energy REAL NOT NULL, PRIMARY KEY (antigen, cdr3))")
+
+    def _connect(self):
+        return closing_connection(sqlite3.connect(self.path, timeout=600))
+
+    def get(self, antigen, sequences):
+        """Return {CDR3: energy} for the sequences already in the cache."""
+        energies = {}
+        sequences = list(sequences)
+        with self._connect() as conn:
+            # stay below the default limit of 999 bound parameters
+            for i in range(0, len(sequences), 900):
+                chunk = sequences[i:i + 900]
+                rows = conn.execute(f"SELECT cdr3, energy FROM energy WHERE antigen = ? AND cdr3 IN "
+                                    f"({','.join('?' * len(chunk))})", [antigen] + chunk).fetchall()
+                energies.update(rows)
+        return energies
+
+    def put(self, antigen, energies):
+        """Store {CDR3: energy}, missing energies (NaN) are not cached."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO energy VALUES (?, ?, ?)",
+                             [(antigen, seq, float(e)) for seq, e in energies.items() if np.isfinite(e)])
+
+
+class AbsolutService:
+    """
+    Evaluation layer around the Absolut! binary.
+
+    Each Absolut run works in its own scratch directory (the Absolut installation is symlinked into it) and the
+    process working directory is never changed, so that several experiments can dock on the same antigen at the same
+    time. Files generated by Absolut in the scratch directory (e.g. the antigen structures computed on first use) are
+    copied back to the installation so that they are not computed again. When a `cache_path` is given, energies are
+    stored in an `EnergyCache` and known sequences are not docked again. Requests of concurrent
+    callers (e.g. optimizers running in threads of the same process) are deduplicated and the ones queued while
+    Absolut is running are docked together in the next run. Use `get_absolut_service` to share a service in a process.
+    """
+    # files created by Absolut in its working directory, not to be linked in the scratch directories
+    temp_prefixes = ('TempCDR3_', 'TempBindingsFor')
+
+    def __init__(self, path, process=1, start_task=None, cache_path=None, scratch_dir=None):
+        self.path = os.path.abspath(path)
+        self.process = process
+        self.start_task = start_task
+        self.cache = EnergyCache(cache_path) if cache_path else None
+        self.scratch_dir = scratch_dir
+        self.binary = os.path.join(self.path, 'src', 'bin', 'Absolut')
+        self._lock = threading.Lock()
+        self._running = False
+        self._queue = []  # (antigen, CDR3) waiting for the next Absolut run
+        self._pending = {}  # (antigen, CDR3) -> Future, queued or being docked
+
+    def energy(self, antigen, sequences):
+        """Minimum binding energy of each CDR3 string of `sequences` to `antigen`."""
+        energies = self.cache.get(antigen, set(sequences)) if self.cache is not None else {}
+        with self._lock:
+            futures = {}
+            for seq in set(sequences) - set(energies):
+                key = (antigen, seq)
+                if key not in self._pending:
+                    self._pending[key] = Future()
+                    self._queue.append(key)
+                futures[seq] = self._pending[key]
+        if len(futures) > 0:
+            self._drain()
+            energies.update({seq: future.result() for seq, future in futures.items()})
+        return np.array([energies[seq] for seq in sequences])
+
+    def _drain(self):
+        """Dock queued sequences until the queue is empty, unless another caller already does."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        try:
+            while True:
+                with self._lock:
+                    if len(self._queue) == 0:
+                        self._running = False
+                        return
+                    batch, self._queue = self._queue, []
+                self._dock(batch)
+        except BaseException as e:
+            # fail everything still waiting so that no caller blocks forever on its future, and let the next caller
+            # drain again
+            with self._lock:
+                self._running = False
+                keys, self._queue = list(self._pending), []
+                for key in keys:
+                    future = self._pending.pop(key)
+                    if not future.done():
+                        future.set_exception(e)
+            raise
+
+    def _dock(self, batch):
+        """Dock a batch of (antigen, CDR3) with one Absolut run per antigen and resolve their futures."""
+        by_antigen = {}
+        for antigen, seq in batch:
+            by_antigen.setdefault(antigen, []).append(seq)
+        for antigen, seqs in by_antigen.items():
+            try:
+                energies = dict(zip(seqs, self._run(antigen, seqs)))
+                if self.cache is not None:
+                    self.cache.put(antigen, energies)
+                results = {seq: (energies[seq], None) for seq in seqs}
+            except BaseException as e:  # raised again by `future.result()` in the callers
+                results = {seq: (None, e) for seq in seqs}
+            with self._lock:
+                for seq, (energy, error) in results.items():
+                    future = self._pending.pop((antigen, seq))
+                    if error is None:
+                        future.set_result(energy)
+                    else:
+                        future.set_exception(error)
+
+    def _run(self, antigen, sequences):
+        """Dock `sequences` with one Absolut run in a new scratch directory."""
+        workdir = tempfile.mkdtemp(prefix=f'Absolut_{antigen}_', dir=self.scratch_dir)
+        try:
+            for name in os.listdir(self.path):
+                if not name.startswith(self.temp_prefixes) and 'FinalBindings' not in name:
+                    os.symlink(os.path.join(self.path, name), os.path.join(workdir, name))
+            with open(os.path.join(workdir, f"TempCDR3_{antigen}.txt"), "w") as f:
+                for i, seq in enumerate(sequences):
+                    f.write(f"{i + 1}\t{seq}\n")
+
+            cmd = [self.binary, 'repertoire', antigen, f"TempCDR3_{antigen}.txt", str(self.process)]
+            if self.start_task is not None and shutil.which('taskset') is not None:
+                cmd = ['taskset', '-c', f"{self.start_task}-{self.start_task + self.process}"] + cmd
+            output = subprocess.run(cmd, cwd=workdir, capture_output=True, text=False)
+            self._keep_generated_files(workdir)
+            result_file = os.path.join(workdir, f"{antigen}FinalBindings_Process_1_Of_1.txt")
+            if not os.path.exists(result_file):
+                raise RuntimeError(f"Absolut failed on {antigen} (return code {output.returncode}): "
+                                   f"{output.stderr.decode(errors='replace')[-1000:]}")
+
+            data = pd.read_csv(result_file, sep='\t', skiprows=1, usecols=['ID_slide_Variant', 'Energy'])
+            sequence_idx = data['ID_slide_Variant'].astype(str).str.split('_', n=1).str[0].astype(int).values
+            min_energy = data['Energy'].groupby(sequence_idx).min()
+            return min_energy.reindex(np.arange(1, len(sequences) + 1)).values
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _keep_generated_files(self, workdir):
+        """Copy the files created by Absolut in `workdir`, except its temporary files, to the installation."""
+        for name in os.listdir(workdir):
+            src = os.path.join(workdir, name)
+            dst = os.path.join(self.path, name)
+            if os.path.islink(src) or not os.path.isfile(src) or os.path.exists(dst) \
+                    or name.startswith(self.temp_prefixes) or 'FinalBindings' in name:
+                continue
+            tmp = None
+            try:
+                # copied under a temporary name then renamed, concurrent runs may generate the same file
+                with tempfile.NamedTemporaryFile(dir=self.path, prefix=f'.{name}.', delete=False) as tmp:
+                    pass
+                shutil.copyfile(src, tmp.name)
+                os.replace(tmp.name, dst)
+            except OSError as e:  # e.g. read-only installation
+                warnings.warn(f"Could not keep {name} in the Absolut installation {self.path}: {e}")
+                if tmp is not None and os.path.exists(tmp.name):
+                    os.remove(tmp.name)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_absolut_service(path, process=1, start_task=None, cache_path=None, scratch_dir=None):
+    """`AbsolutService` shared by all the callers of the process using the same installation and cache."""
+    key = (os.path.abspath(path), process, start_task, cache_path, scratch_dir)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = AbsolutService(*key)
+        return _services[key]
+
+
 class Absolut(BaseTool):
     def __init__(self,
                  config):
@@ -24,12 +228,16 @@ class Absolut(BaseTool):
             path: path to Absolut installation
             process: Number of CPU processes
             expid: experiment ID
+            cache_path: sqlite file of the energy cache, no cache by default
+            scratch_dir: where the per-run working directories are created, defaults to the system temp directory
         '''
         for key in ['antigen', 'path', 'process']:
             assert key in config, f"\"{key}\" is not defined in config"
         self.config = config
         assert self.config['startTask'] >= 0 and (self.config['startTask'] + self.config['process'] < os.cpu_count()), \
             f"{self.config['startTask']} is not a valid cpu"
+        self.service = get_absolut_service(self.config['path'], self.config['process'], self.config['startTask'],
+                                           self.config.get('cache_path'), self.config.get('scratch_dir'))
 
     def Energy(self, x):
         '''
@@ -39,42 +247,8 @@ class Absolut(BaseTool):
         if len(x.shape) == 1:
             x = x.reshape(1, -1)
 
-        # randomise TempCDR3 name in case 2 or more experiments are run in parallel on the same server
-        # rand_num = np.random.randint(low=0, high=1000)
-
-        # Change working directory
-        current_dir = os.getcwd()
-        os.chdir(f"{self.config['path']}")
-
-        sequences = []
-        with open(f"TempCDR3_{self.config['antigen']}.txt", "w") as f:
-            for i, seq in enumerate(x):
-                seq2char = ''.join(self.idx_to_AA[aa] for aa in seq)
-                line = f"{i + 1}\t{seq2char}\n"
-                f.write(line)
-                sequences.append(seq2char)
-
-        _ = subprocess.run(
-            ['taskset', '-c', f"{self.config['startTask']}-{self.config['startTask'] + self.config['process']}",
-             "./src/bin/Absolut", 'repertoire', self.config['antigen'], f"TempCDR3_{self.config['antigen']}.txt",
-             str(self.config['process'])], capture_output=True, text=False)
-
-        data = pd.read_csv(os.path.join(self.config['path'],
-                                        f"{self.config['antigen']}FinalBindings_Process_1_Of_1.txt"),
-                           sep='\t', skiprows=1)
-
-        # Add an extra column to ensure that ordering will be ok after groupby operation
-        data['sequence_idx'] = data.apply(lambda row: int(row.ID_slide_Variant.split("_")[0]), axis=1)
-        energy = data.groupby(by=['sequence_idx']).min(['Energy'])
-        min_energy = energy['Energy'].values
-
-        # Remove all created files and change the working directory to what it was
-        for i in range(self.config['process']):
-            os.remove(f"TempBindingsFor{self.config['antigen']}_t{i}_Part1_of_1.txt")
-        os.remove(f"TempCDR3_{self.config['antigen']}.txt")
-
-        os.remove(f"{self.config['antigen']}FinalBindings_Process_1_Of_1.txt")
-        os.chdir(current_dir)
+        sequences = [''.join(self.idx_to_AA[aa] for aa in seq) for seq in x]
+        min_energy = self.service.energy(self.config['antigen'], sequences)
         return min_energy, sequences
 
 
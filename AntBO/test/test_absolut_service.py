@@ -0,0 +1,115 @@
+"""
+Tests of `AbsolutService` against a stand-in Absolut binary (a python script writing fake bindings).
+
+python -m pytest test/test_absolut_service.py
+"""
+import os
+import stat
+import sys
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT_PROJECT = str(Path(os.path.realpath(__file__)).parent.parent)
+sys.path.insert(0, ROOT_PROJECT)
+
+from task.tools import AbsolutService
+
+FAKE_ABSOLUT = f"""#!{sys.executable}
+# Absolut repertoire <antigen> <CDR3 file> <process>, run in its working directory
+import os, sys, zlib
+root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_, _, antigen, cdr3_file, _ = sys.argv
+if antigen == 'BAD':
+    sys.exit(3)
+structure = antigen + '_structure.txt'
+generated = not os.path.exists(structure)
+if generated:  # computed on the first use of the antigen
+    with open(structure, 'w') as f:
+        f.write('structure')
+with open(cdr3_file) as f:
+    seqs = [line.split() for line in f]
+with open(os.path.join(root, 'calls.log'), 'a') as f:
+    f.write(f"{{antigen}} {{len(seqs)}} {{int(generated)}}\\n")
+with open(antigen + 'FinalBindings_Process_1_Of_1.txt', 'w') as f:
+    f.write('header\\nID_slide_Variant\\tCDR3\\tEnergy\\n')
+    for i, seq in seqs:
+        for k in range(3):
+            f.write(f"{{i}}_{{k}}\\t{{seq}}\\t{{-(zlib.crc32((seq + str(k)).encode()) % 10000) / 100}}\\n")
+"""
+
+
+def expected_energy(seq):
+    return min(-(zlib.crc32((seq + str(k)).encode()) % 10000) / 100 for k in range(3))
+
+
+def calls(path):
+    with open(os.path.join(path, 'calls.log')) as f:
+        return [line.split() for line in f]
+
+
+@pytest.fixture
+def absolut_path(tmp_path):
+    binary = tmp_path / 'src' / 'bin' / 'Absolut'
+    binary.parent.mkdir(parents=True)
+    binary.write_text(FAKE_ABSOLUT)
+    binary.chmod(binary.stat().st_mode | stat.S_IXUSR)
+    (tmp_path / 'calls.log').touch()
+    return str(tmp_path)
+
+
+def test_energy_cache(absolut_path, tmp_path_factory):
+    cache_path = str(tmp_path_factory.mktemp('cache') / 'energy.db')
+    service = AbsolutService(absolut_path, cache_path=cache_path)
+    seqs = ['CARDYW', 'CASSLG', 'CARDYW']
+    assert np.array_equal(service.energy('1ADQ', seqs), [expected_energy(s) for s in seqs])
+    # the generated structure is kept in the installation, temporary files are not
+    assert os.path.exists(os.path.join(absolut_path, '1ADQ_structure.txt'))
+    assert not any(name.startswith(('TempCDR3_', '.')) or 'FinalBindings' in name
+                   for name in os.listdir(absolut_path))
+
+    # known sequences come from the cache, only the new one is docked, without generating the structure again
+    seqs = ['CASSLG', 'CTTGGY', 'CARDYW']
+    assert np.array_equal(service.energy('1ADQ', seqs), [expected_energy(s) for s in seqs])
+    assert calls(absolut_path) == [['1ADQ', '2', '1'], ['1ADQ', '1', '0']]
+    assert AbsolutService(absolut_path, cache_path=cache_path).energy('1ADQ', seqs[:1]) == expected_energy(seqs[0])
+    assert len(calls(absolut_path)) == 2
+
+
+def test_concurrent_callers(absolut_path):
+    service = AbsolutService(absolut_path)
+    rng = np.random.RandomState(0)
+    seqs = [''.join(rng.choice(list('ACDEFGHIKLMNPQRSTVWY'), 8)) for _ in range(40)]
+    out = {}
+
+    def work(i):
+        out[i] = service.energy('1ADQ', seqs[i * 5: i * 5 + 20])
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for i in range(4):
+        assert np.array_equal(out[i], [expected_energy(s) for s in seqs[i * 5: i * 5 + 20]])
+    # overlapping requests are docked once
+    assert sum(int(n) for _, n, _ in calls(absolut_path)) == 35
+
+
+def test_failure(absolut_path, monkeypatch):
+    service = AbsolutService(absolut_path)
+    with pytest.raises(RuntimeError, match='return code 3'):
+        service.energy('BAD', ['CARDYW'])
+    assert not service._running and len(service._pending) == 0
+    assert service.energy('1ADQ', ['CARDYW']) == expected_energy('CARDYW')
+
+    # an error outside of the Absolut runs does not leave the service busy
+    with monkeypatch.context() as m:
+        m.setattr(service, '_dock', lambda batch: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            service.energy('1ADQ', ['CASSLG'])
+    assert not service._running and len(service._pending) == 0
+    assert service.energy('1ADQ', ['CASSLG']) == expected_energy('CASSLG')
@@ -0,0 +1,44 @@
+"""
+Gradients of the chunked (checkpointed) FastStringKernel.
+
+python -m pytest test/test_kernels.py
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+
+ROOT_PROJECT = str(Path(os.path.realpath(__file__)).parent.parent)
+sys.path.insert(0, ROOT_PROJECT)
+
+import bo.kernels as kernels
+from bo.kernels import FastStringKernel
+
+
+def kernel_grads(X1, X2, max_memory):
+    kernel = FastStringKernel(seq_length=X1.shape[1], alphabet_size=20, max_memory=max_memory, device='cpu')
+    K = kernel(X1, X2).evaluate()
+    # match_decay cancels out in the normalised kernel, the unnormalised one is differentiated as well
+    (K.sum() + kernel._k_cross(X1, X2, kernel._precalc()).sum()).backward()
+    return K.detach(), kernel.match_decay.grad, kernel.gap_decay.grad
+
+
+@pytest.mark.parametrize('reentrant', [True, False], ids=['reentrant', 'non-reentrant'])
+@pytest.mark.parametrize('symmetric', [True, False], ids=['gram', 'cross'])
+def test_backward(monkeypatch, reentrant, symmetric):
+    # few distinct characters so that the strings share subsequences
+    X1 = torch.randint(0, 4, (7, 6)).double()
+    X2 = X1 if symmetric else torch.randint(0, 4, (5, 6)).double()
+    with monkeypatch.context() as m:
+        m.setattr(kernels, 'checkpoint', lambda fn, *args, **kwargs: fn(*args))
+        K, match_grad, gap_grad = kernel_grads(X1, X2, max_memory=2 ** 28)
+
+    # reentrant checkpointing (torch < 1.11) only propagates gradients to the explicit inputs of the blocks
+    monkeypatch.setattr(kernels, 'CHECKPOINT_KWARGS', {} if reentrant else {'use_reentrant': False})
+    K_, match_grad_, gap_grad_ = kernel_grads(X1, X2, max_memory=1)
+    assert torch.allclose(K, K_)
+    assert match_grad != 0 and gap_grad != 0
+    assert torch.allclose(match_grad, match_grad_)
+    assert torch.allclose(gap_grad, gap_grad_)
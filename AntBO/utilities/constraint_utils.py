@@ -3,11 +3,17 @@ from itertools import groupby
 
 import numpy as np
 
-from utilities.aa_utils import idx_to_aa
+from utilities.aa_utils import aa_to_idx, aas, idx_to_aa
 
 COUNT_AA = 5  # maximum number of consecutive AAs
 N_glycosylation_pattern = 'N[^P][ST][^P]'
 
+# Charge contribution of each AA as counted in `check_constraint_satisfaction`
+aa_charge = np.zeros(len(aas))
+aa_charge[[aa_to_idx['R'], aa_to_idx['K']]] = 1.
+aa_charge[aa_to_idx['H']] = 0.1
+aa_charge[[aa_to_idx['D'], aa_to_idx['E']]] = -1.
+
 
 def check_constraint_satisfaction(x):
     # Constraints on CDR3 sequence
@@ -47,6 +53,51 @@ def check_constraint_satisfaction(x):
     return True
 
 
+def max_run_length(x):
+    """Length of the longest run of identical consecutive AAs of each row of the (N, L) int array `x`."""
+    x = np.atleast_2d(x)
+    n, length = x.shape
+    if length == 0:
+        return np.zeros(n, dtype=np.int64)
+    pos = np.arange(length)
+    # position where the run containing each position starts
+    new_run = np.ones(x.shape, dtype=bool)
+    new_run[:, 1:] = x[:, 1:] != x[:, :-1]
+    run_start = np.maximum.accumulate(np.where(new_run, pos, 0), axis=1)
+    return (pos - run_start + 1).max(axis=1)
+
+
+def has_n_glycosylation_motif(x):
+    """Whether each row of the (N, L) int array `x` contains the N-X-S/T motif `N_glycosylation_pattern`."""
+    x = np.atleast_2d(x)
+    length = x.shape[1]
+    if length < 4:
+        return np.zeros(x.shape[0], dtype=bool)
+    is_n = x == aa_to_idx['N']
+    not_p = x != aa_to_idx['P']
+    is_st = (x == aa_to_idx['S']) | (x == aa_to_idx['T'])
+    motif = is_n[:, :length - 3] & not_p[:, 1:length - 2] & is_st[:, 2:length - 1] & not_p[:, 3:]
+    return motif.any(axis=1)
+
+
+def check_constraint_violations_batch(x):
+    """
+    Constraint violations of each sequence of the (N, L) array of AA indices `x`, in one pass over the batch.
+
+    Returns an (N, 3) int array, columns are 1 where a sequence violates respectively the maximum number of
+    consecutive identical AAs, the charge bounds and the N-glycosylation constraint, in the order of
+    `bo.localbo_utils.check_cdr_constraints_all`.
+    """
+    x = np.atleast_2d(np.asarray(x)).astype(np.int64)
+    # cumsum adds the charges left to right as the scalar check does, a pairwise sum can round differently
+    # around the bounds (e.g. ten H and one R)
+    charge = np.cumsum(aa_charge[x], axis=1)[:, -1] if x.shape[1] > 0 else np.zeros(x.shape[0])
+    return np.column_stack([
+        max_run_length(x) > COUNT_AA,
+        (charge > 2.0) | (charge < -2.0),
+        has_n_glycosylation_motif(x)
+    ]).astype(int)
+
+
 def check_constraint_satisfaction_batch(x):
-    constraints_satisfied = list(map(lambda seq: check_constraint_satisfaction(seq), x))
-    return np.array(constraints_satisfied)
\ No newline at end of file
+    return np.logical_not(check_constraint_violations_batch(x).any(axis=1))
@@ -0,0 +1,58 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Wall time and simple regret of HEBO with the evolutionary (nsga2) and the
+batched multi-start gradient acquisition optimizers
+
+python benchmark/bench_acq_opt.py --iters 50 --dim 5 --model gp --seeds 3
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy  as np
+import pandas as pd
+import torch
+
+from hebo.benchmarks.synthetic_benchmarks import BraninDummy
+from hebo.optimizers.hebo import HEBO
+
+def run(prob, iters : int, model_name : str, acq_opt : str, seed : int) -> pd.DataFrame:
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    opt = HEBO(prob.space, model_name = model_name, scramble_seed = seed, acq_opt = acq_opt)
+    log = []
+    for i in range(iters):
+        t0  = time.time()
+        rec = opt.suggest()
+        t1  = time.time()
+        opt.observe(rec, prob(rec))
+        log.append({'iter' : i, 'seed' : seed, 'acq_opt' : acq_opt, 'time' : t1 - t0, 'regret' : opt.y.min()})
+    return pd.DataFrame(log)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iters', type = int, default = 50)
+    parser.add_argument('--dim',   type = int, default = 5)
+    parser.add_argument('--model', type = str, default = 'gp')
+    parser.add_argument('--seeds', type = int, default = 3)
+    parser.add_argument('--out',   type = str, default = None)
+    args = parser.parse_args()
+
+    prob = BraninDummy(args.dim) # optimal value of the benchmark is shifted to zero
+    df   = pd.concat([run(prob, args.iters, args.model, acq_opt, seed) for acq_opt in ['evolution', 'grad'] for seed in range(args.seeds)], ignore_index = True)
+    if args.out is not None:
+        df.to_csv(args.out, index = False)
+
+    last = df[df['iter'] == args.iters - 1]
+    print(df.groupby(['acq_opt', 'seed'])['time'].sum().groupby('acq_opt').agg(['mean', 'std']).rename(columns = lambda c : 'total_time_' + c))
+    print(last.groupby('acq_opt')['regret'].agg(['mean', 'std', 'min', 'max']))
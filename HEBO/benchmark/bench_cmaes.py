@@ -0,0 +1,112 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Wall time per generation and final objective of `CMAES` on a shifted sphere,
+versus the previous update (loop over rank-mu outer products, eigendecomposition
+of C at every generation, per-dimension reflection loop)
+
+python benchmark/bench_cmaes.py --dims 10 100 1000 2000 --gens 20
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import torch
+from torch.distributions import MultivariateNormal
+
+from hebo.design_space.design_space import DesignSpace
+from hebo.optimizers.cmaes import CMAES
+
+class LoopCMAES(CMAES):
+    def update_eigen(self) -> bool:
+        D2, B = torch.linalg.eigh(self.C)
+        self.B, self.D = B, D2.clamp(min = 1e-20).sqrt()
+        return True
+
+    def sample_dist(self, n : int) -> torch.Tensor:
+        return MultivariateNormal(self.mu, self.sigma * self.C).sample((n, ))
+
+    @staticmethod
+    def reflect(sample : torch.Tensor, lb : torch.Tensor, ub : torch.Tensor) -> torch.Tensor:
+        while (sample < lb).any() or (sample > ub).any():
+            for i in range(sample.shape[1]):
+                rl    = 2 * lb[i] - sample[:, i]
+                ru    = 2 * ub[i] - sample[:, i]
+                vio_l = sample[:, i] < lb[i]
+                vio_u = sample[:, i] > ub[i]
+                sample[vio_l, i] = rl[vio_l]
+                sample[vio_u, i] = ru[vio_u]
+        return sample
+
+    def observe(self, x : pd.DataFrame, y : np.ndarray):
+        self.n_eval += y.shape[0]
+        y       = y.reshape(-1)
+        lb      = self.space.opt_lb.view(-1).float()
+        ub      = self.space.opt_ub.view(-1).float()
+        self.px = x.iloc[y.argsort()[:self.pop_size]].copy()
+        px, pxe = self.space.transform(self.px)
+        px      = torch.cat([px, pxe.float()], dim = 1)
+
+        mu_old  = self.mu.clone()
+        self.mu = (px.t() * self.weights).sum(axis = 1)
+        self.update_eigen()
+        C_half_inv   = self.B.mm(torch.diag(1. / self.D)).mm(self.B.t())
+        self.p_sigma = (1 - self.cs) * self.p_sigma + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * C_half_inv.mv((self.mu - mu_old) / self.sigma)
+
+        h_sig = 0.
+        gen   = self.n_eval / self.child_size
+        if self.p_sigma.norm() / np.sqrt(1 - (1 - self.cs)**(2 * gen + 1)) < (1.4 + 2 / (self.dim + 1)) * self.norm_rand:
+            h_sig = 1.0
+        self.p_c    = (1 - self.cc)  * self.p_c + h_sig * np.sqrt(self.cc  * (2 - self.cc)   * self.mu_eff) * ((self.mu - mu_old) / self.sigma)
+        self.sigma *= np.exp((self.cs / self.damp) * (self.p_sigma.norm() / self.norm_rand - 1) )
+        self.sigma  = torch.min(2 * (ub - lb).norm(), self.sigma)
+
+        C_mu = torch.zeros(self.dim, self.dim)
+        for i in range(self.pop_size):
+            y     = (px[i] - mu_old).view(-1, 1) / self.sigma
+            C_mu += self.weights[i] * y.mm(y.t())
+        C_r1   = self.p_c.view(-1, 1).mm(self.p_c.view(1, -1)) + (1 - h_sig) * self.cc * (2 - self.cc) * self.C
+        self.C = (1 - self.c_r1 - self.c_mu) * self.C + self.c_r1 * C_r1 + self.c_mu * C_mu
+
+def run(opt : CMAES, gens : int) -> (float, float, float):
+    t_suggest = t_observe = 0.
+    best      = np.inf
+    for _ in range(gens):
+        t0  = time.time()
+        rec = opt.suggest()
+        t1  = time.time()
+        y   = ((rec.values - 1)**2).sum(axis = 1, keepdims = True)
+        opt.observe(rec, y)
+        best       = min(best, y.min())
+        t_suggest += t1 - t0
+        t_observe += time.time() - t1
+    return t_suggest / gens, t_observe / gens, best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dims', type = int, nargs = '+', default = [10, 100, 1000])
+    parser.add_argument('--gens', type = int, default = 20)
+    args = parser.parse_args()
+
+    for dim in args.dims:
+        space = DesignSpace().parse([{'name' : 'x%d' % i, 'type' : 'num', 'lb' : -5, 'ub' : 5} for i in range(dim)])
+        for name, opt_cls in [('loop', LoopCMAES), ('vectorized', CMAES)]:
+            torch.manual_seed(42)
+            opt = opt_cls(space, sep = False)
+            ts, to, best = run(opt, args.gens)
+            print('dim %4d, %-10s: suggest %.4fs, observe %.4fs per generation, best %.4g' % (dim, name, ts, to, best))
+        if dim > 100:
+            torch.manual_seed(42)
+            ts, to, best = run(CMAES(space, sep = True), args.gens)
+            print('dim %4d, %-10s: suggest %.4fs, observe %.4fs per generation, best %.4g' % (dim, 'sep', ts, to, best))
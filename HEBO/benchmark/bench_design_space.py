@@ -0,0 +1,91 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Microbenchmark of `DesignSpace.transform` / `inverse_transform` / `project`
+against the per-parameter loop, for spaces with 100 to 1000 parameters of
+all types, and of categorical parameters only
+
+python benchmark/bench_design_space.py --num_rows 1000
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import timeit
+import numpy  as np
+import pandas as pd
+import torch
+
+from hebo.design_space.design_space import DesignSpace
+
+def gen_space(num_paras : int, types : list = None) -> DesignSpace:
+    if types is None:
+        types = ['num', 'int', 'pow', 'pow_int', 'step_int', 'cat', 'bool']
+    config = []
+    for i in range(num_paras):
+        t = types[i % len(types)]
+        if t == 'num':
+            config.append({'name' : f'x{i}', 'type' : t, 'lb' : -1, 'ub' : 1})
+        elif t == 'int':
+            config.append({'name' : f'x{i}', 'type' : t, 'lb' : 0, 'ub' : 10})
+        elif t == 'pow':
+            config.append({'name' : f'x{i}', 'type' : t, 'lb' : 1e-4, 'ub' : 1e-1})
+        elif t == 'pow_int':
+            config.append({'name' : f'x{i}', 'type' : t, 'lb' : 1, 'ub' : 1000})
+        elif t == 'step_int':
+            config.append({'name' : f'x{i}', 'type' : t, 'lb' : 2, 'ub' : 20, 'step' : 2})
+        elif t == 'cat':
+            config.append({'name' : f'x{i}', 'type' : t, 'categories' : ['a', 'b', 'c', 'd']})
+        else:
+            config.append({'name' : f'x{i}', 'type' : t})
+    return DesignSpace().parse(config)
+
+def loop_transform(space : DesignSpace, data : pd.DataFrame):
+    xc = data[space.numeric_names].values.astype(float).copy()
+    xe = data[space.enum_names].values.copy()
+    for i, name in enumerate(space.numeric_names):
+        xc[:, i] = space.paras[name].transform(xc[:, i])
+    for i, name in enumerate(space.enum_names):
+        xe[:, i] = space.paras[name].transform(xe[:, i])
+    return torch.FloatTensor(xc), torch.LongTensor(xe.astype(int))
+
+def loop_inverse_transform(space : DesignSpace, x : torch.Tensor, xe : torch.Tensor):
+    inv_dict = {}
+    for i, name in enumerate(space.numeric_names):
+        inv_dict[name] = space.paras[name].inverse_transform(x.detach().double().numpy()[:, i])
+    for i, name in enumerate(space.enum_names):
+        inv_dict[name] = space.paras[name].inverse_transform(xe.detach().numpy()[:, i])
+    return pd.DataFrame(inv_dict)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_rows', type = int, default = 1000)
+    parser.add_argument('--repeat',   type = int, default = 5)
+    args = parser.parse_args()
+
+    results = []
+    for types, num_paras in [(None, n) for n in [100, 300, 1000]] + [(['cat'], n) for n in [100, 300, 1000]]:
+        space = gen_space(num_paras, types)
+        data  = space.sample(args.num_rows)
+        x, xe = space.transform(data)
+        timer = lambda f: min(timeit.repeat(f, number = 1, repeat = args.repeat))
+        results.append({
+            'types'            : 'all' if types is None else ','.join(types),
+            'num_paras'        : num_paras,
+            'transform_loop'   : timer(lambda: loop_transform(space, data)),
+            'transform_plan'   : timer(lambda: space.transform(data)),
+            'inverse_loop'     : timer(lambda: loop_inverse_transform(space, x, xe)),
+            'inverse_plan'     : timer(lambda: space.inverse_transform(x, xe)),
+            'round_trip_loop'  : timer(lambda: loop_transform(space, loop_inverse_transform(space, x, xe))),
+            'round_trip_plan'  : timer(lambda: space.project(x, xe)),
+            })
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(pd.DataFrame(results).set_index(['types', 'num_paras']))
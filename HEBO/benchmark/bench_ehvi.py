@@ -0,0 +1,79 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Wall time of the Monte-Carlo EHVI batch selection of `GeneralBO`, one
+`hv.do` call per (candidate, sample) versus the box decomposition of
+`greedy_qehvi`, for 2 to 4 objectives
+
+python benchmark/bench_ehvi.py --num_cand 100 --num_front 20 --n_suggestions 4
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy as np
+from pymoo.factory import get_performance_indicator
+
+from hebo.acquisitions.ehvi import BoxDecomposition, greedy_qehvi
+
+def loop_hvi(front : np.ndarray, ref_point : np.ndarray, y : np.ndarray) -> np.ndarray:
+    hv   = get_performance_indicator('hv', ref_point = ref_point)
+    base = hv.do(front)
+    return np.array([hv.do(np.vstack([front, yi])) - base for yi in y])
+
+def loop_qehvi(front : np.ndarray, ref_point : np.ndarray, y_samp : np.ndarray, n_suggestions : int) -> [int]:
+    hv        = get_performance_indicator('hv', ref_point = ref_point)
+    y_curr    = front.copy()
+    select_id = []
+    for i in range(n_suggestions):
+        base_hv  = hv.do(y_curr)
+        ehvi_lst = []
+        for j in range(y_samp.shape[1]):
+            hvi_est = 0
+            for k in range(y_samp.shape[0]):
+                hvi_est += hv.do(np.vstack([y_curr, y_samp[[k], j]])) - base_hv
+            ehvi_lst.append(hvi_est / y_samp.shape[0])
+        best_id = np.argmax(ehvi_lst) if max(ehvi_lst) > 0 else np.random.choice(y_samp.shape[1])
+        y_curr  = np.vstack([y_curr, y_samp[:, best_id].min(axis = 0, keepdims = True)])
+        select_id.append(best_id)
+    return select_id
+
+def pareto_front(num_front : int, num_obj : int) -> np.ndarray:
+    y = np.abs(np.random.randn(num_front, num_obj))
+    return y / np.linalg.norm(y, axis = 1, keepdims = True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_cand',      type = int, default = 100)
+    parser.add_argument('--num_front',     type = int, default = 20)
+    parser.add_argument('--num_mc',        type = int, default = 10)
+    parser.add_argument('--n_suggestions', type = int, default = 4)
+    args = parser.parse_args()
+
+    np.random.seed(42)
+    for num_obj in [2, 3, 4]:
+        front  = pareto_front(args.num_front, num_obj)
+        ref    = 1.1 * np.ones(num_obj)
+        y_samp = 0.9 * pareto_front(args.num_mc * args.num_cand, num_obj).reshape(args.num_mc, args.num_cand, num_obj)
+
+        hvi_loop = loop_hvi(front, ref, y_samp[0])
+        hvi_box  = BoxDecomposition(ref, front).hvi(y_samp[0])
+        print('%d objectives, max abs diff of HVI: %g' % (num_obj, np.abs(hvi_loop - hvi_box).max()))
+
+        t0 = time.time()
+        loop_qehvi(front, ref, y_samp, args.n_suggestions)
+        t_loop = time.time() - t0
+        t0 = time.time()
+        greedy_qehvi(front, ref, y_samp, args.n_suggestions)
+        t_box = time.time() - t0
+        print('%d objectives, %d candidates x %d samples: hv.do loop %.4fs, box decomposition %.4fs, speedup %.2fx' % (
+            num_obj, args.num_cand, args.num_mc, t_loop, t_box, t_loop / t_box))
@@ -0,0 +1,67 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Wall time of the random forest predictive mean/variance, per-tree
+`estimator.predict` loop versus the flattened leaf table of `RF.predict`
+
+python benchmark/bench_rf_predict.py --n_estimators 100 --num_cand 10000 --n_jobs 1
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy as np
+import torch
+
+from hebo.models.rf.rf import RF
+
+def loop_predict(model : RF, Xc : torch.Tensor, Xe : torch.Tensor):
+    X     = model.xtrans(Xc, Xe)
+    mean  = model.rf.predict(X).reshape(-1, 1)
+    preds = []
+    for estimator in model.rf.estimators_:
+        preds.append(estimator.predict(X).reshape([-1,1]))
+    var = np.var(np.concatenate(preds, axis=1), axis=1)
+    return torch.FloatTensor(mean.reshape([-1,1])), torch.FloatTensor(var.reshape([-1,1])) + model.noise
+
+def timeit(f, repeat : int) -> float:
+    t0 = time.time()
+    for _ in range(repeat):
+        f()
+    return (time.time() - t0) / repeat
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_estimators', type = int, default = 100)
+    parser.add_argument('--num_cand',     type = int, default = 10000)
+    parser.add_argument('--num_data',     type = int, default = 500)
+    parser.add_argument('--dim',          type = int, default = 10)
+    parser.add_argument('--n_jobs',       type = int, default = 1)
+    parser.add_argument('--repeat',       type = int, default = 5)
+    args = parser.parse_args()
+
+    torch.manual_seed(42)
+    X     = torch.rand(args.num_data, args.dim)
+    y     = (X**2).sum(dim = 1, keepdim = True) + 0.1 * torch.randn(args.num_data, 1)
+    model = RF(args.dim, 0, 1, n_estimators = args.n_estimators, n_jobs = args.n_jobs)
+    model.fit(X, None, y)
+
+    Xcand = torch.rand(args.num_cand, args.dim)
+    py_loop, ps2_loop = loop_predict(model, Xcand, None)
+    py, ps2 = model.predict(Xcand, None)
+    print('Max abs diff of mean: %g, variance: %g' % ((py - py_loop).abs().max(), (ps2 - ps2_loop).abs().max()))
+
+    for num_cand in [100, args.num_cand]:
+        Xc  = Xcand[:num_cand]
+        t_loop  = timeit(lambda : loop_predict(model, Xc, None), args.repeat)
+        t_table = timeit(lambda : model.predict(Xc, None), args.repeat)
+        print('%d trees x %d candidates: loop %.4fs, leaf table %.4fs, speedup %.2fx' % (args.n_estimators, num_cand, t_loop, t_table, t_loop / t_table))
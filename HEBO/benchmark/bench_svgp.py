@@ -0,0 +1,73 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Fit and predict wall time of the sparse surrogate HEBO switches to above
+`sparse_threshold` observations, cold fit versus warm-started refit after
+adding 1% new observations, the exact `gpy` surrogate is timed for the sizes
+not larger than `--exact_max`
+
+python benchmark/bench_svgp.py --sizes 1000 10000 50000 --num_cand 10000
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy as np
+import torch
+
+from hebo.design_space.design_space import DesignSpace
+from hebo.models.model_factory import get_model
+from hebo.optimizers.hebo import HEBO
+
+def obj(X) -> np.ndarray:
+    x = X[['x%d' % i for i in range(5)]].values
+    y = (x**2).sum(axis = 1) + np.sin(3 * x[:, 0]) + (X['c'] == 'a').values
+    return y.reshape(-1, 1)
+
+def fit_time(model, X, Xe, y) -> float:
+    t0 = time.time()
+    model.fit(X, Xe, y)
+    return time.time() - t0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes',     type = int, nargs = '+', default = [1000, 10000, 50000])
+    parser.add_argument('--num_cand',  type = int, default = 10000)
+    parser.add_argument('--exact_max', type = int, default = 1000)
+    args = parser.parse_args()
+
+    space = DesignSpace().parse([{'name' : 'x%d' % i, 'type' : 'num', 'lb' : -2, 'ub' : 2} for i in range(5)] +
+            [{'name' : 'c', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}])
+    opt   = HEBO(space)
+    cand  = space.sample(args.num_cand)
+    Xc, Xce = space.transform(cand)
+    yc    = torch.FloatTensor(obj(cand))
+
+    torch.manual_seed(42)
+    np.random.seed(42)
+    for n in args.sizes:
+        rec   = space.sample(int(n * 1.01))
+        X, Xe = space.transform(rec)
+        y     = torch.FloatTensor(obj(rec) + 0.1 * np.random.randn(rec.shape[0], 1))
+
+        names = ['svgp'] + (['gpy'] if n <= args.exact_max else [])
+        for name in names:
+            model  = get_model(name, space.num_numeric, space.num_categorical, 1, **opt.get_model_config(name))
+            t_cold = fit_time(model, X[:n], Xe[:n], y[:n])
+            t_warm = fit_time(model, X, Xe, y) if name == 'svgp' else np.nan
+            t0     = time.time()
+            with torch.no_grad():
+                py, _ = model.predict_mean_var(Xc, Xce)
+            t_pred = time.time() - t0
+            mae    = (py - yc).abs().median().item()
+            print('%-5s n = %6d: cold fit %8.2fs, warm refit %8.2fs, predict %d points %.3fs, test median abs. error %.3f' % (
+                name, n, t_cold, t_warm, args.num_cand, t_pred, mae), flush = True)
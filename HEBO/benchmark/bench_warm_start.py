@@ -0,0 +1,59 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Per-iteration wall time of `HEBO.suggest` with and without warm-started
+surrogate refits
+
+python benchmark/bench_warm_start.py --iters 500 --dim 10 --out warm_start.csv
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import argparse
+import time
+import numpy  as np
+import pandas as pd
+
+from hebo.benchmarks.synthetic_benchmarks import BraninDummy
+from hebo.optimizers.hebo import HEBO
+
+def run(prob, iters : int, warm_start : bool, restart_every : int, seed : int) -> pd.DataFrame:
+    np.random.seed(seed)
+    cfg = {'verbose' : False, 'warp' : True, 'space' : prob.space, 'restart_every' : restart_every}
+    opt = HEBO(prob.space, model_config = cfg, scramble_seed = seed, warm_start = warm_start)
+    log = []
+    for i in range(iters):
+        t0  = time.time()
+        rec = opt.suggest()
+        t1  = time.time()
+        opt.observe(rec, prob(rec))
+        log.append({'iter' : i, 'warm_start' : warm_start, 'time' : t1 - t0, 'best_y' : opt.y.min()})
+    return pd.DataFrame(log)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iters',         type = int, default = 500)
+    parser.add_argument('--dim',           type = int, default = 10)
+    parser.add_argument('--restart_every', type = int, default = 10)
+    parser.add_argument('--seed',          type = int, default = 42)
+    parser.add_argument('--out',           type = str, default = None)
+    args = parser.parse_args()
+
+    prob = BraninDummy(args.dim)
+    df   = pd.concat([run(prob, args.iters, ws, args.restart_every, args.seed) for ws in [False, True]], ignore_index = True)
+    if args.out is not None:
+        df.to_csv(args.out, index = False)
+
+    bins = np.arange(0, args.iters + 100, 100)
+    df['bucket'] = pd.cut(df['iter'], bins, right = False)
+    print(df.groupby(['bucket', 'warm_start'])['time'].mean().unstack())
+    print(df.groupby('warm_start')[['time']].sum().rename(columns = {'time' : 'total_time'}))
+    print(df.groupby('warm_start')['best_y'].last())
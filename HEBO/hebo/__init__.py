@@ -7,11 +7,21 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
-from . import acq_optimizers
-from . import acquisitions
-from . import design_space
-from . import models
-from . import optimizers
-from . import sklearn_tuner
+import warnings
+warnings.filterwarnings('ignore') # package-wide, as in `sklearn_tuner`
+
+import importlib
+
+_submodules = ['acq_optimizers', 'acquisitions', 'design_space', 'models', 'optimizers', 'sklearn_tuner']
+
+def __getattr__(name):
+    # submodules are imported on first access, so that importing one module
+    # does not pull in the dependencies of all the others
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
 
 __version__ = "0.3.3"
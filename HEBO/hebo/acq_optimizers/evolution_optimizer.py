@@ -10,61 +10,119 @@
 import numpy  as np
 import pandas as pd
 import torch
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from torch.quasirandom import SobolEngine
-from pymoo.factory import get_problem, get_mutation, get_crossover, get_algorithm
-from pymoo.operators.mixed_variable_operator import MixedVariableMutation, MixedVariableCrossover
-from pymoo.optimize import minimize
-from pymoo.core.problem import Problem
-from pymoo.config import Config
-Config.show_compile_hint = False
-
 from ..design_space.design_space import DesignSpace
 from ..acquisitions.acq import Acquisition
 
-class BOProblem(Problem):
-    def __init__(self,
-            lb    : np.ndarray,
-            ub    : np.ndarray,
-            acq   : Acquisition,
-            space : DesignSpace, 
-            fix   : dict = None 
-            ):
-        super().__init__(len(lb), xl = lb, xu = ub, n_obj = acq.num_obj, n_constr = acq.num_constr)
-        self.acq   = acq
-        self.space = space
-        self.fix   = fix # NOTE: use self.fix to enable contextual BO
-
-    def _evaluate(self, x : np.ndarray, out : dict, *args, **kwargs):
-        num_x = x.shape[0]
-        xcont = torch.FloatTensor(x[:, :self.space.num_numeric].astype(float))
-        xenum = torch.FloatTensor(x[:, self.space.num_numeric:].astype(float)).round().long()
-        if self.fix is not None: # invalidate fixed input, replace with fixed values
-            df_x = self.space.inverse_transform(xcont, xenum)
-            for k, v in self.fix.items():
-                df_x[k] = v
-            xcont, xenum = self.space.transform(df_x)
+_worker_acq = {}
+
+def _init_worker(acq : Acquisition, num_threads : int):
+    """
+    Acquisition (and fitted surrogate) shipped once to each worker process
+    """
+    torch.set_num_threads(num_threads)
+    _worker_acq['acq'] = acq
+
+def _evaluate_worker(xcont : np.ndarray, xenum : np.ndarray, seed : int) -> np.ndarray:
+    torch.manual_seed(seed)
+    with torch.no_grad():
+        return _worker_acq['acq'](torch.from_numpy(xcont), torch.from_numpy(xenum)).numpy()
+
+class ParallelEvaluator:
+    """
+    Evaluation of an acquisition function on a population split into shards
+    of at least `min_shard` rows
+
+    - executor = 'thread': the shards are evaluated by a pool of
+      `num_workers` threads sharing the acquisition
+    - executor = 'process': each of the `num_workers` worker processes holds
+      a copy of the acquisition, the acquisition must be picklable, each
+      shard is evaluated under its own seed spawned from a seed drawn from
+      the torch RNG when entering the context, so that stochastic
+      acquisitions are reproducible whichever worker evaluates the shard
+    - num_threads: torch threads used by each worker process
+
+    Must be used as a context manager, the population is evaluated in the
+    calling thread if `num_workers <= 1` or it is too small to be split
+    """
+    def __init__(self, acq : Acquisition, num_workers : int = 1, executor : str = 'thread', num_threads : int = 1, min_shard : int = 16):
+        assert executor in ['thread', 'process']
+        self.acq         = acq
+        self.num_workers = num_workers
+        self.executor    = executor
+        self.num_threads = num_threads
+        self.min_shard   = min_shard
+        self.pool        = None
+        self.seed_seq    = None
+
+    def __enter__(self):
+        if self.num_workers > 1:
+            if self.executor == 'thread':
+                self.pool = ThreadPoolExecutor(max_workers = self.num_workers)
+            else:
+                self.seed_seq = np.random.SeedSequence(int(torch.randint(2**30, (1, ))))
+                self.pool     = ProcessPoolExecutor(max_workers = self.num_workers, initializer = _init_worker, initargs = (self.acq, self.num_threads))
+        return self
+
+    def __exit__(self, *args):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __call__(self, xcont : torch.FloatTensor, xenum : torch.LongTensor) -> np.ndarray:
+        num_shard = min(self.num_workers, xcont.shape[0] // self.min_shard)
+        if self.pool is None or num_shard <= 1:
+            with torch.no_grad():
+                return self.acq(xcont, xenum).numpy()
+        shards = np.array_split(np.arange(xcont.shape[0]), num_shard)
+        if self.executor == 'thread':
+            futures = [self.pool.submit(self.evaluate_shard, xcont[idx], xenum[idx]) for idx in shards]
+        else:
+            seeds   = [int(seq.generate_state(1)[0]) for seq in self.seed_seq.spawn(num_shard)]
+            futures = [self.pool.submit(_evaluate_worker, xcont[idx].numpy(), xenum[idx].numpy(), seed) for idx, seed in zip(shards, seeds)]
+        return np.concatenate([f.result() for f in futures], axis = 0)
 
+    def evaluate_shard(self, xcont : torch.FloatTensor, xenum : torch.LongTensor) -> np.ndarray:
         with torch.no_grad():
-            acq_eval = self.acq(xcont, xenum).numpy().reshape(num_x, self.acq.num_obj + self.acq.num_constr)
-            out['F'] = acq_eval[:, :self.acq.num_obj]
+            return self.acq(xcont, xenum).numpy()
 
-            if self.acq.num_constr > 0:
-                out['G'] = acq_eval[:, -1 * self.acq.num_constr:]
+def __getattr__(name):
+    # pymoo is only imported once an optimisation is run
+    if name in ['BOProblem', 'ConvergenceTermination']:
+        from . import pymoo_problem
+        return getattr(pymoo_problem, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 class EvolutionOpt:
+    """
+    Evolutionary acquisition optimizer
+
+    Runs `iters` generations unless `early_stop` is True or `max_time` is
+    set, see `ConvergenceTermination` for the other termination parameters
+    (`patience`, `ftol`, `hv_tol`, `div_tol`). Statistics of the last
+    `optimize` call are stored in `stats`
+    """
     def __init__(self,
             design_space : DesignSpace,
             acq          : Acquisition,
             es           : str = None, 
             **conf):
-        self.space      = design_space
-        self.es         = es 
-        self.acq        = acq
-        self.pop        = conf.get('pop', 100)
-        self.iter       = conf.get('iters',500)
-        self.verbose    = conf.get('verbose', False)
-        self.repair     = conf.get('repair', None)
-        self.sobol_init = conf.get('sobol_init', True)
+        self.space       = design_space
+        self.es          = es 
+        self.acq         = acq
+        self.pop         = conf.get('pop', 100)
+        self.iter        = conf.get('iters',500)
+        self.verbose     = conf.get('verbose', False)
+        self.repair      = conf.get('repair', None)
+        self.sobol_init  = conf.get('sobol_init', True)
+        self.num_workers = conf.get('num_workers', 1)
+        self.executor    = conf.get('executor', 'thread')
+        self.num_threads = conf.get('num_threads', 1)
+        self.early_stop  = conf.get('early_stop', False)
+        self.max_time    = conf.get('max_time', None)
+        self.term_conf   = {k : conf[k] for k in ['patience', 'ftol', 'hv_tol', 'div_tol'] if k in conf}
+        self.stats       = None
         assert(self.acq.num_obj > 0)
 
         if self.es is None:
@@ -72,7 +130,7 @@ class EvolutionOpt:
 
     def get_init_pop(self, initial_suggest : pd.DataFrame = None) -> np.ndarray:
         if not self.sobol_init:
-            init_pop = self.space.sample(self.pop)
+            x, xe = self.space.transform(self.space.sample(self.pop))
         else:
             self.eng   = SobolEngine(self.space.num_paras, scramble = True)
             sobol_samp = self.eng.draw(self.pop)
@@ -82,34 +140,33 @@ class EvolutionOpt:
             for i, n in enumerate(self.space.numeric_names):
                 if self.space.paras[n].is_discrete_after_transform:
                     x[:, i] = x[:, i].round()
-            init_pop = self.space.inverse_transform(x, xe)
+            x, xe = self.space.project(x, xe)
         if initial_suggest is not None:
-            init_pop = pd.concat([initial_suggest, init_pop], axis = 0).head(self.pop)
-        x, xe = self.space.transform(init_pop)
+            x_init, xe_init = self.space.transform(initial_suggest)
+            x  = torch.cat([x_init, x],   dim = 0)[:self.pop]
+            xe = torch.cat([xe_init, xe], dim = 0)[:self.pop]
         return np.hstack([x.numpy(), xe.numpy().astype(float)])
 
-    def get_mutation(self):
-        mask = []
-        for name in (self.space.numeric_names + self.space.enum_names):
-            if self.space.paras[name].is_discrete_after_transform:
-                mask.append('int')
-            else:
-                mask.append('real')
+    def get_mask(self, idx : np.ndarray = None) -> [str]:
+        names = self.space.numeric_names + self.space.enum_names
+        if idx is not None:
+            names = [names[i] for i in idx]
+        return ['int' if self.space.paras[name].is_discrete_after_transform else 'real' for name in names]
 
+    def get_mutation(self, idx : np.ndarray = None):
+        from pymoo.factory import get_mutation
+        from pymoo.operators.mixed_variable_operator import MixedVariableMutation
+        mask     = self.get_mask(idx)
         mutation = MixedVariableMutation(mask, {
             'real' : get_mutation('real_pm', eta = 20), 
             'int'  : get_mutation('int_pm', eta = 20)
         })
         return mutation
 
-    def get_crossover(self):
-        mask = []
-        for name in (self.space.numeric_names + self.space.enum_names):
-            if self.space.paras[name].is_discrete_after_transform:
-                mask.append('int')
-            else:
-                mask.append('real')
-
+    def get_crossover(self, idx : np.ndarray = None):
+        from pymoo.factory import get_crossover
+        from pymoo.operators.mixed_variable_operator import MixedVariableCrossover
+        mask      = self.get_mask(idx)
         crossover = MixedVariableCrossover(mask, {
             'real' : get_crossover('real_sbx', eta = 15, prob = 0.9), 
             'int'  : get_crossover('int_sbx', eta = 15, prob = 0.9)
@@ -117,20 +174,37 @@ class EvolutionOpt:
         return crossover
 
     def optimize(self, initial_suggest : pd.DataFrame = None, fix_input : dict = None, return_pop = False) -> pd.DataFrame:
+        from pymoo.factory import get_algorithm
+        from pymoo.optimize import minimize
+        from .pymoo_problem import BOProblem, ConvergenceTermination
         lb        = self.space.opt_lb.numpy()
         ub        = self.space.opt_ub.numpy()
-        prob      = BOProblem(lb, ub, self.acq, self.space, fix_input)
-        init_pop  = self.get_init_pop(initial_suggest)
-        mutation  = self.get_mutation()
-        crossover = self.get_crossover()
+        prob      = BOProblem(lb, ub, self.acq, self.space, fix_input, drop_fixed = self.repair is None)
+        if prob.n_var == 0: # every parameter is fixed
+            df_opt = pd.DataFrame([fix_input])[self.space.para_names]
+            return df_opt
+        init_pop  = self.get_init_pop(initial_suggest)[:, prob.free_idx]
+        mutation  = self.get_mutation(prob.free_idx)
+        crossover = self.get_crossover(prob.free_idx)
         algo      = get_algorithm(self.es, pop_size = self.pop, sampling = init_pop, mutation = mutation, crossover = crossover, repair = self.repair)
-        res       = minimize(prob, algo, ('n_gen', self.iter), verbose = self.verbose)
+        term      = ConvergenceTermination(self.iter, self.max_time, self.early_stop, **self.term_conf)
+        with ParallelEvaluator(self.acq, self.num_workers, self.executor, self.num_threads) as evaluator:
+            prob.evaluator = evaluator
+            res = minimize(prob, algo, term, verbose = self.verbose)
+        prob.evaluator = None
+        self.stats = {
+                'n_gen'  : res.algorithm.n_gen,
+                'n_eval' : res.algorithm.evaluator.n_eval,
+                'time'   : res.exec_time,
+                'reason' : res.algorithm.termination.reason
+                }
         if res.X is not None and not return_pop:
-            opt_x = res.X.reshape(-1, len(lb)).astype(float)
+            opt_x = res.X.reshape(-1, prob.n_var).astype(float)
         else:
             opt_x = np.array([p.X for p in res.pop]).astype(float)
             if self.acq.num_obj == 1 and not return_pop:
                 opt_x = opt_x[[np.random.choice(opt_x.shape[0])]]
+        opt_x     = prob.expand(opt_x)
         
         self.res  = res
         opt_xcont = torch.from_numpy(opt_x[:, :self.space.num_numeric])
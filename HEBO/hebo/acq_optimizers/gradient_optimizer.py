@@ -0,0 +1,199 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import numpy  as np
+import pandas as pd
+import torch
+from torch.quasirandom import SobolEngine
+from torch.distributions import Dirichlet
+
+from ..design_space.design_space import DesignSpace
+from ..acquisitions.acq import Acquisition
+
+class GradientOpt:
+    """
+    Batched multi-start gradient optimizer of acquisition functions
+
+    - All starts are optimized together, the acquisition is evaluated once per
+      step on the whole `(n_starts, dim)` batch
+    - Continuous dimensions are optimized by projected Adam or L-BFGS in the
+      unit cube, discrete dimensions (integers, categories...) are then
+      improved by a coordinate-wise enumeration of their values
+    - Multi-objective acquisitions (like MACE) are scalarized with a random
+      weight vector per start, so that the starts spread over the Pareto front
+    - Constraints are handled by a penalty on positive (standardized)
+      constraint values
+
+    The surrogate model has to be differentiable w.r.t the continuous inputs
+    (`model.support_grad == True`)
+    """
+    def __init__(self,
+            design_space : DesignSpace,
+            acq          : Acquisition,
+            **conf):
+        self.space      = design_space
+        self.acq        = acq
+        self.n_starts   = conf.get('n_starts', 100)
+        self.iter       = conf.get('iters', 100)
+        self.lr         = conf.get('lr', 0.02)
+        self.optimizer  = conf.get('optimizer', 'adam')
+        self.max_enum   = conf.get('max_enum', 32)
+        self.penalty    = conf.get('penalty', 10.)
+        self.verbose    = conf.get('verbose', False)
+        assert(self.acq.num_obj > 0)
+        assert(self.optimizer in ['adam', 'lbfgs'])
+
+    def get_init_pop(self, initial_suggest : pd.DataFrame = None) -> torch.FloatTensor:
+        eng   = SobolEngine(self.space.num_paras, scramble = True)
+        samp  = eng.draw(self.n_starts)
+        samp  = samp * (self.space.opt_ub - self.space.opt_lb) + self.space.opt_lb
+        x     = samp[:, :self.space.num_numeric]
+        xe    = samp[:, self.space.num_numeric:].round().long()
+        x, xe = self.space.project(x, xe)
+        if initial_suggest is not None:
+            x_init, xe_init = self.space.transform(initial_suggest)
+            x  = torch.cat([x_init, x],   dim = 0)[:self.n_starts]
+            xe = torch.cat([xe_init, xe], dim = 0)[:self.n_starts]
+        return torch.cat([x, xe.float()], dim = 1)
+
+    def split(self, x : torch.FloatTensor) -> (torch.FloatTensor, torch.LongTensor):
+        return x[:, :self.space.num_numeric], x[:, self.space.num_numeric:].round().long()
+
+    def scalarize(self, out : torch.FloatTensor, weights : torch.FloatTensor, loc : torch.FloatTensor, scale : torch.FloatTensor) -> torch.FloatTensor:
+        obj = (out[:, :self.acq.num_obj] - loc[:self.acq.num_obj]) / scale[:self.acq.num_obj]
+        val = (weights * obj).sum(dim = 1)
+        if self.acq.num_constr > 0:
+            constr = out[:, self.acq.num_obj:] / scale[self.acq.num_obj:]
+            val    = val + self.penalty * constr.clamp(min = 0.).sum(dim = 1)
+        return val
+
+    def optimize(self, initial_suggest : pd.DataFrame = None, fix_input : dict = None, return_pop = False) -> pd.DataFrame:
+        num_numeric      = self.space.num_numeric
+        lb               = self.space.opt_lb.float()
+        ub               = self.space.opt_ub.float()
+        fix_idx, fix_val = self.space.transform_fixed(fix_input)
+        names            = self.space.numeric_names + self.space.enum_names
+        is_disc          = np.array([self.space.paras[n].is_discrete_after_transform for n in names], dtype = bool)
+        is_free          = np.ones(len(names), dtype = bool)
+        is_free[fix_idx] = False
+        cont_idx         = torch.LongTensor(np.where(~is_disc & is_free)[0])
+        disc_idx         = np.where(is_disc & is_free)[0]
+
+        x = self.get_init_pop(initial_suggest)
+        x[:, fix_idx] = torch.FloatTensor(fix_val)
+
+        with torch.no_grad():
+            out     = self.acq(*self.split(x))
+            loc     = out.mean(dim = 0)
+            scale   = out.std(dim = 0).clamp(min = 1e-6) if x.shape[0] > 1 else torch.ones(out.shape[1])
+            weights = Dirichlet(torch.ones(self.acq.num_obj)).sample((x.shape[0], ))
+
+        if cont_idx.numel() > 0:
+            x = self.optimize_cont(x, cont_idx, lb, ub, weights, loc, scale)
+        if disc_idx.size > 0:
+            x = self.optimize_disc(x, disc_idx, lb, ub, weights, loc, scale)
+
+        with torch.no_grad():
+            out = self.acq(*self.split(x))
+        opt_x = x[self.select(out, return_pop)]
+
+        opt_xcont, opt_xenum = self.space.project(*self.split(opt_x))
+        df_opt = self.space.inverse_transform(opt_xcont, opt_xenum)
+        if fix_input is not None:
+            for k, v in fix_input.items():
+                df_opt[k] = v
+        return df_opt
+
+    def optimize_cont(self, x, cont_idx, lb, ub, weights, loc, scale) -> torch.FloatTensor:
+        x     = x.clone()
+        c_lb  = lb[cont_idx]
+        c_rng = (ub[cont_idx] - c_lb).clamp(min = 1e-12)
+        z     = ((x[:, cont_idx] - c_lb) / c_rng).clamp(0., 1.).requires_grad_(True)
+        if self.optimizer == 'adam':
+            opt = torch.optim.Adam([z], lr = self.lr)
+        else:
+            opt = torch.optim.LBFGS([z], lr = 1., max_iter = 1, line_search_fn = 'strong_wolfe')
+        sch = torch.optim.lr_scheduler.CosineAnnealingLR(opt, self.iter)
+
+        # best iterate of each start, Adam's momentum can throw a start away
+        # from a non-smooth optimum (e.g., on a penalized constraint boundary)
+        # after the learning rate has been annealed
+        best_z   = z.detach().clone()
+        best_val = torch.full((x.shape[0], ), np.inf)
+        def closure():
+            # the L-BFGS line search evaluates trial points outside of the
+            # unit cube, they are projected before the evaluation
+            opt.zero_grad()
+            zc     = z.clamp(0., 1.)
+            x_full = x.index_copy(1, cont_idx, c_lb + c_rng * zc)
+            val    = self.scalarize(self.acq.eval_grad(*self.split(x_full)), weights, loc, scale)
+            loss   = val.sum()
+            loss.backward()
+            with torch.no_grad():
+                improved           = val < best_val
+                best_val[improved] = val[improved]
+                best_z[improved]   = zc[improved]
+            return loss
+
+        for i in range(self.iter):
+            loss = opt.step(closure)
+            sch.step()
+            with torch.no_grad():
+                z.clamp_(0., 1.)
+            if self.verbose and i % 10 == 0:
+                print('Iter %d, acq = %g' % (i, loss.item()), flush = True)
+        closure()
+        with torch.no_grad():
+            x[:, cont_idx] = c_lb + c_rng * best_z
+        return x
+
+    def optimize_disc(self, x, disc_idx, lb, ub, weights, loc, scale) -> torch.FloatTensor:
+        """
+        One coordinate-wise sweep over the discrete dimensions, all the values
+        of a dimension are tried for all starts at once, dimensions with more
+        than `max_enum` values are left unchanged
+        """
+        x = x.clone()
+        with torch.no_grad():
+            best = self.scalarize(self.acq(*self.split(x)), weights, loc, scale)
+            for d in disc_idx:
+                values = torch.arange(lb[d].round().item(), ub[d].round().item() + 1)
+                if values.numel() > self.max_enum:
+                    continue
+                cand       = x.repeat(values.numel(), 1)
+                cand[:, d] = values.repeat_interleave(x.shape[0])
+                val        = self.scalarize(self.acq(*self.split(cand)), weights.repeat(values.numel(), 1), loc, scale)
+                val        = val.view(values.numel(), x.shape[0])
+                val_min, arg_min = val.min(dim = 0)
+                improved   = val_min < best
+                x[improved, d]   = values[arg_min[improved]]
+                best[improved]   = val_min[improved]
+        return x
+
+    def select(self, out : torch.FloatTensor, return_pop : bool) -> np.ndarray:
+        """
+        Indices of the returned starts: all of them if `return_pop`, the best
+        one for single objective acquisitions and the non-dominated ones
+        otherwise, infeasible starts are only returned if nothing is feasible
+        """
+        num_x = out.shape[0]
+        if return_pop:
+            return np.arange(num_x)
+        obj      = out[:, :self.acq.num_obj].numpy()
+        feasible = np.ones(num_x, dtype = bool)
+        if self.acq.num_constr > 0:
+            feasible = (out[:, self.acq.num_obj:].numpy() <= 0).all(axis = 1)
+            if not feasible.any():
+                feasible = np.ones(num_x, dtype = bool)
+        cand = np.where(feasible)[0]
+        obj  = obj[cand]
+        if self.acq.num_obj == 1:
+            return cand[[np.argmin(obj.reshape(-1))]]
+        dominated = ((obj[:, None, :] <= obj[None, :, :]).all(axis = 2) & (obj[:, None, :] < obj[None, :, :]).any(axis = 2)).any(axis = 0)
+        return cand[~dominated]
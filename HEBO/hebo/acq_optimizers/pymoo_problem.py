@@ -0,0 +1,165 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import time
+import numpy as np
+import torch
+from pymoo.factory import get_performance_indicator
+from pymoo.core.problem import Problem
+from pymoo.core.termination import Termination
+from pymoo.config import Config
+Config.show_compile_hint = False
+
+from ..design_space.design_space import DesignSpace
+from ..acquisitions.acq import Acquisition
+from .evolution_optimizer import ParallelEvaluator
+
+class BOProblem(Problem):
+    def __init__(self,
+            lb    : np.ndarray,
+            ub    : np.ndarray,
+            acq   : Acquisition,
+            space : DesignSpace, 
+            fix   : dict = None, 
+            drop_fixed : bool = True,
+            evaluator  : ParallelEvaluator = None
+            ):
+        """
+        fix:        parameters fixed during the optimisation, the fixed values
+                    are transformed once and written into the transformed
+                    inputs before calling the acquisition function
+        drop_fixed: remove the fixed dimensions from the search vector, `x`
+                    passed to `_evaluate` then only contains the free dimensions
+        evaluator:  backend evaluating the acquisition on the population,
+                    default to a single call in the calling thread
+        """
+        self.acq   = acq
+        self.space = space
+        self.evaluator = evaluator
+        self.fix   = fix # NOTE: use self.fix to enable contextual BO
+        self.dim   = len(lb)
+        self.fix_idx, self.fix_val = space.transform_fixed(fix)
+        if drop_fixed:
+            self.free_idx = np.setdiff1d(np.arange(self.dim), self.fix_idx)
+        else:
+            self.free_idx = np.arange(self.dim)
+        lb = np.asarray(lb)[self.free_idx]
+        ub = np.asarray(ub)[self.free_idx]
+        super().__init__(len(lb), xl = lb, xu = ub, n_obj = acq.num_obj, n_constr = acq.num_constr)
+
+    def expand(self, x : np.ndarray) -> np.ndarray:
+        """
+        Map search vectors to full transformed vectors with fixed values filled in
+        """
+        x_full = np.zeros((x.shape[0], self.dim))
+        x_full[:, self.free_idx] = x
+        x_full[:, self.fix_idx]  = self.fix_val
+        return x_full
+
+    def _evaluate(self, x : np.ndarray, out : dict, *args, **kwargs):
+        num_x = x.shape[0]
+        x     = self.expand(x.astype(float))
+        xcont = torch.FloatTensor(x[:, :self.space.num_numeric])
+        xenum = torch.FloatTensor(x[:, self.space.num_numeric:]).round().long()
+
+        if self.evaluator is not None:
+            acq_eval = self.evaluator(xcont, xenum)
+        else:
+            with torch.no_grad():
+                acq_eval = self.acq(xcont, xenum).numpy()
+        acq_eval = acq_eval.reshape(num_x, self.acq.num_obj + self.acq.num_constr)
+        out['F'] = acq_eval[:, :self.acq.num_obj]
+
+        if self.acq.num_constr > 0:
+            out['G'] = acq_eval[:, -1 * self.acq.num_constr:]
+
+class ConvergenceTermination(Termination):
+    """
+    Termination of the acquisition optimisation, `reason` records the
+    criterion that stopped it
+
+    - 'max_gen':    `max_gen` generations have been run
+    - 'max_time':   `max_time` seconds of wall-clock time have elapsed
+    - 'stagnation': single objective, the best feasible value improved by
+                    less than `ftol` (relative) in the last `patience` generations
+    - 'hv':         multiple objectives, the hypervolume of the feasible
+                    non-dominated front, with objectives normalized by the
+                    range of the first population, changed by less than
+                    `hv_tol` (relative) in the last `patience` generations
+    - 'diversity':  the mean standard deviation of the population, normalized
+                    by the bounds, fell below `div_tol`
+
+    The last three criteria are only checked if `early_stop` is True
+    """
+    def __init__(self,
+            max_gen    : int,
+            max_time   : float = None,
+            early_stop : bool  = False,
+            patience   : int   = 10,
+            ftol       : float = 1e-6,
+            hv_tol     : float = 1e-4,
+            div_tol    : float = 1e-6):
+        super().__init__()
+        self.max_gen    = max_gen
+        self.max_time   = max_time
+        self.early_stop = early_stop
+        self.patience   = patience
+        self.ftol       = ftol
+        self.hv_tol     = hv_tol
+        self.div_tol    = div_tol
+        self.history    = []
+        self.reason     = None
+        self.f_lb       = None
+        self.f_ub       = None
+
+    def _do_continue(self, algorithm):
+        self.reason = self.check(algorithm)
+        return self.reason is None
+
+    def check(self, algorithm) -> str:
+        if algorithm.n_gen >= self.max_gen:
+            return 'max_gen'
+        if self.max_time is not None and time.time() - algorithm.start_time >= self.max_time:
+            return 'max_time'
+        if not self.early_stop:
+            return None
+
+        xl, xu = algorithm.problem.xl, algorithm.problem.xu
+        width  = np.where(xu > xl, xu - xl, 1.)
+        X      = (algorithm.pop.get('X').astype(float) - xl) / width
+        if X.std(axis = 0).mean() < self.div_tol:
+            return 'diversity'
+
+        self.history.append(self.indicator(algorithm))
+        if len(self.history) > self.patience:
+            old = self.history[-1 - self.patience]
+            new = self.history[-1]
+            tol = self.ftol if algorithm.problem.n_obj == 1 else self.hv_tol
+            if np.isfinite(old) and np.isfinite(new) and abs(new - old) <= tol * max(abs(old), 1.):
+                return 'stagnation' if algorithm.problem.n_obj == 1 else 'hv'
+        return None
+
+    def indicator(self, algorithm) -> float:
+        """
+        Best feasible value for one objective, hypervolume of the feasible
+        front otherwise, NaN if no feasible solution has been found
+        """
+        F, CV    = algorithm.opt.get('F', 'CV')
+        feasible = (CV <= 0).reshape(-1)
+        if not feasible.any():
+            return np.nan
+        F = F[feasible]
+        if F.shape[1] == 1:
+            return F.min()
+        if self.f_lb is None:
+            F_pop     = algorithm.pop.get('F')
+            self.f_lb = F_pop.min(axis = 0)
+            self.f_ub = np.where(F_pop.max(axis = 0) > self.f_lb, F_pop.max(axis = 0), self.f_lb + 1.)
+        hv = get_performance_indicator('hv', ref_point = 1.1 * np.ones(F.shape[1]))
+        return hv.do((F - self.f_lb) / (self.f_ub - self.f_lb))
@@ -38,6 +38,22 @@ class Acquisition(ABC):
     def __call__(self, x : Tensor,  xe : Tensor):
         return self.eval(x, xe)
 
+    def eval_grad(self, x : Tensor,  xe : Tensor) -> Tensor:
+        """
+        Differentiable version of `eval` used by gradient-based acquisition
+        optimizers, the same as `eval` unless overridden
+        """
+        return self.eval(x, xe)
+
+    def predict_mean_var(self, x : Tensor, xe : Tensor) -> (Tensor, Tensor):
+        """
+        Fused mean/variance prediction of the model, falls back to `predict`
+        for models not derived from `BaseModel`
+        """
+        if hasattr(self.model, 'predict_mean_var'):
+            return self.model.predict_mean_var(x, xe)
+        return self.model.predict(x, xe)
+
 class SingleObjectiveAcq(Acquisition):
     """
     Single-objective, unconstrained acquisition
@@ -60,7 +76,7 @@ class LCB(SingleObjectiveAcq):
         assert(model.num_out == 1)
     
     def eval(self, x : Tensor, xe : Tensor) -> Tensor:
-        py, ps2 = self.model.predict(x, xe)
+        py, ps2 = self.predict_mean_var(x, xe)
         return py - self.kappa * ps2.sqrt()
 
 class Mean(SingleObjectiveAcq):
@@ -69,7 +85,7 @@ class Mean(SingleObjectiveAcq):
         assert(model.num_out == 1)
 
     def eval(self, x : Tensor, xe : Tensor) -> Tensor:
-        py, _ = self.model.predict(x, xe)
+        py, _ = self.predict_mean_var(x, xe)
         return py
 
 class Sigma(SingleObjectiveAcq):
@@ -78,7 +94,7 @@ class Sigma(SingleObjectiveAcq):
         assert(model.num_out == 1)
 
     def eval(self, x : Tensor, xe : Tensor) -> Tensor:
-        _, ps2 = self.model.predict(x, xe)
+        _, ps2 = self.predict_mean_var(x, xe)
         return -1 * ps2.sqrt()
 
 class EI(SingleObjectiveAcq):
@@ -118,7 +134,7 @@ class MOMeanSigmaLCB(Acquisition):
         """
         with torch.no_grad():
             out        = torch.zeros(x.shape[0], self.num_obj + self.num_constr)
-            py, ps2    = self.model.predict(x, xe)
+            py, ps2    = self.predict_mean_var(x, xe)
             noise      = np.sqrt(self.model.noise)
             py        += noise * torch.randn(py.shape)
             ps         = ps2.sqrt()
@@ -148,27 +164,36 @@ class MACE(Acquisition):
         minimize (-1 * EI,  -1 * PI, lcb)
         """
         with torch.no_grad():
-            py, ps2   = self.model.predict(x, xe)
-            noise     = np.sqrt(2.0) * self.model.noise.sqrt()
-            ps        = ps2.sqrt().clamp(min = torch.finfo(ps2.dtype).eps)
-            lcb       = (py + noise * torch.randn(py.shape)) - self.kappa * ps
-            normed    = ((self.tau - self.eps - py - noise * torch.randn(py.shape)) / ps)
-            dist      = Normal(0., 1.)
-            log_phi   = dist.log_prob(normed)
-            Phi       = dist.cdf(normed)
-            PI        = Phi
-            EI        = ps * (Phi * normed +  log_phi.exp())
-            logEIapp  = ps.log() - 0.5 * normed**2 - (normed**2 - 1).log()
-            logPIapp  = -0.5 * normed**2 - torch.log(-1 * normed) - torch.log(torch.sqrt(torch.tensor(2 * np.pi)))
-
-            use_app             = ~((normed > -6) & torch.isfinite(EI.log()) & torch.isfinite(PI.log())).reshape(-1)
-            out                 = torch.zeros(x.shape[0], 3)
-            out[:, 0]           = lcb.reshape(-1)
-            out[:, 1][use_app]  = -1 * logEIapp[use_app].reshape(-1)
-            out[:, 2][use_app]  = -1 * logPIapp[use_app].reshape(-1)
-            out[:, 1][~use_app] = -1 * EI[~use_app].log().reshape(-1)
-            out[:, 2][~use_app] = -1 * PI[~use_app].log().reshape(-1)
-            return out
+            return self.eval_grad(x, xe)
+
+    def eval_grad(self, x : torch.FloatTensor, xe : torch.LongTensor) -> torch.FloatTensor:
+        """
+        `eval` with gradients, masked branches are evaluated on safe values
+        to avoid NaN gradients
+        """
+        py, ps2   = self.predict_mean_var(x, xe)
+        noise     = np.sqrt(2.0) * self.model.noise.sqrt()
+        ps        = ps2.sqrt().clamp(min = torch.finfo(ps2.dtype).eps)
+        lcb       = (py + noise * torch.randn(py.shape)) - self.kappa * ps
+        normed    = ((self.tau - self.eps - py - noise * torch.randn(py.shape)) / ps)
+        dist      = Normal(0., 1.)
+        log_phi   = dist.log_prob(normed)
+        Phi       = dist.cdf(normed)
+        PI        = Phi
+        EI        = ps * (Phi * normed +  log_phi.exp())
+        use_app   = ~((normed > -6) & torch.isfinite(EI.log()) & torch.isfinite(PI.log()))
+
+        normed_app = torch.where(use_app, normed, -2 * torch.ones_like(normed))
+        logEIapp   = ps.log() - 0.5 * normed_app**2 - (normed_app**2 - 1).log()
+        logPIapp   = -0.5 * normed_app**2 - torch.log(-1 * normed_app) - torch.log(torch.sqrt(torch.tensor(2 * np.pi)))
+        logEI      = torch.where(use_app, torch.ones_like(EI), EI).log()
+        logPI      = torch.where(use_app, torch.ones_like(PI), PI).log()
+
+        out = torch.cat([
+            lcb.reshape(-1, 1), 
+            -1 * torch.where(use_app, logEIapp, logEI).reshape(-1, 1), 
+            -1 * torch.where(use_app, logPIapp, logPI).reshape(-1, 1)], dim = 1)
+        return out
 
 class NoisyAcq(Acquisition):
     def __init__(self, model, num_obj, num_constr):
@@ -231,7 +256,7 @@ class GeneralAcq(Acquisition):
                  lcb_cn < 0
         """
         with torch.no_grad():
-            py, ps2 = self.model.predict(x, xe)
+            py, ps2 = self.predict_mean_var(x, xe)
             ps      = ps2.sqrt().clamp(min = torch.finfo(ps2.dtype).eps)
             if self.use_noise:
                 noise  = self.model.noise.sqrt()
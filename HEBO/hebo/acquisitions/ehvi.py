@@ -0,0 +1,124 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import numpy as np
+
+class BoxDecomposition:
+    """
+    Partitioning of the non-dominated region of a Pareto front (minimization)
+    into disjoint axis-aligned boxes
+
+    The region `{z <= ref_point : z not dominated by the front}` starts as the
+    single box `[-inf, ref_point]`, adding a point removes the part of every
+    box it dominates, which splits an affected box into at most `num_obj`
+    disjoint boxes. The hypervolume improvement of `y` is the volume of the
+    boxes inside `[y, ref_point]`
+    """
+    def __init__(self, ref_point : np.ndarray, y : np.ndarray = None):
+        self.ref_point = np.asarray(ref_point, dtype = float).reshape(-1)
+        self.num_obj   = self.ref_point.shape[0]
+        self.lb        = np.full((1, self.num_obj), -np.inf)
+        self.ub        = self.ref_point.reshape(1, -1).copy()
+        if y is not None:
+            for p in np.asarray(y, dtype = float).reshape(-1, self.num_obj):
+                self.update(p)
+
+    @property
+    def num_boxes(self) -> int:
+        return self.lb.shape[0]
+
+    def copy(self):
+        dec    = BoxDecomposition.__new__(BoxDecomposition)
+        dec.ref_point = self.ref_point
+        dec.num_obj   = self.num_obj
+        dec.lb        = self.lb.copy()
+        dec.ub        = self.ub.copy()
+        return dec
+
+    def update(self, p : np.ndarray):
+        """
+        Add one point to the front
+        """
+        p        = np.asarray(p, dtype = float).reshape(-1)
+        q        = np.maximum(self.lb, p)
+        affected = (q < self.ub).all(axis = 1)
+        if not affected.any():
+            return
+        lb, ub, q = self.lb[affected], self.ub[affected], q[affected]
+        new_lb    = [self.lb[~affected]]
+        new_ub    = [self.ub[~affected]]
+        for d in range(self.num_obj):
+            keep    = q[:, d] > lb[:, d]
+            lb_d    = lb[keep].copy()
+            ub_d    = ub[keep].copy()
+            lb_d[:, :d] = q[keep, :d]
+            ub_d[:, d]  = q[keep, d]
+            new_lb.append(lb_d)
+            new_ub.append(ub_d)
+        self.lb = np.concatenate(new_lb, axis = 0)
+        self.ub = np.concatenate(new_ub, axis = 0)
+
+    def hvi(self, y : np.ndarray) -> np.ndarray:
+        """
+        Hypervolume improvement of each row of `y` w.r.t. the current front
+        """
+        return box_hvi(y.reshape(1, -1, self.num_obj), [self])[0]
+
+def box_hvi(y : np.ndarray, decs : [BoxDecomposition], max_elem : int = 2**22) -> np.ndarray:
+    """
+    Hypervolume improvements of `y[s, j]` w.r.t. `decs[s]` for all `s` and
+    `j` at once, `y` is of shape (num_samples, num_points, num_obj)
+
+    The boxes of all decompositions are concatenated, every point is compared
+    with the boxes of its own decomposition and the volumes are summed per
+    decomposition, the computation is chunked over boxes so that at most
+    `max_elem` elements are allocated
+    """
+    num_samp, num_pts, num_obj = y.shape
+    lb    = np.concatenate([dec.lb for dec in decs], axis = 0)
+    ub    = np.concatenate([dec.ub for dec in decs], axis = 0)
+    owner = np.repeat(np.arange(num_samp), [dec.num_boxes for dec in decs])
+    hvi   = np.zeros((num_samp, num_pts))
+    chunk = max(1, max_elem // (num_pts * num_obj))
+    for start in range(0, lb.shape[0], chunk):
+        sl      = slice(start, start + chunk)
+        y_box   = y[owner[sl]]                                   # (chunk, num_pts, num_obj)
+        side    = ub[sl, None, :] - np.maximum(y_box, lb[sl, None, :])
+        contrib = np.clip(side, 0, None).prod(axis = 2)          # (chunk, num_pts)
+        np.add.at(hvi, owner[sl], contrib)
+    return hvi
+
+def greedy_qehvi(front : np.ndarray, ref_point : np.ndarray, y_samp : np.ndarray, n_suggestions : int) -> [int]:
+    """
+    Sequential greedy batch selection with Monte-Carlo EHVI
+
+    front:  (n, num_obj) current Pareto front
+    y_samp: (num_samples, num_cand, num_obj) posterior samples of the candidates
+
+    Each posterior sample keeps its own box decomposition, conditioned on the
+    sampled values of the points selected so far, so the EHVI of the `i`-th
+    point is the expected joint improvement of the batch given the previous
+    `i - 1` points. Returns indices of the selected candidates, points are
+    selected at random when no candidate improves the hypervolume
+    """
+    num_samp, num_cand, _ = y_samp.shape
+    base      = BoxDecomposition(ref_point, front)
+    decs      = [base.copy() for _ in range(num_samp)]
+    select_id = []
+    for _ in range(min(n_suggestions, num_cand)):
+        ehvi            = box_hvi(y_samp, decs).mean(axis = 0)
+        ehvi[select_id] = -np.inf
+        if ehvi.max() > 0:
+            best_id = int(np.argmax(ehvi))
+        else:
+            best_id = int(np.random.choice(np.setdiff1d(np.arange(num_cand), select_id)))
+        for s, dec in enumerate(decs):
+            dec.update(y_samp[s, best_id])
+        select_id.append(best_id)
+    return select_id
@@ -27,6 +27,14 @@ class BoolPara(Parameter):
     def inverse_transform(self, x):
         return x > 0.5
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        return x.astype(float)
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        return list((x > 0.5).T)
+
     @property
     def is_numeric(self):
         # XXX: It's OK to view boolean as numeric value, this may reduce
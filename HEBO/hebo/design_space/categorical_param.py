@@ -7,7 +7,8 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
-import numpy as np
+import numpy  as np
+import pandas as pd
 from .param import Parameter
 
 class CategoricalPara(Parameter):
@@ -18,6 +19,16 @@ class CategoricalPara(Parameter):
             self._categories_dict = {k:v for v, k in enumerate(self.categories)}
         except TypeError: # there are unhashable types
             self._categories_dict = None
+        self._categories_arr = np.empty(len(self.categories), dtype = object)
+        for i, cat in enumerate(self.categories):
+            self._categories_arr[i] = cat
+        try:
+            # hash table of the categories, used to encode a whole column at once
+            self._categories_idx = pd.Index(self._categories_arr, dtype = object)
+            if not self._categories_idx.is_unique:
+                self._categories_idx = None
+        except TypeError:
+            self._categories_idx = None
         self.lb         = 0
         self.ub         = len(self.categories) - 1
 
@@ -35,7 +46,34 @@ class CategoricalPara(Parameter):
         return ret.astype(float)
 
     def inverse_transform(self, x):
-        return np.array([self.categories[x_] for x_ in x.round().astype(int)])
+        return self._categories_arr[x.round().astype(int)]
+
+    @classmethod
+    def transform_batch(cls, paras, x):
+        """
+        Columns sharing the same categories are encoded with one hash table
+        lookup, unhashable categories and unknown values (for which
+        `transform` raises) go through `transform`
+        """
+        out    = np.zeros(x.shape)
+        groups = {}
+        for i, para in enumerate(paras):
+            key = tuple(para.categories) if para._categories_idx is not None else i
+            groups.setdefault(key, []).append(i)
+        for cols in groups.values():
+            idx   = paras[cols[0]]._categories_idx
+            codes = idx.get_indexer(x[:, cols].ravel()).reshape(x.shape[0], len(cols)) if idx is not None else None
+            if codes is not None and (codes >= 0).all():
+                out[:, cols] = codes
+            else:
+                for i in cols:
+                    out[:, i] = paras[i].transform(x[:, i])
+        return out
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        codes = x.round().astype(int)
+        return [para._categories_arr[codes[:, i]] for i, para in enumerate(paras)]
 
     @property
     def is_numeric(self):
@@ -7,6 +7,7 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
+import numpy  as np
 import pandas as pd
 import torch
 from torch import Tensor
@@ -20,6 +21,47 @@ from .pow_integer_param import PowIntegerPara
 from .int_exponent_param import IntExponentPara
 from .step_int import StepIntPara
 
+class TransformPlan:
+    """
+    Parameters grouped by type, so that transformation is done with one
+    batched operation per parameter type instead of one call per parameter
+    """
+    def __init__(self, paras : list):
+        self.num_paras = len(paras)
+        groups         = {}
+        for i, para in enumerate(paras):
+            cols, group_paras = groups.setdefault(type(para), ([], []))
+            cols.append(i)
+            group_paras.append(para)
+        self.groups = [(para_cls, np.array(cols), group_paras) for para_cls, (cols, group_paras) in groups.items()]
+
+    def transform(self, x : np.ndarray) -> np.ndarray:
+        out = np.zeros(x.shape)
+        for para_cls, cols, paras in self.groups:
+            out[:, cols] = para_cls.transform_batch(paras, x[:, cols])
+        return out
+
+    def inverse_transform(self, x : np.ndarray) -> list:
+        out = [None] * self.num_paras
+        for para_cls, cols, paras in self.groups:
+            for col, val in zip(cols, para_cls.inverse_transform_batch(paras, x[:, cols])):
+                out[col] = val
+        return out
+
+    def project(self, x : np.ndarray) -> np.ndarray:
+        """
+        Equivalent to `transform(inverse_transform(x))`
+        """
+        out = np.zeros(x.shape)
+        for para_cls, cols, paras in self.groups:
+            inv = para_cls.inverse_transform_batch(paras, x[:, cols])
+            if len(inv) > 0:
+                raw = np.empty((x.shape[0], len(inv)), dtype = object if not paras[0].is_numeric else float)
+                for i, col in enumerate(inv):
+                    raw[:, i] = col
+                out[:, cols] = para_cls.transform_batch(paras, raw)
+        return out
+
 class DesignSpace:
     def __init__(self):
         self.para_types = {}
@@ -35,6 +77,7 @@ class DesignSpace:
         self.para_names    = []
         self.numeric_names = []
         self.enum_names    = []
+        self._plans        = None
 
     @property
     def num_paras(self):
@@ -61,9 +104,21 @@ class DesignSpace:
             else:
                 self.numeric_names.append(param.name)
         self.para_names = self.numeric_names + self.enum_names
+        self._plans     = None
         assert len(self.para_names) == len(set(self.para_names)), "There are duplicated parameter names"
         return self
 
+    @property
+    def plans(self) -> (TransformPlan, TransformPlan):
+        """
+        Transformation plans of numeric and enum parameters, built on first use
+        """
+        if self._plans is None:
+            self._plans = (
+                    TransformPlan([self.paras[name] for name in self.numeric_names]),
+                    TransformPlan([self.paras[name] for name in self.enum_names]))
+        return self._plans
+
     def register_para_type(self, type_name, para_class):
         """
         User can define their specific parameter type and register the new type
@@ -86,12 +141,9 @@ class DesignSpace:
         output: xc and xe
         transform data to be within [opt_lb, opt_ub]
         """
-        xc = data[self.numeric_names].values.astype(float).copy()
-        xe = data[self.enum_names].values.copy()
-        for i, name in enumerate(self.numeric_names):
-            xc[:, i] = self.paras[name].transform(xc[:, i])
-        for i, name in enumerate(self.enum_names):
-            xe[:, i] = self.paras[name].transform(xe[:, i])
+        num_plan, enum_plan = self.plans
+        xc = num_plan.transform(data[self.numeric_names].values.astype(float))
+        xe = enum_plan.transform(data[self.enum_names].values)
         return torch.FloatTensor(xc), torch.LongTensor(xe.astype(int))
 
     def inverse_transform(self, x : Tensor, xe : Tensor) -> pd.DataFrame:
@@ -99,13 +151,35 @@ class DesignSpace:
         input: x and xe
         output: pandas dataframe
         """
-        with torch.no_grad():
-            inv_dict = {}
-            for i, name in enumerate(self.numeric_names):
-                inv_dict[name] = self.paras[name].inverse_transform(x.detach().double().numpy()[:, i])
-            for i, name in enumerate(self.enum_names):
-                inv_dict[name] = self.paras[name].inverse_transform(xe.detach().numpy()[:, i])
-            return pd.DataFrame(inv_dict)
+        num_plan, enum_plan = self.plans
+        inv_dict = {}
+        if self.num_numeric > 0:
+            inv_dict.update(zip(self.numeric_names, num_plan.inverse_transform(x.detach().double().numpy())))
+        if self.num_categorical > 0:
+            inv_dict.update(zip(self.enum_names, enum_plan.inverse_transform(xe.detach().numpy())))
+        return pd.DataFrame(inv_dict)
+
+    def transform_fixed(self, fix_input : dict) -> (np.ndarray, np.ndarray):
+        """
+        Column indices and transformed values of the fixed parameters in the
+        concatenated `[xc, xe]` vector
+        """
+        if not fix_input:
+            return np.zeros(0, dtype = int), np.zeros(0)
+        names = self.numeric_names + self.enum_names
+        idx   = np.array([names.index(k) for k in fix_input])
+        val   = np.array([self.paras[k].transform(np.array([v]))[0] for k, v in fix_input.items()], dtype = float)
+        return idx, val
+
+    def project(self, x : Tensor, xe : Tensor) -> (Tensor, Tensor):
+        """
+        Equivalent to `transform(inverse_transform(x, xe))`, i.e., snap
+        transformed data to valid values, without building a dataframe
+        """
+        num_plan, enum_plan = self.plans
+        xc = num_plan.project(x.detach().double().numpy()) if self.num_numeric > 0 else np.zeros((xe.shape[0], 0))
+        xe = enum_plan.project(xe.detach().numpy()) if self.num_categorical > 0 else np.zeros((xc.shape[0], 0))
+        return torch.FloatTensor(xc), torch.LongTensor(xe.astype(int))
 
     @property
     def opt_lb(self):
@@ -27,6 +27,14 @@ class IntegerPara(Parameter):
     def inverse_transform(self, x):
         return x.round().astype(int)
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        return x.astype(float)
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        return list(x.round().astype(int).T)
+
     @property
     def is_numeric(self):
         return True
@@ -27,6 +27,14 @@ class NumericPara(Parameter):
     def inverse_transform(self, x):
         return x
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        return x.astype(float)
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        return list(x.T)
+
     @property
     def is_numeric(self):
         return True
@@ -29,6 +29,26 @@ class Parameter(ABC):
     def inverse_transform(self, x : np.array) -> np.array:
         pass
 
+    @classmethod
+    def transform_batch(cls, paras : list, x : np.ndarray) -> np.ndarray:
+        """
+        Transform a (n, len(paras)) array, column i holds values of paras[i],
+        all parameters in `paras` are instances of `cls`
+
+        Subclasses can override it with a vectorized implementation
+        """
+        out = np.zeros(x.shape)
+        for i, para in enumerate(paras):
+            out[:, i] = para.transform(x[:, i])
+        return out
+
+    @classmethod
+    def inverse_transform_batch(cls, paras : list, x : np.ndarray) -> list:
+        """
+        Inverse transform a (n, len(paras)) array, return a list of columns
+        """
+        return [para.inverse_transform(x[:, i]) for i, para in enumerate(paras)]
+
     @property
     @abstractmethod
     def is_numeric(self) -> bool:
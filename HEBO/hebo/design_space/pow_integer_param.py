@@ -29,6 +29,16 @@ class PowIntegerPara(Parameter):
     def inverse_transform(self, x):
         return (self.base ** x).round().astype(int)
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        base = np.array([p.base for p in paras])
+        return np.log(x) / np.log(base)
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        base = np.array([p.base for p in paras])
+        return list((base ** x).round().astype(int).T)
+
     @property
     def is_numeric(self):
         return True
@@ -28,6 +28,16 @@ class PowPara(Parameter):
     def inverse_transform(self, x):
         return self.base ** x
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        base = np.array([p.base for p in paras])
+        return np.log(x) / np.log(base)
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        base = np.array([p.base for p in paras])
+        return list((base ** x).T)
+
     @property
     def is_numeric(self):
         return True
@@ -32,6 +32,18 @@ class StepIntPara(Parameter):
         x_recover = x * self.step + self.lb
         return x_recover.round().astype(int)
 
+    @classmethod
+    def transform_batch(cls, paras, x):
+        lb   = np.array([p.lb   for p in paras])
+        step = np.array([p.step for p in paras])
+        return (x - lb) / step
+
+    @classmethod
+    def inverse_transform_batch(cls, paras, x):
+        lb   = np.array([p.lb   for p in paras])
+        step = np.array([p.step for p in paras])
+        return list((x * step + lb).round().astype(int).T)
+
     @property
     def is_numeric(self):
         return True
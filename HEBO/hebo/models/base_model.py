@@ -59,6 +59,15 @@ class BaseModel(ABC):
         """
         pass
 
+    def predict_mean_var(self, 
+                Xc : FloatTensor,
+                Xe : LongTensor) -> (FloatTensor, FloatTensor):
+        """
+        Fused predictive mean and variance used by the acquisition functions,
+        models caching their posterior after `fit` override this method, by
+        default it is the same as `predict`
+        """
+        return self.predict(Xc, Xe)
 
     @property
     def noise(self)->FloatTensor:
@@ -14,6 +14,7 @@ import torch.nn.functional as F
 import gpytorch
 
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from torch import Tensor, FloatTensor, LongTensor
 from gpytorch.priors.torch_priors import LogNormalPrior
 from gpytorch.kernels import ScaleKernel, MaternKernel, ProductKernel
@@ -31,6 +32,14 @@ from ..nn.sgld import pSGLD
 from .gp_util import DummyFeatureExtractor, default_kern
 
 class GP(BaseModel):
+    """
+    Exact GP implemented with GPyTorch
+
+    With `num_restarts > 1`, several hyperparameter optimisations are run in
+    a pool of `num_workers` threads, after `probe_epochs` epochs the restarts
+    whose loss is worse than the best one by more than `abandon_tol` are
+    abandoned
+    """
     support_grad = True
     def __init__(self, num_cont, num_enum, num_out, **conf):
         super().__init__(num_cont, num_enum, num_out, **conf)
@@ -43,6 +52,11 @@ class GP(BaseModel):
         self.optimizer   = conf.get('optimizer', 'psgld')
         self.noise_guess = conf.get('noise_guess', 0.01)
         self.ard_kernel  = conf.get('ard_kernel', True)
+        self.num_restarts = conf.get('num_restarts', 1)
+        self.num_workers  = conf.get('num_workers', 1)
+        self.probe_epochs = conf.get('probe_epochs', max(1, self.num_epochs // 5))
+        self.abandon_tol  = conf.get('abandon_tol', 0.2)
+        self.seed         = conf.get('seed', None)
         self.xscaler     = TorchMinMaxScaler((-1, 1))
         self.yscaler     = TorchStandardScaler()
 
@@ -81,44 +95,111 @@ class GP(BaseModel):
         self.Xe = Xe
         self.y  = y
 
+        seed = self.seed
+        if seed is None and self.num_restarts > 1:
+            seed = np.random.randint(2**31 - 1)
+        restarts = [self.init_restart(None if i == 0 else seed + i) for i in range(self.num_restarts)]
+        probe    = min(self.probe_epochs, self.num_epochs) if self.num_restarts > 1 else self.num_epochs
+        losses   = self.run_restarts(restarts, 0, probe)
+        if probe < self.num_epochs:
+            # abandon the restarts whose likelihood is clearly dominated after the probing epochs
+            best     = min(losses)
+            restarts = [r for r, l in zip(restarts, losses) if l <= best + self.abandon_tol]
+            losses   = self.run_restarts(restarts, probe, self.num_epochs)
+        self.gp, self.lik = restarts[int(np.argmin(losses))][:2]
+        self.gp.eval()
+        self.lik.eval()
+        self.build_cache()
+
+    def init_restart(self, seed : int = None):
+        """
+        Build a model and its optimizer, unless `seed` is None, the kernel
+        hyperparameters are perturbed using a generator seeded by `seed`
+        """
         n_constr = GreaterThan(self.noise_lb)
         n_prior  = LogNormalPrior(np.log(self.noise_guess), 0.5)
-        self.lik = GaussianLikelihood(noise_constraint = n_constr, noise_prior = n_prior)
-        self.gp  = GPyTorchModel(self.Xc, self.Xe, self.y, self.lik, **self.conf)
-
-        self.gp.likelihood.noise  = max(1e-2, self.noise_lb)
-
-        self.gp.train()
-        self.lik.train()
+        lik      = GaussianLikelihood(noise_constraint = n_constr, noise_prior = n_prior)
+        gp       = GPyTorchModel(self.Xc, self.Xe, self.y, lik, **self.conf)
+        gp.likelihood.noise = max(1e-2, self.noise_lb)
+        if seed is not None:
+            gen = torch.Generator().manual_seed(seed)
+            with torch.no_grad():
+                for para in gp.cov.parameters():
+                    para.add_(torch.randn(para.shape, generator = gen))
+        gp.train()
+        lik.train()
 
         if self.optimizer.lower() == 'lbfgs':
-            opt = torch.optim.LBFGS(self.gp.parameters(), lr = self.lr, max_iter = 5, line_search_fn = 'strong_wolfe')
+            opt = torch.optim.LBFGS(gp.parameters(), lr = self.lr, max_iter = 5, line_search_fn = 'strong_wolfe')
         elif self.optimizer == 'psgld':
-            opt = pSGLD(self.gp.parameters(), lr = self.lr, factor = 1. / y.shape[0], pretrain_step = self.num_epochs // 10)
+            opt = pSGLD(gp.parameters(), lr = self.lr, factor = 1. / self.y.shape[0], pretrain_step = self.num_epochs // 10)
         else:
-            opt = torch.optim.Adam(self.gp.parameters(), lr = self.lr)
-        mll = gpytorch.mlls.ExactMarginalLogLikelihood(self.lik, self.gp)
-        for epoch in range(self.num_epochs):
-            def closure():
-                dist = self.gp(self.Xc, self.Xe)
-                loss = -1 * mll(dist, self.y.squeeze())
-                opt.zero_grad()
-                loss.backward()
-                return loss
+            opt = torch.optim.Adam(gp.parameters(), lr = self.lr)
+        mll = gpytorch.mlls.ExactMarginalLogLikelihood(lik, gp)
+        return gp, lik, opt, mll
+
+    def run_restarts(self, restarts : list, start : int, end : int) -> [float]:
+        if self.num_workers <= 1 or len(restarts) <= 1:
+            return [self.train_restart(r, start, end) for r in restarts]
+        with ThreadPoolExecutor(max_workers = min(self.num_workers, len(restarts))) as pool:
+            return list(pool.map(lambda r : self.train_restart(r, start, end), restarts))
+
+    def train_restart(self, restart : tuple, start : int, end : int) -> float:
+        """
+        Train one restart from epoch `start` to epoch `end`, return the final
+        negative marginal log likelihood
+        """
+        gp, lik, opt, mll = restart
+        def closure():
+            dist = gp(self.Xc, self.Xe)
+            loss = -1 * mll(dist, self.y.squeeze())
+            opt.zero_grad()
+            loss.backward()
+            return loss
+        for epoch in range(start, end):
             opt.step(closure)
             if self.verbose and ((epoch + 1) % self.print_every == 0 or epoch == 0):
                 print('After %d epochs, loss = %g' % (epoch + 1, closure().item()), flush = True)
-        self.gp.eval()
-        self.lik.eval()
+        with torch.no_grad():
+            loss = -1 * mll(gp(self.Xc, self.Xe), self.y.squeeze()).item()
+        return loss if np.isfinite(loss) else np.inf
+
+    def build_cache(self):
+        """
+        Cache the posterior factorization, i.e., the Cholesky factor `L` of
+        `K + noise * I` and `alpha = (K + noise * I)^{-1} (y - m)`, so that a
+        prediction only costs the cross-covariance and a triangular solve
+        """
+        with torch.no_grad():
+            x_all = self.gp.fe(self.Xc, self.Xe)
+            K     = self.gp.cov(x_all).to_dense().double()
+            K     = K + self.lik.noise.double() * torch.eye(K.shape[0], dtype = K.dtype)
+            jitter = 0.
+            for _ in range(5):
+                L, info = torch.linalg.cholesky_ex(K + jitter * torch.eye(K.shape[0], dtype = K.dtype))
+                if info == 0:
+                    break
+                jitter = max(1e-6 * K.diag().mean().item(), 10 * jitter)
+            resid = (self.y.view(-1) - self.gp.mean(x_all).view(-1)).double().view(-1, 1)
+            alpha = torch.cholesky_solve(resid, L)
+        self.cache = {'x' : x_all.detach(), 'L' : L, 'alpha' : alpha}
 
     def predict(self, Xc, Xe):
+        return self.predict_mean_var(Xc, Xe)
+
+    def predict_mean_var(self, Xc, Xe):
         Xc, Xe = self.xtrans(Xc, Xe)
-        with gpytorch.settings.fast_pred_var(), gpytorch.settings.debug(False):
-            pred = self.gp(Xc, Xe)
+        with gpytorch.settings.debug(False):
+            x_all = self.gp.fe(Xc, Xe)
+            k_xs  = self.gp.cov(self.cache['x'], x_all).to_dense().double()
+            k_ss  = self.gp.cov(x_all, diag = True).double()
+            v     = torch.linalg.solve_triangular(self.cache['L'], k_xs, upper = False)
+            mu_   = self.gp.mean(x_all).double() + (k_xs * self.cache['alpha']).sum(dim = 0)
+            var_  = k_ss - (v**2).sum(dim = 0)
             if self.pred_likeli:
-                pred = self.lik(pred)
-            mu_  = pred.mean.reshape(-1, self.num_out)
-            var_ = pred.variance.reshape(-1, self.num_out)
+                var_ = var_ + self.lik.noise.double()
+            mu_   = mu_.float().reshape(-1, self.num_out)
+            var_  = var_.float().reshape(-1, self.num_out)
         mu  = self.yscaler.inverse_transform(mu_)
         var = var_ * self.yscaler.std**2
         return mu, var.clamp(min = torch.finfo(var.dtype).eps)
@@ -19,6 +19,8 @@ import GPy
 import torch
 import torch.nn as nn
 import numpy as np
+from scipy.linalg import solve_triangular
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from torch import Tensor, FloatTensor, LongTensor
 
@@ -30,7 +32,18 @@ class GPyGP(BaseModel):
 
     Why doing so:
     - Input warped GP
+
+    Calling `fit` again on a fitted model warm-starts the hyperparameter
+    optimisation from the previous solution, random restarts are only
+    performed every `restart_every` fits, or when the per-sample marginal
+    likelihood drops by more than `restart_tol`
+
+    Random restarts are run by a pool of `num_workers` threads or processes
+    (`restart_executor`), restart `i` is randomized with seed `seed + i`.
+    After `probe_iters` iterations, the restarts whose per-sample objective is
+    worse than the best one by more than `abandon_tol` are abandoned
     """
+    support_warm_start = True
     def __init__(self, num_cont, num_enum, num_out, **conf):
         super().__init__(num_cont, num_enum, num_out, **conf)
         total_dim = num_cont
@@ -44,6 +57,16 @@ class GPyGP(BaseModel):
         self.warp         = self.conf.get('warp', True)
         self.space        = self.conf.get('space') # DesignSpace
         self.num_restarts = self.conf.get('num_restarts', 10)
+        self.restart_every = self.conf.get('restart_every', 10)
+        self.restart_tol  = self.conf.get('restart_tol', 0.05)
+        self.num_workers  = self.conf.get('num_workers', 1)
+        self.restart_executor = self.conf.get('restart_executor', 'thread')
+        self.probe_iters  = self.conf.get('probe_iters', max(1, self.num_epochs // 5))
+        self.abandon_tol  = self.conf.get('abandon_tol', 0.2)
+        self.seed         = self.conf.get('seed', None)
+        self.gp           = None
+        self.num_fits     = 0
+        self.lik_per_data = None
         if self.space is None and self.warp:
             warnings.warn('Space not provided, set warp to False')
             self.warp = False
@@ -80,7 +103,8 @@ class GPyGP(BaseModel):
         return Xall.numpy()
 
     def fit(self, Xc : FloatTensor, Xe : LongTensor, y : LongTensor): 
-        Xc, Xe, y = filter_nan(Xc, Xe, y, 'all')
+        Xc, Xe, y   = filter_nan(Xc, Xe, y, 'all')
+        prev_params = self.gp.param_array.copy() if self.gp is not None else None
         self.fit_scaler(Xc, y)
         X, y = self.trans(Xc, Xe, y)
 
@@ -100,12 +124,91 @@ class GPyGP(BaseModel):
             self.gp = GPy.models.InputWarpedGP(X, y, kern, warping_function = warp_f)
         self.gp.likelihood.variance.set_prior(GPy.priors.LogGaussian(-4.63, 0.5), warning = False)
 
-        self.gp.optimize_restarts(max_iters = self.num_epochs, verbose = self.verbose, num_restarts = self.num_restarts, robust = True)
+        if prev_params is not None and prev_params.shape == self.gp.param_array.shape:
+            self.gp[:] = prev_params
+            try:
+                self.gp.optimize(max_iters = self.num_epochs, messages = self.verbose)
+                lik_drop = self.lik_per_data - self.log_lik_per_data()
+                do_restart = (self.num_fits % self.restart_every == 0) or not (lik_drop < self.restart_tol)
+            except Exception:
+                self.gp[:] = prev_params
+                do_restart = True
+        else:
+            do_restart = True
+
+        if do_restart:
+            self.optimize_restarts()
+        self.num_fits    += 1
+        self.lik_per_data = self.log_lik_per_data()
+        self.build_cache()
         return self
 
+    def build_cache(self):
+        """
+        Cache the (warped) training inputs, the Cholesky factor of
+        `K + noise * I` and the woodbury vector of the fitted posterior
+        """
+        post       = self.gp.posterior
+        self.cache = {
+                'x'     : self.gp._predictive_variable.copy(),
+                'L'     : post.woodbury_chol.copy(),
+                'alpha' : post.woodbury_vector.copy(),
+                'noise' : float(self.gp.likelihood.variance[0])
+                }
+
+    def restart_params(self) -> [np.ndarray]:
+        """
+        Initial parameters of the restarts, the first restart starts from the
+        current parameters, the others are randomized under per-restart seeds
+        """
+        seed   = self.seed if self.seed is not None else np.random.randint(2**31 - 1)
+        state  = np.random.get_state()
+        model  = self.gp.copy()
+        starts = [self.gp.param_array.copy()]
+        for i in range(1, self.num_restarts):
+            np.random.seed((seed + i) % 2**32)
+            model.randomize()
+            starts.append(model.param_array.copy())
+        np.random.set_state(state)
+        return starts
+
+    def run_restarts(self, starts : [np.ndarray], max_iters : int) -> [(np.ndarray, float)]:
+        if self.num_workers <= 1 or len(starts) <= 1:
+            return [optimize_restart(self.gp, x0, max_iters) for x0 in starts]
+        executor = ProcessPoolExecutor if self.restart_executor == 'process' else ThreadPoolExecutor
+        with executor(max_workers = min(self.num_workers, len(starts))) as pool:
+            return list(pool.map(optimize_restart, [self.gp] * len(starts), starts, [max_iters] * len(starts)))
+
+    def optimize_restarts(self):
+        starts  = self.restart_params()
+        probe   = min(self.probe_iters, self.num_epochs) if len(starts) > 1 else self.num_epochs
+        results = self.run_restarts(starts, probe)
+        if probe < self.num_epochs:
+            # abandon the restarts whose likelihood is clearly dominated after the probing iterations
+            best    = min(obj for _, obj in results)
+            starts  = [x for x, obj in results if obj <= best + self.abandon_tol * self.gp.num_data]
+            results = self.run_restarts(starts, self.num_epochs - probe)
+        params, obj = min(results, key = lambda r : r[1])
+        if np.isfinite(obj):
+            self.gp[:] = params
+        if self.verbose:
+            print('Best objective of %d restarts: %g' % (len(starts), obj), flush = True)
+
+    def log_lik_per_data(self) -> float:
+        return -1 * float(self.gp.objective_function()) / self.gp.num_data
+
     def predict(self, Xc : FloatTensor, Xe : LongTensor) -> (FloatTensor, FloatTensor):
+        return self.predict_mean_var(Xc, Xe)
+
+    def predict_mean_var(self, Xc : FloatTensor, Xe : LongTensor) -> (FloatTensor, FloatTensor):
         Xall    = self.trans(Xc, Xe)
-        py, ps2 = self.gp.predict(Xall)
+        if self.warp:
+            Xall = self.gp.transform_data(Xall, test_data = True)
+        kern    = self.gp.kern
+        k_xs    = kern.K(self.cache['x'], Xall)
+        v       = solve_triangular(self.cache['L'], k_xs, lower = True)
+        py      = k_xs.T.dot(self.cache['alpha'])
+        ps2     = (kern.Kdiag(Xall) - (v**2).sum(axis = 0)).clip(min = 1e-15) + self.cache['noise']
         mu      = self.yscaler.inverse_transform(FloatTensor(py).view(-1, 1))
         var     = self.yscaler.std**2 * FloatTensor(ps2).view(-1, 1)
         return mu, var.clamp(torch.finfo(var.dtype).eps)
@@ -117,3 +220,17 @@ class GPyGP(BaseModel):
     def noise(self):
         var_normalized = self.gp.likelihood.variance[0]
         return (var_normalized * self.yscaler.std**2).view(self.num_out)
+
+def optimize_restart(gp, x0 : np.ndarray, max_iters : int) -> (np.ndarray, float):
+    """
+    Optimize a copy of `gp` starting from parameters `x0`, return the optimized
+    parameters and the objective, failed restarts have an infinite objective
+    """
+    try:
+        gp     = gp.copy()
+        gp[:]  = x0
+        gp.optimize(max_iters = max_iters)
+        obj    = float(gp.objective_function())
+        return gp.param_array.copy(), obj if np.isfinite(obj) else np.inf
+    except Exception:
+        return x0, np.inf
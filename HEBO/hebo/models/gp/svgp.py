@@ -14,7 +14,6 @@ import gpytorch
 
 from copy import deepcopy
 from torch import FloatTensor, LongTensor
-from torch.utils.data import TensorDataset, DataLoader
 from gpytorch.models import ApproximateGP
 from gpytorch.priors import GammaPrior
 from gpytorch.priors.torch_priors import LogNormalPrior
@@ -27,7 +26,7 @@ from gpytorch.variational import CholeskyVariationalDistribution, VariationalStr
 
 from ..util import filter_nan
 from ..base_model import BaseModel
-from ..layers import EmbTransform
+from ..layers import EmbTransform, KumarWarp
 from ..scalers import TorchMinMaxScaler, TorchStandardScaler
 from .gp import DummyFeatureExtractor, default_kern
 
@@ -69,24 +68,53 @@ class SVGPList(gpytorch.Module):
                 dist_list.append(self.gp[i](x_all[valid_id]))
             return dist_list
 
+def kmeans_pp(x : FloatTensor, k : int) -> LongTensor:
+    """
+    Indices of `k` rows of `x` selected by the k-means++ seeding, each row is
+    sampled with probability proportional to its squared distance to the
+    closest row already selected
+    """
+    num_data = x.shape[0]
+    k        = min(k, num_data)
+    idx      = [np.random.randint(num_data)]
+    d2       = ((x - x[idx[0]])**2).sum(dim = 1)
+    for _ in range(1, k):
+        if d2.sum() > 0:
+            i = torch.multinomial(d2, 1).item()
+        else: # duplicated rows, fall back to uniform sampling
+            i = np.random.choice(np.setdiff1d(np.arange(num_data), idx))
+        idx.append(i)
+        d2 = torch.minimum(d2, ((x - x[i])**2).sum(dim = 1))
+    return torch.LongTensor(idx)
+
 class SVGPModel(gpytorch.Module):
     def __init__(self, x, xe, y, num_inducing = 128, **conf):
         super().__init__()
         self.num_out = y.shape[1]
+        self.warp    = KumarWarp(x.shape[1]) if conf.get('warp', False) and x.shape[1] > 0 else None
         self.fe = deepcopy(conf.get('fe', DummyFeatureExtractor(x.shape[1], xe.shape[1], conf.get('num_uniqs'), conf.get('emb_sizes'))))
         self.gp = SVGPList([
             SVGPLayer(
                 mean    = deepcopy(conf.get('mean', ConstantMean())), 
                 kern    = deepcopy(conf.get('kern', default_kern(x, xe, y[:, i], self.fe.total_dim, conf.get('ard_kernel', True), conf.get('fe')))),
-                u       = self.init_u(x, xe, num_inducing),
+                u       = self.init_u(x, xe, num_inducing, conf.get('init_u', 'kmeans++')),
                 learn_u = conf.get('learn_u', True), 
                 use_ngd = conf.get('use_ngd', False), 
                 )
             for i in range(self.num_out)
         ])
 
+    @property
+    def num_inducing(self) -> int:
+        return self.gp[0].variational_strategy.inducing_points.shape[0]
+
+    def features(self, x, xe):
+        if self.warp is not None:
+            x = self.warp(x)
+        return self.fe(x, xe)
+
     def forward(self, x, xe, y = None):
-        x_all = self.fe(x, xe)
+        x_all = self.features(x, xe)
         if not self.training:
             return [self.gp[i](x_all) for i in range(self.num_out)]
         else:
@@ -96,18 +124,38 @@ class SVGPModel(gpytorch.Module):
                 dist_list.append(self.gp[i](x_all[valid_idx]))
             return dist_list
 
-    def init_u(self, x, xe, num_inducing):
+    def init_u(self, x, xe, num_inducing, method = 'kmeans++'):
         num_data     = x.shape[0]
         num_inducing = min(num_inducing, num_data)
-        u_idx        = np.random.choice(num_data, num_inducing, replace = False)
         with torch.no_grad():
-            u = self.fe(x[u_idx], xe[u_idx]).detach().clone()
-            return u
-
+            feat = self.features(x, xe)
+            if method == 'kmeans++':
+                u_idx = kmeans_pp(feat, num_inducing)
+            else:
+                u_idx = torch.LongTensor(np.random.choice(num_data, num_inducing, replace = False))
+            return feat[u_idx].detach().clone()
 
 class SVGP(BaseModel):
+    """
+    Stochastic variational GP with inducing points
+
+    Inducing points are initialized with the k-means++ seeding of the
+    training features (`init_u = 'random'` for uniform sampling), with
+    `warp = True`, the numerical inputs are warped by learnable Kumaraswamy
+    CDFs
+
+    Calling `fit` again on a fitted model warm-starts from the previous
+    variational parameters and hyperparameters and only trains for
+    `warm_epochs` epochs, the fitted posterior is first rescaled to the new
+    output standardization. The input scaler is fitted to the bounds of
+    `space` when provided, otherwise a warm start is only performed when the
+    new inputs lie in the range of the previous ones. The number of
+    minibatch steps of a fit is capped by `max_iters`, proportionally for
+    warm fits
+    """
     support_grad = True
     support_multi_output = True
+    support_warm_start   = True
     def __init__(self, num_cont, num_enum, num_out, **conf):
         super().__init__(num_cont, num_enum, num_out, **conf)
 
@@ -122,15 +170,25 @@ class SVGP(BaseModel):
 
         self.batch_size   = conf.get('batch_size', 64)
         self.num_epochs   = conf.get('num_epochs', 300)
+        self.warm_epochs  = conf.get('warm_epochs', max(1, self.num_epochs // 5))
+        self.max_iters    = conf.get('max_iters', None)
         self.verbose      = conf.get('verbose', False)
         self.print_every  = conf.get('print_every', 10)
         self.noise_lb     = conf.get('noise_lb', 1e-5)
+        self.space        = conf.get('space') # DesignSpace
         self.xscaler      = TorchMinMaxScaler((-1, 1))
         self.yscaler      = TorchStandardScaler()
+        self.gp           = None
+        self.num_fits     = 0
 
     def fit_scaler(self, Xc : FloatTensor, Xe : LongTensor, y : FloatTensor):
         if Xc is not None and Xc.shape[1] > 0:
-            self.xscaler.fit(Xc)
+            if self.space is not None:
+                cont_lb = self.space.opt_lb[:self.space.num_numeric].view(1, -1).float()
+                cont_ub = self.space.opt_ub[:self.space.num_numeric].view(1, -1).float()
+                self.xscaler.fit(torch.cat([Xc, cont_lb, cont_ub], dim = 0))
+            else:
+                self.xscaler.fit(Xc)
         self.yscaler.fit(y)
     
     def xtrans(self, Xc : FloatTensor, Xe : LongTensor, y : FloatTensor = None):
@@ -150,45 +208,94 @@ class SVGP(BaseModel):
         else:
             return Xc_t, Xe_t
 
+    def can_warm_start(self, Xc : FloatTensor, y : FloatTensor) -> bool:
+        if self.gp is None or self.gp.num_inducing != min(self.num_inducing, y.shape[0]):
+            return False
+        if self.space is None and Xc is not None and Xc.shape[1] > 0:
+            with torch.no_grad():
+                Xc_t = self.xscaler.transform(Xc)
+            return bool(((Xc_t >= -1 - 1e-6) & (Xc_t <= 1 + 1e-6)).all())
+        return True
+
+    def rescale_output(self, old_mean : FloatTensor, old_std : FloatTensor):
+        """
+        Express the fitted posterior in the units of the refitted `yscaler`,
+        an affine map of the latent function is absorbed by the constant
+        mean, the output scale and the noise, the whitened variational
+        parameters are unchanged
+        """
+        scale = old_std / self.yscaler.std
+        shift = (old_mean - self.yscaler.mean) / self.yscaler.std
+        with torch.no_grad():
+            for i in range(self.num_out):
+                layer = self.gp.gp[i]
+                if isinstance(layer.mean, ConstantMean):
+                    layer.mean.constant = layer.mean.constant * scale[i] + shift[i]
+                if isinstance(layer.cov, ScaleKernel):
+                    layer.cov.outputscale = layer.cov.outputscale * scale[i]**2
+                self.lik[i].noise = (self.lik[i].noise * scale[i]**2).clamp(min = 2 * self.noise_lb)
+                layer.variational_strategy._clear_cache()
+
+    def minibatches(self, num_data : int):
+        perm = torch.randperm(num_data)
+        if num_data > self.batch_size: # drop the last incomplete batch
+            perm = perm[:num_data - num_data % self.batch_size]
+        return perm.split(self.batch_size)
+
     def fit(self, Xc : FloatTensor, Xe : LongTensor, y : FloatTensor):
         Xc, Xe, y = filter_nan(Xc, Xe, y, 'any')
-        self.fit_scaler(Xc, Xe, y)
+        warm      = self.can_warm_start(Xc, y)
+        if warm:
+            old_mean, old_std = self.yscaler.mean.clone(), self.yscaler.std.clone()
+            self.yscaler.fit(y)
+        else:
+            self.fit_scaler(Xc, Xe, y)
         Xc, Xe, y = self.xtrans(Xc, Xe, y)
 
         assert(Xc.shape[1] == self.num_cont)
         assert(Xe.shape[1] == self.num_enum)
         assert(y.shape[1]  == self.num_out)
 
-        n_constr = GreaterThan(self.noise_lb)
-        self.gp  = SVGPModel(Xc, Xe, y, **self.conf)
-        self.lik = nn.ModuleList([GaussianLikelihood(noise_constraint = n_constr) for _ in range(self.num_out)])
+        if warm:
+            self.rescale_output(old_mean, old_std)
+        else:
+            n_constr = GreaterThan(self.noise_lb)
+            self.gp  = SVGPModel(Xc, Xe, y, **self.conf)
+            self.lik = nn.ModuleList([GaussianLikelihood(noise_constraint = n_constr) for _ in range(self.num_out)])
 
         self.gp.train()
         self.lik.train()
 
-        ds  = TensorDataset(Xc, Xe, y)
-        dl  = DataLoader(ds, batch_size = self.batch_size, shuffle = True, drop_last = y.shape[0] > self.batch_size)
+        feat_params = list(self.gp.fe.parameters())
+        if self.gp.warp is not None:
+            feat_params += list(self.gp.warp.parameters())
         if self.use_ngd:
             opt = torch.optim.Adam([
-                {'params' : self.gp.fe.parameters(), 'lr' : self.lr_fe}, 
+                {'params' : feat_params, 'lr' : self.lr_fe}, 
                 {'params' : self.gp.gp.hyperparameters()}, 
                 {'params' : self.lik.parameters()},
                 ], lr = self.lr)
             opt_ng = gpytorch.optim.NGD(self.gp.variational_parameters(), lr = self.lr_vp, num_data = y.shape[0])
         else:
             opt = torch.optim.Adam([
-                {'params' : self.gp.fe.parameters(), 'lr' : self.lr_fe}, 
+                {'params' : feat_params, 'lr' : self.lr_fe}, 
                 {'params' : self.gp.gp.hyperparameters()}, 
                 {'params' : self.gp.gp.variational_parameters(), 'lr' : self.lr_vp}, 
                 {'params' : self.lik.parameters()},
                 ], lr = self.lr)
 
+        num_epochs = self.warm_epochs if warm else self.num_epochs
+        max_iters  = self.max_iters
+        if max_iters is not None and warm:
+            max_iters = max(1, max_iters * self.warm_epochs // self.num_epochs)
+        num_iters  = 0
 
         mll = [gpytorch.mlls.VariationalELBO(self.lik[i], self.gp.gp[i], num_data = y.shape[0], beta = self.beta) for i in range(self.num_out)]
-        for epoch in range(self.num_epochs):
+        for epoch in range(num_epochs):
             epoch_loss = 0.
             epoch_cnt  = 1e-6
-            for bxc, bxe, by in dl:
+            for idx in self.minibatches(y.shape[0]):
+                bxc, bxe, by = Xc[idx], Xe[idx], y[idx]
                 dist_list = self.gp(bxc, bxe, by)
                 loss      = 0
                 valid     = torch.isfinite(by)
@@ -209,9 +316,15 @@ class SVGP(BaseModel):
 
                 epoch_loss += loss.item()
                 epoch_cnt  += 1
+                num_iters  += 1
+                if max_iters is not None and num_iters >= max_iters:
+                    break
             epoch_loss /= epoch_cnt
             if self.verbose and ((epoch + 1) % self.print_every == 0 or epoch == 0):
                 print('After %d epochs, loss = %g' % (epoch + 1, epoch_loss), flush = True)
+            if max_iters is not None and num_iters >= max_iters:
+                break
+        self.num_fits += 1
         self.gp.eval()
         self.lik.eval()
 
@@ -48,3 +48,24 @@ class OneHotTransform(nn.Module):
 
     def forward(self, xe):
         return torch.cat([F.one_hot(xe[:, i], self.num_uniqs[i]) for i in range(xe.shape[1])], dim = 1).float()
+
+class KumarWarp(nn.Module):
+    """
+    Input warping with the CDF of the Kumaraswamy distribution, applied
+    element-wise to inputs in `[lb, ub]`, the concentrations `a` and `b` of
+    each dimension are learnable and initialized to one (identity warping)
+    """
+    def __init__(self, dim : int, lb : float = -1., ub : float = 1., eps : float = 1e-6):
+        super().__init__()
+        self.lb    = lb
+        self.ub    = ub
+        self.eps   = eps
+        self.log_a = nn.Parameter(torch.zeros(dim))
+        self.log_b = nn.Parameter(torch.zeros(dim))
+
+    def forward(self, x):
+        z = ((x - self.lb) / (self.ub - self.lb)).clamp(self.eps, 1 - self.eps)
+        a = self.log_a.clamp(-2.3, 2.3).exp()
+        b = self.log_b.clamp(-2.3, 2.3).exp()
+        w = 1 - (1 - z**a)**b
+        return self.lb + (self.ub - self.lb) * w
@@ -7,44 +7,29 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
+import importlib
+import importlib.util
 import torch
 from .base_model import BaseModel
-from .gp.svgp import SVGP
-from .gp.svidkl import SVIDKL
-from .gp.gp import GP
-from .gp.gpy_wgp import GPyGP
-from .gp.gpy_mlp import GPyMLPGP
-from .rf.rf import RF
-
-from .nn.mcbn import MCBNEnsemble
-from .nn.sgld import pSGLDEnsemble
-from .nn.deep_ensemble import DeepEnsemble
-from .nn.eac.masked_deep_ensemble import MaskedDeepEnsemble
-from .nn.fe_deep_ensemble import FeDeepEnsemble
-from .nn.gumbel_linear import GumbelDeepEnsemble
-
-try:
-    from .boosting.catboost import CatBoost
-    has_catboost = True
-except ImportError:
-    has_catboost = False
 
+# name -> 'module:class', the module is imported by `get_model_class` on first
+# use, a class can also be registered directly
 model_dict = {
-        'svidkl'  : SVIDKL,
-        'svgp'  : SVGP,
-        'gp'  : GP,
-        'gpy' : GPyGP,
-        'gpy_mlp' : GPyMLPGP, 
-        'rf'  : RF,
-        'deep_ensemble' : DeepEnsemble,
-        'psgld' : pSGLDEnsemble,
-        'mcbn' : MCBNEnsemble, 
-        'masked_deep_ensemble' : MaskedDeepEnsemble,
-        'fe_deep_ensemble': FeDeepEnsemble, 
-        'gumbel': GumbelDeepEnsemble, 
+        'svidkl'  : '.gp.svidkl:SVIDKL',
+        'svgp'  : '.gp.svgp:SVGP',
+        'gp'  : '.gp.gp:GP',
+        'gpy' : '.gp.gpy_wgp:GPyGP',
+        'gpy_mlp' : '.gp.gpy_mlp:GPyMLPGP', 
+        'rf'  : '.rf.rf:RF',
+        'deep_ensemble' : '.nn.deep_ensemble:DeepEnsemble',
+        'psgld' : '.nn.sgld:pSGLDEnsemble',
+        'mcbn' : '.nn.mcbn:MCBNEnsemble', 
+        'masked_deep_ensemble' : '.nn.eac.masked_deep_ensemble:MaskedDeepEnsemble',
+        'fe_deep_ensemble': '.nn.fe_deep_ensemble:FeDeepEnsemble', 
+        'gumbel': '.nn.gumbel_linear:GumbelDeepEnsemble', 
         }
-if has_catboost:
-    model_dict['catboost'] = CatBoost
+if importlib.util.find_spec('catboost') is not None:
+    model_dict['catboost'] = '.boosting.catboost:CatBoost'
 
 model_names = [k for k in model_dict.keys()]
 
@@ -54,6 +39,10 @@ def get_model_class(model_name : str):
     else:
         assert model_name in model_dict, f"model name {model_name} not in {model_names}"
         model_class = model_dict[model_name]
+        if isinstance(model_class, str):
+            module, name = model_class.split(':')
+            model_class  = getattr(importlib.import_module(module, __package__), name)
+            model_dict[model_name] = model_class
         return model_class
 
 
@@ -74,7 +63,7 @@ class MultiTaskModel(BaseModel):
         super().__init__(num_cont, num_enum, num_out, **conf)
         self.model_name = self.conf.get('base_model_name', 'gp')
         self.model_conf = {k : v for k, v in self.conf.items() if k != 'model_name'}
-        self.models     = [model_dict[self.model_name](num_cont, num_enum, 1, **self.model_conf) for _ in range(num_out)]
+        self.models     = [get_model(self.model_name, num_cont, num_enum, 1, **self.model_conf) for _ in range(num_out)]
     
 
     def fit(self, Xc, Xe, y):
@@ -49,7 +49,9 @@ class DeepEnsemble(BaseModel):
         self.adv_eps       = self.conf.setdefault('adv_eps',       0.)
         self.verbose       = self.conf.setdefault('verbose',       False)
         self.basenet_cls   = self.conf.setdefault('basenet_cls',   BaseNet)
+        self.stacked       = self.conf.setdefault('stacked',       False)
         assert self.num_ensembles > 0
+        assert not self.stacked or self.basenet_cls is BaseNet, 'Stacked training only supports BaseNet'
 
         self.xscaler = TorchMinMaxScaler((-1, 1))
         self.yscaler = TorchStandardScaler()
@@ -57,6 +59,7 @@ class DeepEnsemble(BaseModel):
         self.loss       = self.loss_likelihood if self.output_noise else self.loss_mse
         self.loss_name  = "NLL" if self.output_noise else "MSE"
         self.models     = None
+        self.stacked_net = None
         self.sample_idx = 0
         self.noise_est  = torch.zeros(self.num_out)
 
@@ -78,7 +81,10 @@ class DeepEnsemble(BaseModel):
             self.fit_scaler(Xc, Xe, y)
         Xc, Xe, y = self.trans(Xc, Xe, y)
 
-        if self.num_process > 1:
+        if self.stacked:
+            self.stacked_net = self.fit_stacked(Xc, Xe, y)
+            self.models      = self.stacked_net.unstack()
+        elif self.num_process > 1:
             with Pool(self.num_process) as p:
                 self.models = p.starmap(self.fit_one, [(Xc.clone(), Xe.clone(), y.clone(), model_idx) for model_idx in range(self.num_ensembles)]) 
         else:
@@ -94,7 +100,10 @@ class DeepEnsemble(BaseModel):
 
     def predict(self, Xc_ : FloatTensor, Xe_ : LongTensor) -> (FloatTensor, FloatTensor):
         Xc, Xe = self.trans(Xc_, Xe_)
-        preds  = torch.stack([self.models[i](Xc, Xe) for i in range(self.num_ensembles)])
+        if self.stacked_net is not None:
+            preds = self.stacked_net(Xc, Xe)
+        else:
+            preds = torch.stack([self.models[i](Xc, Xe) for i in range(self.num_ensembles)])
         if not self.output_noise:
             py  = preds.mean(dim = 0)
             ps2 = 1e-8 + preds.var(dim = 0, unbiased = False) # XXX: var([1.0], unbiased = True) = NaN
@@ -150,6 +159,9 @@ class DeepEnsemble(BaseModel):
 
     def fit_one(self, Xc, Xe, y, idx, **fitting_conf):
         torch.seed()
+        if self.bootstrap:
+            boot_id = torch.randint(y.shape[0], (y.shape[0], ))
+            Xc, Xe, y = Xc[boot_id], Xe[boot_id], y[boot_id]
         dataset   = TensorDataset(Xc, Xe, y)
         loader    = DataLoader(dataset, batch_size = self.batch_size, shuffle = True, drop_last = y.shape[0] > self.batch_size)
         if self.models is not None and len(self.models) == self.num_ensembles:
@@ -180,6 +192,121 @@ class DeepEnsemble(BaseModel):
         model.eval()
         return model
 
+    def fit_stacked(self, Xc, Xe, y):
+        """
+        Train all the members at once, each member still has its own
+        initialisation, mini-batch order and (if `bootstrap`) resampled data
+        """
+        if self.models is not None and len(self.models) == self.num_ensembles:
+            members = [deepcopy(m) for m in self.models]
+        else:
+            members = [self.basenet_cls(self.num_cont, self.num_enum, self.num_out, **self.conf) for _ in range(self.num_ensembles)]
+        net       = StackedNet(members)
+        num_data  = y.shape[0]
+        if self.bootstrap:
+            data_id = torch.randint(num_data, (self.num_ensembles, num_data))
+        else:
+            data_id = torch.arange(num_data).repeat(self.num_ensembles, 1)
+        drop_last   = num_data > self.batch_size
+        num_batches = num_data // self.batch_size if drop_last else int(np.ceil(num_data / self.batch_size))
+        opt         = torch.optim.Adam(net.parameters(), lr = self.lr)
+        net.train()
+        for epoch in range(self.num_epochs):
+            epoch_loss = 0
+            perm       = data_id.gather(1, torch.rand(data_id.shape).argsort(dim = 1))
+            for i in range(num_batches):
+                idx       = perm[:, i * self.batch_size : (i + 1) * self.batch_size]
+                py        = net(Xc[idx], Xe[idx])
+                by        = y[idx]
+                data_loss = sum(self.loss(py[j], by[j]) for j in range(self.num_ensembles))
+                reg_loss  = 0.
+                for p in net.parameters():
+                    reg_loss += self.l1 * p.abs().sum() / (y.shape[0] * y.shape[1])
+                loss = data_loss + reg_loss
+                opt.zero_grad()
+                loss.backward()
+                opt.step()
+                epoch_loss += data_loss * idx.shape[1] / self.num_ensembles
+            if epoch % self.print_every == 0:
+                if self.verbose:
+                    print("Epoch %d, %s loss = %g" % (epoch, self.loss_name, epoch_loss / Xc.shape[0]), flush = True)
+        net.eval()
+        return net
+
+class StackedNet(nn.Module):
+    """
+    `BaseNet` members whose parameters are stacked along a leading ensemble
+    dimension, every linear layer of the ensemble is a single batched matmul
+    """
+    def __init__(self, members : [nn.Module]):
+        super().__init__()
+        self.members = members
+        self.paras   = nn.ParameterDict({
+            self.key(name) : nn.Parameter(torch.stack([dict(m.named_parameters())[name].detach() for m in members]))
+            for name, _ in members[0].named_parameters()})
+
+    @staticmethod
+    def key(name : str) -> str:
+        return name.replace('.', '__')
+
+    def para(self, name : str) -> torch.Tensor:
+        return self.paras[self.key(name)]
+
+    def linear(self, x : torch.Tensor, name : str) -> torch.Tensor:
+        w = self.para(name + '.weight')
+        b = self.para(name + '.bias')
+        return torch.baddbmm(b.unsqueeze(1), x, w.transpose(1, 2))
+
+    def sequential(self, x : torch.Tensor, seq : nn.Sequential, prefix : str) -> torch.Tensor:
+        for name, layer in seq._modules.items(): # NOTE: `named_children` skips repeated activation modules
+            x = self.linear(x, f'{prefix}.{name}') if isinstance(layer, nn.Linear) else layer(x)
+        return x
+
+    def xtrans(self, Xc : FloatTensor, Xe : LongTensor) -> FloatTensor:
+        net  = self.members[0]
+        Xall = Xc.clone() if net.num_cont > 0 else torch.zeros(*Xe.shape[:2], 0)
+        if net.num_enum > 0:
+            if isinstance(net.enum_layer, EmbTransform):
+                ens_id = torch.arange(Xe.shape[0]).view(-1, 1)
+                embs   = [self.para(f'enum_layer.emb.{i}.weight')[ens_id, Xe[:, :, i]] for i in range(net.num_enum)]
+                Xall   = torch.cat([Xall] + embs, dim = 2)
+            else:
+                Xall   = torch.cat([Xall, net.enum_layer(Xe.reshape(-1, net.num_enum)).view(*Xe.shape[:2], -1)], dim = 2)
+        return Xall
+
+    def forward(self, Xc : FloatTensor, Xe : LongTensor) -> FloatTensor:
+        """
+        Inputs are either shared by all members, of shape (batch, dim), or
+        specific to each member, of shape (num_ensembles, batch, dim), output
+        is of shape (num_ensembles, batch, num_output)
+        """
+        num_ens = len(self.members)
+        if Xc.dim() == 2:
+            Xc = Xc.unsqueeze(0).expand(num_ens, -1, -1)
+            Xe = Xe.unsqueeze(0).expand(num_ens, -1, -1)
+        net    = self.members[0]
+        inputs = self.xtrans(Xc, Xe)
+        prior_out = 0.
+        if net.rand_prior:
+            with torch.no_grad():
+                prior_out = self.sequential(inputs, net.prior_net, 'prior_net').detach()
+        hidden = self.sequential(inputs, net.hidden, 'hidden')
+        mu     = self.linear(hidden, 'mu') + prior_out
+        if net.output_noise:
+            return torch.cat((mu, net.noise_lb + self.sequential(hidden, net.sigma2, 'sigma2')), dim = 2)
+        return mu
+
+    def unstack(self) -> [nn.Module]:
+        """
+        Copy the trained parameters back to the individual members
+        """
+        with torch.no_grad():
+            for i, m in enumerate(self.members):
+                for name, p in m.named_parameters():
+                    p.copy_(self.para(name)[i])
+                m.eval()
+        return self.members
+
 class BaseNet(nn.Module):
     def __init__(self, num_cont, num_enum, num_out, **conf):
         super().__init__()
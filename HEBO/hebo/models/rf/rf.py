@@ -10,6 +10,7 @@
 import torch
 from sklearn.ensemble import RandomForestRegressor
 from torch import FloatTensor, LongTensor
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from ..base_model import BaseModel
@@ -17,10 +18,19 @@ from ..layers import OneHotTransform
 from ..util import filter_nan
 
 class RF(BaseModel):
+    """
+    Random forest, the predictive variance is the variance of the tree
+    predictions
+
+    After `fit`, the leaf values of all trees are flattened into one table,
+    a prediction is a leaf lookup of every tree (run by `n_jobs` threads)
+    followed by a single gather into the table
+    """
     def __init__(self, num_cont, num_enum, num_out, **conf):
         super().__init__(num_cont, num_enum, num_out, **conf)
         self.n_estimators = self.conf.get('n_estimators', 100)
-        self.rf = RandomForestRegressor(n_estimators = self.n_estimators)
+        self.n_jobs       = self.conf.get('n_jobs', 1)
+        self.rf = RandomForestRegressor(n_estimators = self.n_estimators, n_jobs = self.n_jobs)
         self.est_noise = torch.zeros(self.num_out)
         if self.num_enum > 0:
             self.one_hot = OneHotTransform(self.conf['num_uniqs'])
@@ -39,18 +49,40 @@ class RF(BaseModel):
         Xtr = self.xtrans(Xc, Xe)
         ytr = y.numpy().reshape(-1)
         self.rf.fit(Xtr, ytr)
-        mse = np.mean((self.rf.predict(Xtr).reshape(-1) - ytr)**2).reshape(self.num_out)
+        self.build_table()
+        mse = np.mean((self.tree_predict(Xtr).mean(axis = 0) - ytr)**2).reshape(self.num_out)
         self.est_noise = torch.FloatTensor(mse)
 
+    def build_table(self):
+        """
+        Flatten the leaf values of all trees, node `i` of tree `t` is stored at
+        `self.node_offset[t] + i`
+        """
+        trees = [est.tree_ for est in self.rf.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        self.node_offset = np.concatenate([[0], np.cumsum(sizes)[:-1]]).reshape(-1, 1)
+        self.leaf_value  = np.concatenate([tree.value.reshape(-1) for tree in trees])
+
+    def tree_predict(self, X : np.ndarray) -> np.ndarray:
+        """
+        Predictions of all trees, of shape (n_estimators, X.shape[0])
+        """
+        X = np.ascontiguousarray(X, dtype = np.float32)
+        if self.n_jobs is None or self.n_jobs == 1:
+            leaves = [est.apply(X, check_input = False) for est in self.rf.estimators_]
+        else:
+            n_jobs = self.n_jobs if self.n_jobs > 0 else None
+            with ThreadPoolExecutor(max_workers = n_jobs) as pool:
+                leaves = list(pool.map(lambda est : est.apply(X, check_input = False), self.rf.estimators_))
+        return self.leaf_value[self.node_offset + np.vstack(leaves)]
+
     @property
     def noise(self):
         return self.est_noise
     
     def predict(self, Xc : torch.Tensor, Xe : torch.Tensor):
         X     = self.xtrans(Xc, Xe)
-        mean  = self.rf.predict(X).reshape(-1, 1)
-        preds = []
-        for estimator in self.rf.estimators_:
-            preds.append(estimator.predict(X).reshape([-1,1]))
-        var = np.var(np.concatenate(preds, axis=1), axis=1)
+        preds = self.tree_predict(X)
+        mean  = preds.mean(axis = 0)
+        var   = preds.var(axis = 0)
         return torch.FloatTensor(mean.reshape([-1,1])), torch.FloatTensor(var.reshape([-1,1])) + self.noise
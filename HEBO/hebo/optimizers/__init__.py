@@ -7,4 +7,14 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
-from . import abstract_optimizer, bo, hebo, util, general, hebo_embedding, noisy_opt, evolution
+import importlib
+
+_submodules = ['abstract_optimizer', 'observation_store', 'pareto_archive', 'bo', 'hebo', 'util', 'general', 'hebo_embedding', 'noisy_opt', 'evolution', 'thompson', 'checkpoint']
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
@@ -12,6 +12,7 @@ import numpy as np
 from abc import ABC, abstractmethod
 
 from hebo.design_space.design_space import DesignSpace
+from .checkpoint import save_arrays, load_arrays
 
 class AbstractOptimizer(ABC):
     support_parallel_opt    = False
@@ -19,6 +20,7 @@ class AbstractOptimizer(ABC):
     support_multi_objective = False
     support_combinatorial   = False
     support_contextual      = False
+    support_checkpoint      = False
     def __init__(self, space : DesignSpace):
         self.space = space
 
@@ -51,3 +53,38 @@ class AbstractOptimizer(ABC):
     @abstractmethod
     def best_y(self) -> float:
         pass
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        """
+        Optimizer state as named numpy arrays and JSON-serializable metadata,
+        the fitted surrogate (if any) is included if `save_model` is True,
+        implemented by the optimizers with `support_checkpoint`
+        """
+        raise NotImplementedError
+
+    def set_state(self, arrays : dict, meta : dict):
+        raise NotImplementedError
+
+    def check_checkpoint(self):
+        if not self.support_checkpoint:
+            raise NotImplementedError(f'{type(self).__name__} does not support checkpointing')
+
+    def save_state(self, path : str, save_model : bool = False):
+        """
+        Write a checkpoint to `path`, see `hebo.optimizers.checkpoint`
+        """
+        self.check_checkpoint()
+        arrays, meta  = self.get_state(save_model)
+        meta['class'] = type(self).__name__
+        save_arrays(path, arrays, meta)
+
+    def load_state(self, path : str):
+        """
+        Restore a checkpoint written by `save_state` into an optimizer created
+        with the same design space and configuration
+        """
+        self.check_checkpoint()
+        arrays, meta = load_arrays(path)
+        if meta.get('class') != type(self).__name__:
+            raise RuntimeError(f"checkpoint of {meta.get('class')} can not be loaded into {type(self).__name__}")
+        self.set_state(arrays, meta)
@@ -17,10 +17,13 @@ from hebo.acquisitions.acq import LCB
 from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
 
 from .abstract_optimizer import AbstractOptimizer
+from .observation_store import ObservationStore
+from .checkpoint import with_prefix, strip_prefix, rng_state, set_rng_state
 
 class BO(AbstractOptimizer):
     support_combinatorial = True
     support_contextual    = True
+    support_checkpoint    = True
     def __init__(
             self,
             space : DesignSpace,
@@ -30,8 +33,7 @@ class BO(AbstractOptimizer):
             acq_conf    = None):
         super().__init__(space)
         self.space       = space
-        self.X           = pd.DataFrame(columns = self.space.para_names)
-        self.y           = np.zeros((0, 1))
+        self.store       = ObservationStore(self.space, 1)
         self.model_name  = model_name
         self.rand_sample = 1 + self.space.num_paras if rand_sample is None else max(2, rand_sample)
         self.acq_cls     = LCB if acq_cls is None else acq_cls
@@ -39,14 +41,14 @@ class BO(AbstractOptimizer):
 
     def suggest(self, n_suggestions = 1, fix_input = None):
         assert n_suggestions == 1
-        if self.X.shape[0] < self.rand_sample:
+        if self.store.size < self.rand_sample:
             sample = self.space.sample(n_suggestions)
             if fix_input is not None:
                 for k, v in fix_input.items():
                     sample[k] = v
             return sample
         else:
-            X, Xe     = self.space.transform(self.X)
+            X, Xe     = self.store.transformed()
             y         = torch.FloatTensor(self.y)
             num_uniqs = None if Xe.shape[1] == 0 else [len(self.space.paras[name].categories) for name in self.space.enum_names]
             model     = get_model(self.model_name, X.shape[1], Xe.shape[1], y.shape[1], num_uniqs = num_uniqs, warp = False)
@@ -55,7 +57,7 @@ class BO(AbstractOptimizer):
             acq = self.acq_cls(model, **self.acq_conf)
             opt = EvolutionOpt(self.space, acq, pop = 100, iters = 100)
 
-            suggest = self.X.iloc[[np.argmin(self.y.reshape(-1))]]
+            suggest = self.store.rows([np.argmin(self.y.reshape(-1))])
             return opt.optimize(initial_suggest = suggest, fix_input = fix_input)
 
     def observe(self, X, y):
@@ -74,19 +76,41 @@ class BO(AbstractOptimizer):
         valid_id = np.where(np.isfinite(y.reshape(-1)))[0].tolist()
         XX       = X.iloc[valid_id]
         yy       = y[valid_id].reshape(-1, 1)
-        self.X   = self.X.append(XX, ignore_index = True)
-        self.y   = np.vstack([self.y, yy])
+        self.store.append(XX, yy)
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        """
+        The surrogate is fitted from scratch at each suggestion, only the
+        observations and the random states are saved
+        """
+        arrays = {
+                **with_prefix(self.store.state_dict(), 'store'),
+                **with_prefix(rng_state(), 'rng'),
+                }
+        return arrays, {'num_obs' : self.store.size}
+
+    def set_state(self, arrays : dict, meta : dict):
+        self.store.load_state_dict(strip_prefix(arrays, 'store'))
+        set_rng_state(strip_prefix(arrays, 'rng'))
+
+    @property
+    def X(self) -> pd.DataFrame:
+        return self.store.X
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.store.y
 
     @property
     def best_x(self)->pd.DataFrame:
-        if self.X.shape[0] == 0:
+        if self.store.size == 0:
             raise RuntimeError('No data has been observed!')
         else:
-            return self.X.iloc[[self.y.argmin()]]
+            return self.store.rows([self.y.argmin()])
 
     @property
     def best_y(self)->float:
-        if self.X.shape[0] == 0:
+        if self.store.size == 0:
             raise RuntimeError('No data has been observed!')
         else:
             return self.y.min()
@@ -0,0 +1,116 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+"""
+Serialization helpers of optimizer checkpoints
+
+A checkpoint is a `.npz` archive of named numpy arrays, data frames are
+stored column by column (categorical columns as integer codes) and the
+metadata is a JSON document stored as bytes, so that loading a checkpoint
+does not unpickle anything unless a pickled object (a fitted surrogate,
+the pymoo algorithm of `Evolution`) has been saved
+"""
+
+import json
+import pickle
+import numpy  as np
+import pandas as pd
+import torch
+from torch.quasirandom import SobolEngine
+
+from hebo.design_space.design_space import DesignSpace
+
+def save_arrays(path : str, arrays : dict, meta : dict):
+    arrays = dict(arrays)
+    arrays['__meta__'] = np.frombuffer(json.dumps(meta).encode(), dtype = np.uint8)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+def load_arrays(path : str) -> (dict, dict):
+    with np.load(path, allow_pickle = False) as data:
+        arrays = {k : data[k] for k in data.files}
+    meta = json.loads(arrays.pop('__meta__').tobytes().decode())
+    return arrays, meta
+
+def with_prefix(arrays : dict, prefix : str) -> dict:
+    return {prefix + '/' + k : v for k, v in arrays.items()}
+
+def strip_prefix(arrays : dict, prefix : str) -> dict:
+    n = len(prefix) + 1
+    return {k[n:] : v for k, v in arrays.items() if k.startswith(prefix + '/')}
+
+def dump_object(obj) -> np.ndarray:
+    return np.frombuffer(pickle.dumps(obj), dtype = np.uint8)
+
+def load_object(arr : np.ndarray):
+    return pickle.loads(arr.tobytes())
+
+def encode_columns(columns : dict, space : DesignSpace) -> dict:
+    """
+    Raw parameter columns as numeric arrays, categorical values are replaced
+    by their index in `categories`
+    """
+    arrays = {}
+    for name, values in columns.items():
+        if space.paras[name].is_categorical:
+            values = space.paras[name].transform(values).astype(np.int32)
+        arrays[name] = np.asarray(values)
+    return arrays
+
+def decode_columns(arrays : dict, space : DesignSpace) -> dict:
+    columns = {}
+    for name in space.para_names:
+        if name not in arrays:
+            continue
+        values = arrays[name]
+        if space.paras[name].is_categorical:
+            values = space.paras[name].inverse_transform(values)
+        columns[name] = values
+    return columns
+
+def encode_frame(df : pd.DataFrame, space : DesignSpace) -> dict:
+    arrays = encode_columns({name : df[name].values for name in space.para_names}, space)
+    arrays['__index__'] = df.index.values.astype(np.int64)
+    return arrays
+
+def decode_frame(arrays : dict, space : DesignSpace) -> pd.DataFrame:
+    return pd.DataFrame(decode_columns(arrays, space), columns = space.para_names, index = arrays['__index__'])
+
+def rng_state() -> dict:
+    """
+    States of the global numpy and torch random generators
+    """
+    _, keys, pos, has_gauss, gauss = np.random.get_state()
+    return {
+            'numpy_keys'  : keys,
+            'numpy_pos'   : np.array([pos, has_gauss]),
+            'numpy_gauss' : np.array(gauss),
+            'torch'       : torch.get_rng_state().numpy(),
+            }
+
+def set_rng_state(arrays : dict):
+    pos, has_gauss = arrays['numpy_pos'].tolist()
+    np.random.set_state(('MT19937', arrays['numpy_keys'], pos, has_gauss, float(arrays['numpy_gauss'])))
+    torch.set_rng_state(torch.from_numpy(arrays['torch'].copy()))
+
+def sobol_state(engine : SobolEngine) -> dict:
+    return {
+            'sobolstate'    : engine.sobolstate.numpy(),
+            'shift'         : engine.shift.numpy(),
+            'quasi'         : engine.quasi.numpy(),
+            'first_point'   : engine._first_point.numpy(),
+            'num_generated' : np.array(engine.num_generated),
+            }
+
+def set_sobol_state(engine : SobolEngine, arrays : dict):
+    engine.sobolstate    = torch.from_numpy(arrays['sobolstate'].copy())
+    engine.shift         = torch.from_numpy(arrays['shift'].copy())
+    engine.quasi         = torch.from_numpy(arrays['quasi'].copy())
+    engine._first_point  = torch.from_numpy(arrays['first_point'].copy())
+    engine.num_generated = int(arrays['num_generated'])
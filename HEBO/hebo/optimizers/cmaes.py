@@ -13,14 +13,25 @@ import numpy as np
 import torch
 import torch.nn as nn
 import warnings
-from torch.distributions import MultivariateNormal
 
 from hebo.design_space import DesignSpace
 from .abstract_optimizer import AbstractOptimizer
+from .checkpoint import with_prefix, strip_prefix, rng_state, set_rng_state, encode_frame, decode_frame
 
 class CMAES(AbstractOptimizer):
+    """
+    CMA-ES with lazy eigendecomposition
+
+    - The eigendecomposition of `C` used for sampling and for the
+      evolution path of `sigma` is only refreshed every `lazy_gap`
+      generations, default to `1 / (c_r1 + c_mu) / dim / 10`
+    - If `sep` is True (default for `dim > 1000`), `C` is kept diagonal,
+      stored as a vector, with learning rates scaled by `(dim + 2) / 3`
+      (sep-CMA-ES), so that each generation is O(dim)
+    """
     support_parallel_opt  = True
     support_combinatorial = True
+    support_checkpoint    = True
     def __init__(self, space : DesignSpace, pop_size = None, child_size = None, **algo_conf):
         super().__init__(space)
         self.dim           = self.space.num_paras
@@ -43,6 +54,11 @@ class CMAES(AbstractOptimizer):
         self.c_r1 = algo_conf.get('c_r1', 2. / ((self.dim + 1.3)**2 + self.mu_eff))
         self.c_mu = algo_conf.get('c_mu', min(1 - self.c_r1, 2 * (self.mu_eff - 2 + 1. / self.mu_eff) / ((self.dim + 2)**2 + self.mu_eff)))
         self.damp = algo_conf.get('damp', 1. + 2 * max(0., np.sqrt((self.mu_eff - 1) / (self.dim + 1)) - 1.))
+        self.sep  = algo_conf.get('sep', self.dim > 1000)
+        if self.sep:
+            self.c_r1 = min(1., self.c_r1 * (self.dim + 2) / 3)
+            self.c_mu = min(1 - self.c_r1, self.c_mu * (self.dim + 2) / 3)
+        self.lazy_gap = algo_conf.get('lazy_gap', 1. / (self.c_r1 + self.c_mu) / self.dim / 10)
 
         self.n_eval        = 0.
         self._best_x       = None
@@ -50,6 +66,9 @@ class CMAES(AbstractOptimizer):
         self.mu            = self.init_mu()
         self.sigma         = self.init_sigma()
         self.C             = self.init_C()
+        self.B             = None # eigenvectors of C, None in sep mode
+        self.D             = None # square root of eigenvalues of C
+        self.eigen_gen     = None
         self.p_sigma       = torch.zeros(self.dim)
         self.p_c           = torch.zeros(self.dim)
         self.n_resample    = 10
@@ -59,9 +78,13 @@ class CMAES(AbstractOptimizer):
         self.px            = None # parents
         self.cx            = None # children
 
+    @property
+    def C_diag(self) -> torch.Tensor:
+        return self.C if self.sep else self.C.diag()
+
     @property
     def max_step(self):
-        return self.sigma * self.C.diag().max()
+        return self.sigma * self.C_diag.max()
 
     def init_mu(self):
         # mu = self.space.opt_lb + (self.space.opt_ub - self.space.opt_lb) * torch.rand(self.dim)
@@ -69,7 +92,7 @@ class CMAES(AbstractOptimizer):
         return 0.5 * (self.space.opt_lb + self.space.opt_ub).view(-1)
 
     def init_C(self):
-        return torch.eye(self.dim)
+        return torch.ones(self.dim) if self.sep else torch.eye(self.dim)
 
     def init_sigma(self):
         return torch.tensor(0.5)
@@ -77,10 +100,49 @@ class CMAES(AbstractOptimizer):
     def restart(self, start_from_mu = False):
         if not start_from_mu: 
                 self.mu = self.init_mu()
-        self.sigma   = self.init_sigma()
-        self.p_sigma = torch.zeros(self.dim)
-        self.C       = self.init_C()
-        self.p_c     = torch.zeros(self.dim)
+        self.sigma     = self.init_sigma()
+        self.p_sigma   = torch.zeros(self.dim)
+        self.C         = self.init_C()
+        self.p_c       = torch.zeros(self.dim)
+        self.eigen_gen = None
+
+    def update_eigen(self) -> bool:
+        """
+        Refresh `B` and `D` if the decomposition is older than `lazy_gap`
+        generations, returns False if `C` is not positive definite
+        """
+        gen = self.n_eval / self.child_size
+        if self.eigen_gen is not None and gen - self.eigen_gen < self.lazy_gap:
+            return True
+        if self.sep:
+            D2, B = self.C, None
+        else:
+            self.C = 0.5 * (self.C + self.C.t())
+            try:
+                D2, B = torch.linalg.eigh(self.C)
+            except RuntimeError:
+                return False
+        if not torch.isfinite(D2).all() or (D2 <= 0).any():
+            return False
+        self.B, self.D, self.eigen_gen = B, D2.sqrt(), gen
+        return True
+
+    def sample_dist(self, n : int) -> torch.Tensor:
+        """
+        Samples of the gaussian with mean `mu` and covariance `sigma * C`
+        """
+        z = torch.randn(n, self.dim) * self.D
+        if not self.sep:
+            z = z.mm(self.B.t())
+        return self.mu + self.sigma.sqrt() * z
+
+    def whiten(self, v : torch.Tensor) -> torch.Tensor:
+        """
+        C^{-1/2} v
+        """
+        if self.sep:
+            return v / self.D
+        return self.B.mv(self.B.t().mv(v) / self.D)
 
     def suggest(self, n_suggestions = None, fix_input : dict = None):
         """
@@ -103,13 +165,11 @@ class CMAES(AbstractOptimizer):
         if self.max_step < self.restart_thres * (ub - lb).norm():
             self.restart(np.random.choice([True, False]))
 
-        try:
-            dist = MultivariateNormal(self.mu, self.sigma * self.C)
-        except (ValueError, RuntimeError):
+        if not self.update_eigen():
             warnings.warn('failed to construct gaussian, restart')
             self.restart(True)
-            dist = MultivariateNormal(self.mu, self.sigma * self.C)
-        sample    = dist.sample((n_suggestions, ))
+            self.update_eigen()
+        sample    = self.sample_dist(n_suggestions)
         sample[0] = self.mu
         
         # Handling bound constraints, resample then reflection
@@ -118,27 +178,31 @@ class CMAES(AbstractOptimizer):
             if cond:
                 break
             else:
-                sample = torch.cat([sample, dist.sample((n_suggestions, ))], dim = 0)
+                sample = torch.cat([sample, self.sample_dist(n_suggestions)], dim = 0)
                 sample = sample[(sample >= lb).all(dim = 1) & (sample <= ub).all(dim = 1)]
                 sample = sample[:n_suggestions]
         
         if sample.shape[0] < n_suggestions:
-            sample = torch.cat([sample, dist.sample((n_suggestions - sample.shape[0], ))], dim = 0)
-        
-        while (sample < lb).any() or (sample > ub).any():
-            for i in range(self.dim):
-                rl    = 2 * lb[i] - sample[:, i]
-                ru    = 2 * ub[i] - sample[:, i]
-                vio_l = sample[:, i] < lb[i]
-                vio_u = sample[:, i] > ub[i]
-                sample[vio_l, i] = rl[vio_l]
-                sample[vio_u, i] = ru[vio_u]
+            sample = torch.cat([sample, self.sample_dist(n_suggestions - sample.shape[0])], dim = 0)
+        sample = self.reflect(sample, lb, ub)
 
         X       = sample[:, :self.space.num_numeric]
         Xe      = sample[:, self.space.num_numeric:].round().long()
         self.cx = self.space.inverse_transform(X, Xe).head(n_suggestions)
         return self.cx
 
+    @staticmethod
+    def reflect(sample : torch.Tensor, lb : torch.Tensor, ub : torch.Tensor) -> torch.Tensor:
+        """
+        Repeated reflection of out-of-bound values at `lb` and `ub`, which is
+        a triangle wave of period `2 * (ub - lb)`
+        """
+        width = ub - lb
+        t     = torch.remainder(sample - lb, torch.where(width > 0, 2 * width, torch.ones_like(width)))
+        refl  = lb + torch.where(t > width, 2 * width - t, t)
+        inner = (sample >= lb) & (sample <= ub)
+        return torch.where(inner, sample, torch.where(width > 0, refl, lb.expand_as(sample)))
+
     def observe(self, x : pd.DataFrame, y : np.ndarray):
         """
         Observe new data
@@ -165,12 +229,10 @@ class CMAES(AbstractOptimizer):
         mu_old        = self.mu.clone()
         self.mu       = (px.t() * self.weights).sum(axis = 1)
 
-        D, P          = self.C.eig(True)
-        D             = D[:, 0] * torch.eye(self.dim)
-        Dinv          = (1. / D.diag()) * torch.eye(self.dim)
-        C_half_inv    = P.mm(Dinv.sqrt()).mm(P.t())
-
-        self.p_sigma  = (1 - self.cs) * self.p_sigma + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * C_half_inv.mm((self.mu - mu_old).view(-1, 1) / self.sigma).view(self.p_sigma.shape)
+        if not self.update_eigen():
+            self.restart(True)
+            self.update_eigen()
+        self.p_sigma  = (1 - self.cs) * self.p_sigma + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * self.whiten((self.mu - mu_old) / self.sigma)
 
         h_sig = 0.
         gen   = self.n_eval / self.child_size
@@ -185,13 +247,13 @@ class CMAES(AbstractOptimizer):
         self.sigma = torch.min(2 * (ub - lb).norm(), self.sigma)
 
         # rank-mu estimation
-        C_mu = torch.zeros(self.dim, self.dim)
-        for i in range(self.pop_size):
-            y     = (px[i] - mu_old).view(-1, 1) / self.sigma
-            C_mu += self.weights[i] * y.mm(y.t())
-        
-        # rank-1 estimation
-        C_r1 = self.p_c.view(-1, 1).mm(self.p_c.view(1, -1)) + (1 - h_sig) * self.cc * (2 - self.cc) * self.C
+        Y = (px - mu_old) / self.sigma
+        if self.sep:
+            C_mu = self.weights.matmul(Y**2)
+            C_r1 = self.p_c**2 + (1 - h_sig) * self.cc * (2 - self.cc) * self.C
+        else:
+            C_mu = (Y.t() * self.weights).mm(Y)
+            C_r1 = torch.outer(self.p_c, self.p_c) + (1 - h_sig) * self.cc * (2 - self.cc) * self.C
 
         self.C = (1 - self.c_r1 - self.c_mu) * self.C + self.c_r1 * C_r1 + self.c_mu * C_mu
 
@@ -206,3 +268,23 @@ class CMAES(AbstractOptimizer):
         if self.best_x is None:
             raise RuntimeError('No data has been observed!')
         return self._best_y
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        arrays = {name : getattr(self, name).numpy() for name in ['mu', 'sigma', 'C', 'p_sigma', 'p_c', 'B', 'D'] if getattr(self, name) is not None}
+        arrays.update(with_prefix(rng_state(), 'rng'))
+        for name in ['_best_x', 'px', 'cx']:
+            if getattr(self, name) is not None:
+                arrays.update(with_prefix(encode_frame(getattr(self, name), self.space), name))
+        meta = {'n_eval' : float(self.n_eval), 'eigen_gen' : self.eigen_gen, 'best_y' : float(self._best_y)}
+        return arrays, meta
+
+    def set_state(self, arrays : dict, meta : dict):
+        for name in ['mu', 'sigma', 'C', 'p_sigma', 'p_c', 'B', 'D']:
+            setattr(self, name, torch.from_numpy(arrays[name].copy(order = 'K')) if name in arrays else None) # keep memory layout, `B` is a transposed view
+        for name in ['_best_x', 'px', 'cx']:
+            frame = strip_prefix(arrays, name)
+            setattr(self, name, decode_frame(frame, self.space) if len(frame) > 0 else None)
+        set_rng_state(strip_prefix(arrays, 'rng'))
+        self.n_eval    = meta['n_eval']
+        self.eigen_gen = meta['eigen_gen']
+        self._best_y   = meta['best_y']
@@ -23,6 +23,7 @@ Config.show_compile_hint = False
 
 from hebo.design_space.design_space import DesignSpace
 from .abstract_optimizer import AbstractOptimizer
+from .checkpoint import with_prefix, strip_prefix, dump_object, load_object, rng_state, set_rng_state
 
 class DummyProb(Problem):
     def __init__(self,
@@ -43,6 +44,7 @@ class Evolution(AbstractOptimizer):
     support_multi_objective = True
     support_combinatorial   = True
     support_contextual      = False
+    support_checkpoint      = True
 
     def __init__(self, 
             space      : DesignSpace,
@@ -96,6 +98,23 @@ class Evolution(AbstractOptimizer):
         self.algo.tell(infills = self.pop)
         self.n_observation += rec.shape[0]
 
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        """
+        The pymoo algorithm (population, archive of optimal solutions,
+        generation counter) and the last asked population are pickled
+        """
+        arrays = with_prefix(rng_state(), 'rng')
+        arrays['algo'] = dump_object(self.algo)
+        arrays['pop']  = dump_object(getattr(self, 'pop', None))
+        return arrays, {'n_observation' : self.n_observation}
+
+    def set_state(self, arrays : dict, meta : dict):
+        self.algo = load_object(arrays['algo'])
+        self.pop  = load_object(arrays['pop'])
+        self.prob = self.algo.problem
+        set_rng_state(strip_prefix(arrays, 'rng'))
+        self.n_observation = meta['n_observation']
+
     @property
     def best_x(self) -> pd.DataFrame:
         if self.n_observation == 0:
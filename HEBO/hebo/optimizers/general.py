@@ -14,17 +14,19 @@ import torch
 from hebo.design_space.design_space import DesignSpace
 from hebo.models.model_factory import get_model, get_model_class
 from hebo.acquisitions.acq import GeneralAcq
+from hebo.acquisitions.ehvi import greedy_qehvi
 from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
 
 from .abstract_optimizer import AbstractOptimizer
-
-from pymoo.factory import get_performance_indicator
-from pymoo.util.dominator import Dominator
+from .observation_store import ObservationStore
+from .pareto_archive import ParetoArchive
+from .checkpoint import with_prefix, strip_prefix, dump_object, load_object, rng_state, set_rng_state
 
 class GeneralBO(AbstractOptimizer):
     """
     Bayesian optimisation that supports multi-objective and constrained optimization
     """
+    support_checkpoint = True
     def __init__(self,
             space : DesignSpace,
             num_obj:      int   = 1,
@@ -38,7 +40,13 @@ class GeneralBO(AbstractOptimizer):
             evo_pop:      int   = 100,
             evo_iters:    int   = 200,
             ref_point:    np.ndarray = None,
+            acq_opt_conf: dict  = None,
             ):
+        """
+        acq_opt_conf: extra configuration of the evolutionary acquisition
+                      optimizer, e.g., `early_stop` and `max_time`, statistics
+                      of the last optimisation are stored in `acq_opt_stats`
+        """
         super().__init__(space)
         self.space        = space
         self.num_obj      = num_obj
@@ -46,8 +54,8 @@ class GeneralBO(AbstractOptimizer):
         self.rand_sample  = 1 + self.space.num_paras if rand_sample is None else rand_sample
         self.model_name   = model_name
         self.model_config = model_config if model_config is not None else {}
-        self.X            = pd.DataFrame(columns = self.space.para_names)
-        self.y            = np.zeros((0, num_obj + num_constr))
+        self.store        = ObservationStore(self.space, num_obj + num_constr)
+        self.archive      = ParetoArchive(num_obj, num_constr)
         self.kappa        = kappa
         self.c_kappa      = c_kappa
         self.use_noise    = use_noise
@@ -56,19 +64,21 @@ class GeneralBO(AbstractOptimizer):
         self.evo_iters    = evo_iters
         self.iter         = 0
         self.ref_point    = ref_point
+        self.acq_opt_conf = {} if acq_opt_conf is None else acq_opt_conf
+        self.acq_opt_stats = None
         if num_obj + num_constr > 1:
             assert get_model_class(model_name).support_multi_output
 
     def suggest(self, n_suggestions = 1, fix_input = None):
         self.iter += 1
-        if self.X.shape[0] < self.rand_sample:
+        if self.store.size < self.rand_sample:
             sample = self.space.sample(n_suggestions)
             if fix_input is not None:
                 for k, v in fix_input.items():
                     sample[k] = v
             return sample
         else:
-            X, Xe      = self.space.transform(self.X)
+            X, Xe      = self.store.transformed()
             y          = torch.FloatTensor(self.y)
             num_uniqs  = None if Xe.shape[1] == 0 else [len(self.space.paras[name].categories) for name in self.space.enum_names]
             self.model = get_model(self.model_name, X.shape[1], Xe.shape[1], y.shape[1], num_uniqs = num_uniqs, **self.model_config)
@@ -78,9 +88,9 @@ class GeneralBO(AbstractOptimizer):
             upsi    = 0.1
             delta   = 0.01
             if kappa is None:
-                kappa = np.sqrt(upsi * 2 * ((2.0 + self.X.shape[1] / 2.0) * np.log(self.iter) + np.log(3 * np.pi**2 / (3 * delta))))
+                kappa = np.sqrt(upsi * 2 * ((2.0 + self.space.num_paras / 2.0) * np.log(self.iter) + np.log(3 * np.pi**2 / (3 * delta))))
             if c_kappa is None:
-                c_kappa = np.sqrt(upsi * 2 * ((2.0 + self.X.shape[1] / 2.0) * np.log(self.iter) + np.log(3 * np.pi**2 / (3 * delta))))
+                c_kappa = np.sqrt(upsi * 2 * ((2.0 + self.space.num_paras / 2.0) * np.log(self.iter) + np.log(3 * np.pi**2 / (3 * delta))))
             acq = GeneralAcq(
                   self.model,
                   self.num_obj,
@@ -88,8 +98,9 @@ class GeneralBO(AbstractOptimizer):
                   kappa     = kappa, 
                   c_kappa   = c_kappa,
                   use_noise = self.use_noise)
-            opt     = EvolutionOpt(self.space, acq, pop = self.evo_pop, iters = self.evo_iters)
+            opt     = EvolutionOpt(self.space, acq, **{'pop' : self.evo_pop, 'iters' : self.evo_iters, **self.acq_opt_conf})
             suggest = opt.optimize()
+            self.acq_opt_stats = opt.stats
             if suggest.shape[0] < n_suggestions:
                 rand_samp = self.space.sample(n_suggestions - suggest.shape[0])
                 suggest   = pd.concat([suggest, rand_samp], axis = 0, ignore_index = True)
@@ -106,26 +117,9 @@ class GeneralBO(AbstractOptimizer):
                 assert self.num_obj > 1
                 assert self.num_constr == 0
                 n_mc = 10
-                hv   = get_performance_indicator('hv', ref_point = self.ref_point.reshape(-1))
                 with torch.no_grad():
-                    py, ps2 = self.model.predict(*self.space.transform(suggest))
-                    y_samp  = self.model.sample_y(*self.space.transform(suggest), n_mc).numpy()
-                y_curr    = self.get_pf(self.y).copy()
-                select_id = []
-                for i in range(n_suggestions):
-                    ehvi_lst = []
-                    base_hv  = hv.do(y_curr)
-                    for j in range(suggest.shape[0]):
-                        samp    = y_samp[:, j]
-                        hvi_est = 0
-                        for k in range(n_mc):
-                            y_tmp    = np.vstack([y_curr, samp[[k]]])
-                            hvi_est += hv.do(y_tmp) - base_hv
-                        hvi_est /= n_mc
-                        ehvi_lst.append(hvi_est)
-                    best_id = np.argmax(ehvi_lst) if max(ehvi_lst) > 0 else np.random.choice(suggest.shape[0])
-                    y_curr  = np.vstack([y_curr, y_samp[:, best_id].min(axis = 0, keepdims = True)])
-                    select_id.append(best_id)
+                    y_samp = self.model.sample_y(*self.space.transform(suggest), n_mc).numpy()
+                select_id = greedy_qehvi(self.best_y, self.ref_point, y_samp, n_suggestions)
 
             select_id = list(set(select_id))
             if len(select_id) < n_suggestions:
@@ -148,34 +142,60 @@ class GeneralBO(AbstractOptimizer):
         valid_id = np.isfinite(y).all(axis = 1)
         XX       = X.iloc[valid_id]
         yy       = y[valid_id]
-        self.X   = self.X.append(XX, ignore_index = True)
-        self.y   = np.vstack([self.y, yy])
-        assert self.y.shape[1] == self.num_obj + self.num_constr
+        assert yy.shape[1] == self.num_obj + self.num_constr
+        self.archive.update(yy, offset = self.store.size)
+        self.store.append(XX, yy)
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        arrays = {
+                **with_prefix(self.store.state_dict(), 'store'),
+                **with_prefix(rng_state(), 'rng'),
+                'archive/idx' : self.archive.idx,
+                'archive/y'   : self.archive.y,
+                }
+        if save_model and self.model is not None:
+            arrays['model'] = dump_object(self.model)
+        return arrays, {'num_obs' : self.store.size, 'iter' : self.iter}
+
+    def set_state(self, arrays : dict, meta : dict):
+        self.store.load_state_dict(strip_prefix(arrays, 'store'))
+        set_rng_state(strip_prefix(arrays, 'rng'))
+        self.archive.idx = arrays['archive/idx'].astype(int)
+        self.archive.y   = arrays['archive/y'].reshape(-1, self.num_obj + self.num_constr)
+        self.iter        = meta['iter']
+        self.model       = load_object(arrays['model']) if 'model' in arrays else None
 
     def select_best(self, rec : pd.DataFrame) -> pd.DataFrame:
         pass
 
     def get_pf(self, y : np.ndarray, return_optimal = False) -> pd.DataFrame:
-        feasible = (y[:, self.num_obj:] <= 0).all(axis = 1)
-        y        = y[feasible].copy()
-        y_obj    = y[:, :self.num_obj]
-        if feasible.any():
-            dom_mat = Dominator().calc_domination_matrix(y_obj, None)
-            optimal = (dom_mat >= 0).all(axis = 1)
-        else:
-            optimal = feasible
+        """
+        Feasible, non-dominated rows of `y`, or their boolean mask over all
+        rows of `y` if `return_optimal` is True
 
+        NOTE: the observed data are tracked incrementally by `self.archive`,
+        use `best_y` and `best_x` for them instead of recomputing
+        """
+        archive = ParetoArchive(self.num_obj, self.num_constr)
+        archive.update(y)
         if not return_optimal:
-            return y[optimal].copy()
+            return archive.y.copy()
         else:
-            return optimal
+            return archive.mask(y.shape[0])
+
 
+    @property
+    def X(self) -> pd.DataFrame:
+        return self.store.X
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.store.y
 
     @property
     def best_x(self):
-        optimal = self.get_pf(self.y, return_optimal = True)
-        return self.X[optimal].copy()
+        return self.store.rows(self.archive.idx)
 
     @property
     def best_y(self):
-        return self.get_pf(self.y)
+        return self.archive.y.copy()
@@ -19,36 +19,69 @@ from torch.quasirandom import SobolEngine
 from sklearn.preprocessing import power_transform
 
 from hebo.design_space.design_space import DesignSpace
-from hebo.models.model_factory import get_model
-from hebo.acquisitions.acq import MACE, Mean, Sigma
+from hebo.models.model_factory import get_model, get_model_class
+from hebo.acquisitions.acq import MACE
 from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
+from hebo.acq_optimizers.gradient_optimizer import GradientOpt
 
 from .abstract_optimizer import AbstractOptimizer
-
-torch.set_num_threads(min(1, torch.get_num_threads()))
+from .observation_store import ObservationStore
+from .util import get_num_threads, torch_threads
+from .checkpoint import with_prefix, strip_prefix, dump_object, load_object, rng_state, set_rng_state, sobol_state, set_sobol_state
 
 class HEBO(AbstractOptimizer):
     support_parallel_opt  = True
     support_combinatorial = True
     support_contextual    = True
+    support_checkpoint    = True
+    exact_models          = ['gp', 'gpy', 'gpy_mlp']
     def __init__(self, space, model_name = 'gpy', rand_sample = None, acq_cls = MACE, es = 'nsga2', model_config = None,
-                 scramble_seed: Optional[int] = None ):
+                 scramble_seed: Optional[int] = None, warm_start : bool = False, acq_opt : str = 'evolution',
+                 num_threads : int = None, eval_workers : int = 1, eval_executor : str = 'thread',
+                 acq_opt_conf : dict = None, sparse_model : str = 'svgp', sparse_threshold : int = 5000):
         """
         model_name  : surrogate model to be used
         rand_sample : iterations to perform random sampling
         scramble_seed : seed used for the sobol sampling of the first initial points
+        warm_start  : reuse the surrogate across `suggest` calls and refit it
+                      incrementally, only valid for models with `support_warm_start`
+        acq_opt     : acquisition optimizer, 'evolution' or 'grad', 'grad' is
+                      only used with differentiable surrogates (`support_grad`),
+                      otherwise the evolutionary optimizer is used
+        num_threads : torch thread budget of `suggest`, default to the
+                      `HEBO_NUM_THREADS` environment variable or 1
+        eval_workers, eval_executor : number of threads ('thread') or
+                      processes ('process') evaluating shards of the
+                      population of the evolutionary acquisition optimizer
+        acq_opt_conf : extra configuration of the evolutionary acquisition
+                      optimizer, e.g., `early_stop` and `max_time`, statistics
+                      of the last optimisation are stored in `acq_opt_stats`
+        sparse_model, sparse_threshold : once `sparse_threshold` observations
+                      are stored, exact GP surrogates (`exact_models`) are
+                      replaced by `sparse_model`, which is always warm-started
+                      across `suggest` calls, `None` disables the switch
         """
         super().__init__(space)
         self.space       = space
         self.es          = es
-        self.X           = pd.DataFrame(columns = self.space.para_names)
-        self.y           = np.zeros((0, 1))
+        self.store       = ObservationStore(self.space, 1)
         self.model_name  = model_name
         self.rand_sample = 1 + self.space.num_paras if rand_sample is None else max(2, rand_sample)
         self.scramble_seed = scramble_seed
         self.sobol       = SobolEngine(self.space.num_paras, scramble = True, seed = scramble_seed)
         self.acq_cls     = acq_cls
         self._model_config = model_config
+        self.warm_start  = warm_start and get_model_class(model_name).support_warm_start
+        self.model       = None
+        self.acq_opt     = acq_opt
+        self.num_threads   = num_threads
+        self.eval_workers  = eval_workers
+        self.eval_executor = eval_executor
+        self.acq_opt_conf  = {} if acq_opt_conf is None else acq_opt_conf
+        self.acq_opt_stats = None
+        self.sparse_model     = sparse_model
+        self.sparse_threshold = sparse_threshold
+        assert acq_opt in ['evolution', 'grad']
 
     def quasi_sample(self, n, fix_input = None): 
         samp    = self.sobol.draw(n)
@@ -64,10 +97,22 @@ class HEBO(AbstractOptimizer):
                 df_samp[k] = v
         return df_samp
 
+    @property
+    def surrogate_name(self) -> str:
+        """
+        Name of the surrogate fitted by the next `suggest` call
+        """
+        if self.sparse_threshold is not None and self.model_name in self.exact_models and self.store.size >= self.sparse_threshold:
+            return self.sparse_model
+        return self.model_name
+
     @property
     def model_config(self):
-        if self._model_config is None:
-            if self.model_name == 'gp':
+        return self.get_model_config(self.model_name)
+
+    def get_model_config(self, model_name : str) -> dict:
+        if self._model_config is None or model_name != self.model_name:
+            if model_name == 'gp':
                 cfg = {
                         'lr'           : 0.01,
                         'num_epochs'   : 100,
@@ -75,20 +120,33 @@ class HEBO(AbstractOptimizer):
                         'noise_lb'     : 8e-4, 
                         'pred_likeli'  : False
                         }
-            elif self.model_name == 'gpy':
+            elif model_name == 'gpy':
                 cfg = {
                         'verbose' : False,
                         'warp'    : True,
                         'space'   : self.space
                         }
-            elif self.model_name == 'gpy_mlp':
+            elif model_name == 'gpy_mlp':
                 cfg = {
                         'verbose' : False
                         }
-            elif self.model_name == 'rf':
+            elif model_name == 'rf':
                 cfg =  {
                         'n_estimators' : 20
                         }
+            elif model_name == 'svgp':
+                cfg = {
+                        'num_inducing' : 256,
+                        'batch_size'   : 1024,
+                        'num_epochs'   : 500,
+                        'warm_epochs'  : 50,
+                        'max_iters'    : 500,
+                        'lr'           : 0.01,
+                        'noise_lb'     : 8e-4,
+                        'pred_likeli'  : False,
+                        'warp'         : True,
+                        'space'        : self.space
+                        }
             else:
                 cfg = {}
         else:
@@ -98,10 +156,20 @@ class HEBO(AbstractOptimizer):
             cfg['num_uniqs'] = [len(self.space.paras[name].categories) for name in self.space.enum_names]
         return cfg
 
+    def get_surrogate(self):
+        name = self.surrogate_name
+        if name == self.model_name:
+            warm_start = self.warm_start
+        else:
+            warm_start = get_model_class(name).support_warm_start
+        if warm_start and isinstance(self.model, get_model_class(name)):
+            return self.model
+        return get_model(name, self.space.num_numeric, self.space.num_categorical, 1, **self.get_model_config(name))
+
     def get_best_id(self, fix_input : dict = None) -> int:
         if fix_input is None:
             return np.argmin(self.y.reshape(-1))
-        X = self.X.copy()
+        X = self.X
         y = self.y.copy()
         for k, v in fix_input.items():
             if X[k].dtype != 'float':
@@ -114,14 +182,29 @@ class HEBO(AbstractOptimizer):
         else:
             return np.argmin(self.y.reshape(-1))
 
+    def get_acq_optimizer(self, acq, **conf) -> EvolutionOpt:
+        """
+        Evolutionary acquisition optimizer sharing the thread budget among
+        its evaluation workers
+        """
+        return EvolutionOpt(self.space, acq,
+                num_workers = self.eval_workers,
+                executor    = self.eval_executor,
+                num_threads = max(1, get_num_threads(self.num_threads) // max(1, self.eval_workers)),
+                **{**conf, **self.acq_opt_conf})
+
     def suggest(self, n_suggestions=1, fix_input = None):
+        with torch_threads(self.num_threads):
+            return self._suggest(n_suggestions, fix_input)
+
+    def _suggest(self, n_suggestions=1, fix_input = None):
         if self.acq_cls != MACE and n_suggestions != 1:
             raise RuntimeError('Parallel optimization is supported only for MACE acquisition')
-        if self.X.shape[0] < self.rand_sample:
+        if self.store.size < self.rand_sample:
             sample = self.quasi_sample(n_suggestions, fix_input)
             return sample
         else:
-            X, Xe = self.space.transform(self.X)
+            X, Xe = self.store.transformed()
             try:
                 if self.y.min() <= 0:
                     y = torch.FloatTensor(power_transform(self.y / self.y.std(), method = 'yeo-johnson'))
@@ -131,31 +214,34 @@ class HEBO(AbstractOptimizer):
                         y = torch.FloatTensor(power_transform(self.y / self.y.std(), method = 'yeo-johnson'))
                 if y.std() < 0.5:
                     raise RuntimeError('Power transformation failed')
-                model = get_model(self.model_name, self.space.num_numeric, self.space.num_categorical, 1, **self.model_config)
+                model = self.get_surrogate()
                 model.fit(X, Xe, y)
             except:
                 y     = torch.FloatTensor(self.y).clone()
-                model = get_model(self.model_name, self.space.num_numeric, self.space.num_categorical, 1, **self.model_config)
+                model = self.get_surrogate()
                 model.fit(X, Xe, y)
+            self.model = model
 
             best_id = self.get_best_id(fix_input)
-            best_x  = self.X.iloc[[best_id]]
+            best_x  = self.store.rows([best_id])
             best_y  = y.min()
             py_best, ps2_best = model.predict(*self.space.transform(best_x))
             py_best = py_best.detach().numpy().squeeze()
             ps_best = ps2_best.sqrt().detach().numpy().squeeze()
 
-            iter  = max(1, self.X.shape[0] // n_suggestions)
+            iter  = max(1, self.store.size // n_suggestions)
             upsi  = 0.5
             delta = 0.01
             # kappa = np.sqrt(upsi * 2 * np.log(iter **  (2.0 + self.X.shape[1] / 2.0) * 3 * np.pi**2 / (3 * delta)))
-            kappa = np.sqrt(upsi * 2 * ((2.0 + self.X.shape[1] / 2.0) * np.log(iter) + np.log(3 * np.pi**2 / (3 * delta))))
+            kappa = np.sqrt(upsi * 2 * ((2.0 + self.space.num_paras / 2.0) * np.log(iter) + np.log(3 * np.pi**2 / (3 * delta))))
 
             acq = self.acq_cls(model, best_y = py_best, kappa = kappa) # LCB < py_best
-            mu  = Mean(model)
-            sig = Sigma(model, linear_a = -1.)
-            opt = EvolutionOpt(self.space, acq, pop = 100, iters = 100, verbose = False, es=self.es)
+            if self.acq_opt == 'grad' and model.support_grad:
+                opt = GradientOpt(self.space, acq, n_starts = 100, iters = 100, verbose = False)
+            else:
+                opt = self.get_acq_optimizer(acq, pop = 100, iters = 100, verbose = False, es=self.es)
             rec = opt.optimize(initial_suggest = best_x, fix_input = fix_input).drop_duplicates()
+            self.acq_opt_stats = getattr(opt, 'stats', None)
             rec = rec[self.check_unique(rec)]
 
             cnt = 0
@@ -174,8 +260,9 @@ class HEBO(AbstractOptimizer):
             select_id = np.random.choice(rec.shape[0], n_suggestions, replace = False).tolist()
             x_guess   = []
             with torch.no_grad():
-                py_all       = mu(*self.space.transform(rec)).squeeze().numpy()
-                ps_all       = -1 * sig(*self.space.transform(rec)).squeeze().numpy()
+                py_all, ps2_all = model.predict_mean_var(*self.space.transform(rec))
+                py_all       = py_all.squeeze().numpy()
+                ps_all       = ps2_all.sqrt().squeeze().numpy()
                 best_pred_id = np.argmin(py_all)
                 best_unce_id = np.argmax(ps_all)
                 if best_unce_id not in select_id and n_suggestions > 2:
@@ -186,7 +273,7 @@ class HEBO(AbstractOptimizer):
             return rec_selected
 
     def check_unique(self, rec : pd.DataFrame) -> [bool]:
-        return (~pd.concat([self.X, rec], axis = 0).duplicated().tail(rec.shape[0]).values).tolist()
+        return self.store.check_unique(rec)
 
     def observe(self, X, y):
         """Feed an observation back.
@@ -203,19 +290,42 @@ class HEBO(AbstractOptimizer):
         valid_id = np.where(np.isfinite(y.reshape(-1)))[0].tolist()
         XX       = X.iloc[valid_id]
         yy       = y[valid_id].reshape(-1, 1)
-        self.X   = self.X.append(XX, ignore_index = True)
-        self.y   = np.vstack([self.y, yy])
+        self.store.append(XX, yy)
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        arrays = {
+                **with_prefix(self.store.state_dict(), 'store'),
+                **with_prefix(sobol_state(self.sobol), 'sobol'),
+                **with_prefix(rng_state(), 'rng'),
+                }
+        if save_model and self.model is not None:
+            arrays['model'] = dump_object(self.model)
+        return arrays, {'num_obs' : self.store.size}
+
+    def set_state(self, arrays : dict, meta : dict):
+        self.store.load_state_dict(strip_prefix(arrays, 'store'))
+        set_sobol_state(self.sobol, strip_prefix(arrays, 'sobol'))
+        set_rng_state(strip_prefix(arrays, 'rng'))
+        self.model = load_object(arrays['model']) if 'model' in arrays else None
+
+    @property
+    def X(self) -> pd.DataFrame:
+        return self.store.X
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.store.y
 
     @property
     def best_x(self)->pd.DataFrame:
-        if self.X.shape[0] == 0:
+        if self.store.size == 0:
             raise RuntimeError('No data has been observed!')
         else:
-            return self.X.iloc[[self.y.argmin()]]
+            return self.store.rows([self.y.argmin()])
 
     @property
     def best_y(self)->float:
-        if self.X.shape[0] == 0:
+        if self.store.size == 0:
             raise RuntimeError('No data has been observed!')
         else:
             return self.y.min()
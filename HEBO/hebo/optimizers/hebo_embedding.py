@@ -23,8 +23,6 @@ from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
 from .abstract_optimizer import AbstractOptimizer
 from .hebo import HEBO
 
-torch.set_num_threads(min(1, torch.get_num_threads()))
-
 def gen_emb_space(eff_dim : int, scale : float) -> DesignSpace:
     scale = -1 * scale if scale < 0 else scale
     space = DesignSpace().parse([{'name' : f'y{i}', 'type' : 'num', 'lb' : -1 * scale, 'ub' : scale} for i in range(eff_dim)])
@@ -91,7 +89,8 @@ class HEBO_Embedding(AbstractOptimizer):
             scale   : float = 1,
             strategy : str  = 'alebo',
             clip : bool     = False,
-            rand_sample     = None):
+            rand_sample     = None,
+            num_threads     = None):
         super().__init__(space)
         assert check_design_space(space)
         self.space       = space
@@ -101,7 +100,7 @@ class HEBO_Embedding(AbstractOptimizer):
         self.eff_space   = gen_emb_space(eff_dim, scale)
         self.clip        = clip
         self.acq_cls     = MACE if self.clip else gen_mace_cls(self.proj_matrix) # If we use
-        self.mace        = HEBO(self.eff_space, model_name, rand_sample, acq_cls = self.acq_cls)
+        self.mace        = HEBO(self.eff_space, model_name, rand_sample, acq_cls = self.acq_cls, num_threads = num_threads)
         self.mace.quasi_sample = self.quasi_sample
 
     def quasi_sample(self, n, fix_input = None, factor = 16): 
@@ -16,37 +16,36 @@ from copy import deepcopy
 from torch.quasirandom import SobolEngine
 
 from hebo.design_space.design_space import DesignSpace
-from hebo.models.model_factory import get_model
-from hebo.acquisitions.acq import NoisyAcq, Mean, Sigma
+from hebo.acquisitions.acq import NoisyAcq
 from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
 from .hebo import HEBO
 
-torch.set_num_threads(min(1, torch.get_num_threads()))
-
 class NoisyOpt(HEBO):
     support_parallel_opt  = True
     support_combinatorial = True
     support_contextual    = True
-    def __init__(self, space, model_name = 'gpy', rand_sample = None, es = 'nsga2', model_config = None):
+    def __init__(self, space, model_name = 'gpy', rand_sample = None, es = 'nsga2', model_config = None, **conf):
         """
         model_name : surrogate model to be used
         rand_iter  : iterations to perform random sampling
+        conf       : thread budget and evaluation workers, see `HEBO`
         """
-        super().__init__(space, model_name, rand_sample, NoisyAcq, es, model_config)
+        super().__init__(space, model_name, rand_sample, NoisyAcq, es, model_config, **conf)
 
-    def suggest(self, n_suggestions=1, fix_input = None):
+    def _suggest(self, n_suggestions=1, fix_input = None):
         assert fix_input is None
-        if self.X.shape[0] < self.rand_sample:
+        if self.store.size < self.rand_sample:
             sample = self.quasi_sample(n_suggestions, fix_input)
             return sample
         else:
-            X, Xe = self.space.transform(self.X)
+            X, Xe = self.store.transformed()
             y     = torch.FloatTensor(self.y).clone()
-            model = get_model(self.model_name, self.space.num_numeric, self.space.num_categorical, 1, **self.model_config)
+            model = self.get_surrogate()
             model.fit(X, Xe, y)
+            self.model = model
 
             best_id = self.get_best_id(fix_input)
-            best_x  = self.X.iloc[[best_id]]
+            best_x  = self.store.rows([best_id])
             best_y  = y.min()
             py_best, ps2_best = model.predict(*self.space.transform(best_x))
             py_best = py_best.detach().numpy().squeeze()
@@ -54,8 +53,9 @@ class NoisyOpt(HEBO):
 
 
             acq = self.acq_cls(model, 1, 0)
-            opt = EvolutionOpt(self.space, acq, pop = 100, iters = 100, verbose = False, es=self.es)
+            opt = self.get_acq_optimizer(acq, pop = 100, iters = 100, verbose = False, es=self.es)
             rec = opt.optimize(initial_suggest = best_x, return_pop = True)
+            self.acq_opt_stats = opt.stats
             rec = rec[self.check_unique(rec)]
 
             cnt = 0
@@ -73,11 +73,10 @@ class NoisyOpt(HEBO):
 
             select_id = np.random.choice(rec.shape[0], n_suggestions, replace = False).tolist()
             x_guess   = []
-            mu  = Mean(model)
-            sig = Sigma(model, linear_a = -1.)
             with torch.no_grad():
-                py_all       = mu(*self.space.transform(rec)).squeeze().numpy()
-                ps_all       = -1 * sig(*self.space.transform(rec)).squeeze().numpy()
+                py_all, ps2_all = model.predict_mean_var(*self.space.transform(rec))
+                py_all       = py_all.squeeze().numpy()
+                ps_all       = ps2_all.sqrt().squeeze().numpy()
                 best_pred_id = np.argmin(py_all)
                 best_unce_id = np.argmax(ps_all)
                 if best_unce_id not in select_id and n_suggestions > 2:
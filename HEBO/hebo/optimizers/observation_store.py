@@ -0,0 +1,168 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import numpy  as np
+import pandas as pd
+import torch
+from torch import FloatTensor, LongTensor
+
+from hebo.design_space.design_space import DesignSpace
+from .checkpoint import encode_columns, decode_columns, with_prefix, strip_prefix
+
+class ObservationStore:
+    """
+    Columnar storage of observed data
+
+    - Raw parameter values, transformed `(Xc, Xe)` and targets are kept in
+      preallocated arrays whose capacity grows geometrically, so that `append`
+      is amortized O(number of new rows)
+    - Only new rows are encoded via `space.transform`
+    - Row hashes are kept in a set so that duplicate checking of a candidate
+      batch does not depend on the size of the history
+    """
+    def __init__(self, space : DesignSpace, num_out : int = 1, capacity : int = 64):
+        self.space    = space
+        self.num_out  = num_out
+        self.size     = 0
+        self.capacity = max(1, capacity)
+        self._xc      = np.zeros((self.capacity, space.num_numeric), dtype = np.float32)
+        self._xe      = np.zeros((self.capacity, space.num_categorical), dtype = np.int64)
+        self._y       = np.zeros((self.capacity, num_out))
+        self._raw     = {}
+        self._hashes  = set()
+        self._df      = None
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, capacity : int):
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, 2 * self.capacity)
+        self._xc = self._grow(self._xc, capacity)
+        self._xe = self._grow(self._xe, capacity)
+        self._y  = self._grow(self._y,  capacity)
+        for name, col in self._raw.items():
+            self._raw[name] = self._grow(col, capacity)
+        self.capacity = capacity
+
+    def append(self, X : pd.DataFrame, y : np.ndarray):
+        num_new = X.shape[0]
+        y       = np.asarray(y, dtype = float).reshape(num_new, self.num_out)
+        if num_new == 0:
+            return
+        self.reserve(self.size + num_new)
+
+        new_slice = slice(self.size, self.size + num_new)
+        xc, xe    = self.space.transform(X)
+        self._xc[new_slice] = xc.numpy()
+        self._xe[new_slice] = xe.numpy()
+        self._y[new_slice]  = y
+        for name in self.space.para_names:
+            self._append_raw(name, X[name].values, new_slice)
+        self._hashes.update(self.hash_rows(X).tolist())
+        self.size += num_new
+        self._df   = None
+
+    @property
+    def X(self) -> pd.DataFrame:
+        if self._df is None:
+            if self.size == 0:
+                self._df = pd.DataFrame(columns = self.space.para_names)
+            else:
+                self._df = pd.DataFrame({name : self._raw[name][:self.size] for name in self.space.para_names}, columns = self.space.para_names)
+        return self._df
+
+    @property
+    def y(self) -> np.ndarray:
+        # a copy, in-place edits by the caller must not reach the buffer
+        return self._y[:self.size].copy()
+
+    def rows(self, idx) -> pd.DataFrame:
+        """
+        Equivalent to `self.X.iloc[idx]`, without materializing the whole history
+        """
+        idx = np.asarray(idx, dtype = int).reshape(-1)
+        if self.size == 0:
+            return pd.DataFrame(columns = self.space.para_names)
+        return pd.DataFrame({name : self._raw[name][idx] for name in self.space.para_names}, columns = self.space.para_names, index = idx)
+
+    def transformed(self) -> (FloatTensor, LongTensor):
+        """
+        Cached `space.transform(self.X)`
+        """
+        xc = torch.from_numpy(self._xc[:self.size].copy())
+        xe = torch.from_numpy(self._xe[:self.size].copy())
+        return xc, xe
+
+    def check_unique(self, rec : pd.DataFrame) -> [bool]:
+        """
+        For each row of `rec`, whether it is neither observed before nor a
+        duplicate of a previous row in `rec`
+        """
+        if rec.shape[0] == 0:
+            return []
+        hashes = self.hash_rows(rec)
+        dup    = pd.Series(hashes).duplicated().values
+        seen   = np.array([h in self._hashes for h in hashes.tolist()], dtype = bool)
+        return (~(dup | seen)).tolist()
+
+    def hash_rows(self, X : pd.DataFrame) -> np.ndarray:
+        canon = {}
+        for name in self.space.para_names:
+            if self.space.paras[name].is_categorical:
+                canon[name] = X[name].values.astype(object)
+            else:
+                canon[name] = X[name].values.astype(float)
+        return pd.util.hash_pandas_object(pd.DataFrame(canon), index = False).values
+
+    def state_dict(self) -> dict:
+        """
+        Observed rows as named arrays, raw parameter values are stored column
+        by column under `X/<name>`
+        """
+        raw    = {name : col[:self.size] for name, col in self._raw.items()}
+        arrays = {'xc' : self._xc[:self.size], 'xe' : self._xe[:self.size], 'y' : self._y[:self.size]}
+        arrays.update(with_prefix(encode_columns(raw, self.space), 'X'))
+        return arrays
+
+    def load_state_dict(self, arrays : dict):
+        size = arrays['y'].shape[0]
+        self.size     = 0
+        self.capacity = max(1, size)
+        self._xc      = arrays['xc'].astype(np.float32).reshape(size, self.space.num_numeric)
+        self._xe      = arrays['xe'].astype(np.int64).reshape(size, self.space.num_categorical)
+        self._y       = arrays['y'].astype(float).reshape(size, self.num_out)
+        self._raw     = {}
+        self._df      = None
+        for name, values in decode_columns(strip_prefix(arrays, 'X'), self.space).items():
+            self._append_raw(name, values, slice(0, size))
+        self.size    = size
+        self._hashes = set(self.hash_rows(self.X).tolist()) if size > 0 else set()
+
+    def _append_raw(self, name : str, values : np.ndarray, new_slice : slice):
+        if self.space.paras[name].is_categorical:
+            values = values.astype(object)
+        col = self._raw.get(name)
+        if col is None:
+            col = np.empty(self.capacity, dtype = values.dtype)
+        elif col.dtype != values.dtype:
+            try:
+                dtype = np.result_type(col.dtype, values.dtype)
+            except TypeError:
+                dtype = np.dtype(object)
+            col = col.astype(dtype)
+        col[new_slice]  = values
+        self._raw[name] = col
+
+    @staticmethod
+    def _grow(arr : np.ndarray, capacity : int) -> np.ndarray:
+        new_arr = np.empty((capacity, ) + arr.shape[1:], dtype = arr.dtype)
+        new_arr[:arr.shape[0]] = arr
+        return new_arr
@@ -0,0 +1,76 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import numpy as np
+
+class ParetoArchive:
+    """
+    Incrementally maintained set of feasible, non-dominated observations
+
+    - Targets are `num_obj` objectives to minimize followed by `num_constr`
+      constraints, a row is feasible if all its constraints are `<= 0`,
+      infeasible rows never enter the archive
+    - A row is kept unless it is strictly dominated by another feasible row,
+      identical rows are all kept, as with `pymoo`'s domination matrix
+    - Each new row is compared with the current archive only, members are
+      stored in insertion order so that `idx` stays sorted when rows are
+      added in order
+    """
+    def __init__(self, num_obj : int, num_constr : int = 0):
+        self.num_obj    = num_obj
+        self.num_constr = num_constr
+        self.idx        = np.zeros(0, dtype = int)
+        self.y          = np.zeros((0, num_obj + num_constr))
+
+    def __len__(self):
+        return self.idx.shape[0]
+
+    def update(self, y : np.ndarray, offset : int = 0):
+        """
+        Add rows `y`, whose indices in the observation history start at `offset`
+        """
+        y        = np.asarray(y, dtype = float).reshape(-1, self.num_obj + self.num_constr)
+        feasible = (y[:, self.num_obj:] <= 0).all(axis = 1)
+        cand     = np.where(feasible)[0]
+        cand     = cand[self.nondominated(y[cand, :self.num_obj])]
+        for i in cand:
+            self.insert(y[i], offset + i)
+
+    def insert(self, yi : np.ndarray, idx : int) -> bool:
+        """
+        Add one feasible row, returns whether it entered the archive
+        """
+        obj = self.y[:, :self.num_obj]
+        p   = yi[:self.num_obj]
+        if ((obj <= p).all(axis = 1) & (obj < p).any(axis = 1)).any():
+            return False
+        keep    = ~((p <= obj).all(axis = 1) & (p < obj).any(axis = 1))
+        self.idx = np.append(self.idx[keep], idx)
+        self.y   = np.vstack([self.y[keep], yi.reshape(1, -1)])
+        return True
+
+    def mask(self, n : int) -> np.ndarray:
+        """
+        Boolean mask of the archived rows among the first `n` observations
+        """
+        optimal = np.zeros(n, dtype = bool)
+        optimal[self.idx] = True
+        return optimal
+
+    @staticmethod
+    def nondominated(y_obj : np.ndarray) -> np.ndarray:
+        """
+        Boolean mask of the rows of `y_obj` not strictly dominated by another row
+        """
+        optimal = np.ones(y_obj.shape[0], dtype = bool)
+        for i in range(y_obj.shape[0]):
+            if optimal[i]:
+                dominated = (y_obj[i] <= y_obj).all(axis = 1) & (y_obj[i] < y_obj).any(axis = 1)
+                optimal  &= ~dominated
+        return optimal
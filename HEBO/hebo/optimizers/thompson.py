@@ -0,0 +1,180 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import numpy  as np
+import pandas as pd
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+
+from hebo.design_space.design_space import DesignSpace
+from hebo.models.model_factory import get_model, get_model_class
+from hebo.acquisitions.acq import SingleObjectiveAcq
+from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
+
+from .abstract_optimizer import AbstractOptimizer
+from .observation_store import ObservationStore
+from .checkpoint import with_prefix, strip_prefix, dump_object, load_object, rng_state, set_rng_state
+
+class SampledFunction(SingleObjectiveAcq):
+    """
+    A posterior function drawn by `model.sample_f()` used as acquisition
+    """
+    def __init__(self, model, f, **conf):
+        super().__init__(model, **conf)
+        self.f = f
+
+    def eval(self, x : torch.FloatTensor, xe : torch.LongTensor) -> torch.FloatTensor:
+        with torch.no_grad():
+            return self.f(x, xe)[:, :1]
+
+class ThompsonBO(AbstractOptimizer):
+    """
+    Batch Thompson sampling with models supporting `sample_f`
+
+    Each suggestion round draws one posterior function per suggestion,
+    minimizes each of them independently with the evolutionary optimizer,
+    the optimisations are run by a pool of `num_workers` threads. Ensembles
+    only draw `num_ensembles` distinct functions, they are trained with at
+    least `n_suggestions` members (each member being a draw, with its own
+    initialisation and bootstrap). The batch is filled round-robin with the
+    best not-yet-selected, unobserved individuals of each final population
+    """
+    support_parallel_opt  = True
+    support_combinatorial = True
+    support_contextual    = True
+    support_checkpoint    = True
+    def __init__(self,
+            space        : DesignSpace,
+            model_name   : str  = 'deep_ensemble',
+            rand_sample  : int  = None,
+            model_config : dict = None,
+            pop          : int  = 100,
+            iters        : int  = 100,
+            num_workers  : int  = 1,
+            acq_opt_conf : dict = None):
+        super().__init__(space)
+        self.space        = space
+        self.store        = ObservationStore(self.space, 1)
+        self.model_name   = model_name
+        self.rand_sample  = 1 + self.space.num_paras if rand_sample is None else max(2, rand_sample)
+        self.model_config = {} if model_config is None else model_config
+        self.pop          = pop
+        self.iters        = iters
+        self.num_workers  = num_workers
+        self.acq_opt_conf = {} if acq_opt_conf is None else acq_opt_conf
+        self.model        = None
+        assert get_model_class(model_name).support_ts, f'{model_name} does not support Thompson sampling'
+
+    def suggest(self, n_suggestions = 1, fix_input = None):
+        if self.store.size < self.rand_sample:
+            sample = self.space.sample(n_suggestions)
+            if fix_input is not None:
+                for k, v in fix_input.items():
+                    sample[k] = v
+            return sample
+
+        X, Xe  = self.store.transformed()
+        y      = torch.FloatTensor(self.y)
+        conf   = deepcopy(self.model_config)
+        if self.space.num_categorical > 0:
+            conf['num_uniqs'] = [len(self.space.paras[name].categories) for name in self.space.enum_names]
+        self.model = get_model(self.model_name, X.shape[1], Xe.shape[1], 1, **conf)
+        if getattr(self.model, 'num_ensembles', n_suggestions) < n_suggestions:
+            # ensembles cycle through their members, one member per suggestion
+            conf['num_ensembles'] = n_suggestions
+            self.model = get_model(self.model_name, X.shape[1], Xe.shape[1], 1, **conf)
+        self.model.fit(X, Xe, y)
+
+        funcs = [self.model.sample_f() for _ in range(n_suggestions)]
+        init  = self.store.rows([np.argmin(self.y.reshape(-1))])
+        if self.num_workers > 1 and n_suggestions > 1:
+            with ThreadPoolExecutor(max_workers = self.num_workers) as pool:
+                pops = list(pool.map(lambda f : self.optimize_one(f, init, fix_input), funcs))
+        else:
+            pops = [self.optimize_one(f, init, fix_input) for f in funcs]
+        return self.select(pops, n_suggestions, fix_input)
+
+    def optimize_one(self, f, initial_suggest : pd.DataFrame, fix_input : dict = None) -> pd.DataFrame:
+        """
+        Final population of the minimization of `f`, sorted by value
+        """
+        acq = SampledFunction(self.model, f)
+        opt = EvolutionOpt(self.space, acq, **{'pop' : self.pop, 'iters' : self.iters, **self.acq_opt_conf})
+        rec = opt.optimize(initial_suggest = initial_suggest, fix_input = fix_input, return_pop = True)
+        val = acq(*self.space.transform(rec)).numpy().reshape(-1)
+        return rec.iloc[np.argsort(val)].reset_index(drop = True)
+
+    def select(self, pops : [pd.DataFrame], n_suggestions : int, fix_input : dict = None) -> pd.DataFrame:
+        """
+        Round-robin selection over the sorted populations, duplicates and
+        observed points are skipped, random samples fill the remaining slots
+        """
+        rank = np.concatenate([np.arange(p.shape[0]) for p in pops])
+        func = np.concatenate([np.full(p.shape[0], i) for i, p in enumerate(pops)])
+        cand = pd.concat(pops, axis = 0, ignore_index = True).iloc[np.lexsort((func, rank))]
+        cand = cand[self.store.check_unique(cand)].head(n_suggestions)
+        if cand.shape[0] < n_suggestions:
+            rand_samp = self.space.sample(n_suggestions - cand.shape[0])
+            if fix_input is not None:
+                for k, v in fix_input.items():
+                    rand_samp[k] = v
+            cand = pd.concat([cand, rand_samp], axis = 0, ignore_index = True)
+        return cand.reset_index(drop = True)
+
+    def observe(self, X, y):
+        """Feed an observation back.
+
+        Parameters
+        ----------
+        X : pandas DataFrame
+            Places where the objective function has already been evaluated.
+            Each suggestion is a dictionary where each key corresponds to a
+            parameter being optimized.
+        y : array-like, shape (n,1)
+            Corresponding values where objective has been evaluated
+        """
+        valid_id = np.where(np.isfinite(y.reshape(-1)))[0].tolist()
+        XX       = X.iloc[valid_id]
+        yy       = y[valid_id].reshape(-1, 1)
+        self.store.append(XX, yy)
+
+    def get_state(self, save_model : bool = False) -> (dict, dict):
+        arrays = {
+                **with_prefix(self.store.state_dict(), 'store'),
+                **with_prefix(rng_state(), 'rng'),
+                }
+        if save_model and self.model is not None:
+            arrays['model'] = dump_object(self.model)
+        return arrays, {'num_obs' : self.store.size}
+
+    def set_state(self, arrays : dict, meta : dict):
+        self.store.load_state_dict(strip_prefix(arrays, 'store'))
+        set_rng_state(strip_prefix(arrays, 'rng'))
+        self.model = load_object(arrays['model']) if 'model' in arrays else None
+
+    @property
+    def X(self) -> pd.DataFrame:
+        return self.store.X
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.store.y
+
+    @property
+    def best_x(self) -> pd.DataFrame:
+        if self.store.size == 0:
+            raise RuntimeError('No data has been observed!')
+        return self.store.rows([np.argmin(self.y.reshape(-1))])
+
+    @property
+    def best_y(self) -> float:
+        if self.store.size == 0:
+            raise RuntimeError('No data has been observed!')
+        return self.y.min()
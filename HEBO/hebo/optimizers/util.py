@@ -7,7 +7,36 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
+import os
+import torch
+from contextlib import contextmanager
+
 from hebo.design_space.design_space import DesignSpace
+
+def get_num_threads(num_threads : int = None) -> int:
+    """
+    Torch thread budget of the optimizers, `None` reads the `HEBO_NUM_THREADS`
+    environment variable (default to 1), non-positive values use all cores
+    """
+    if num_threads is None:
+        num_threads = int(os.environ.get('HEBO_NUM_THREADS', 1))
+    if num_threads <= 0:
+        num_threads = os.cpu_count()
+    return num_threads
+
+@contextmanager
+def torch_threads(num_threads : int = None):
+    """
+    Set the number of torch intra-op threads to `get_num_threads(num_threads)`
+    within the block, the previous value is restored afterwards
+    """
+    old_threads = torch.get_num_threads()
+    torch.set_num_threads(get_num_threads(num_threads))
+    try:
+        yield
+    finally:
+        torch.set_num_threads(old_threads)
+
 def parse_space_from_bayesmark(api_config) -> DesignSpace:
     """
     Parse design space of bayesmark (https://github.com/uber/bayesmark)
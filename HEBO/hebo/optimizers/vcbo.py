@@ -11,6 +11,7 @@ import pandas as pd
 import numpy as np
 import random
 from scipy.spatial import KDTree
+from scipy.spatial.distance import cdist
 
 from pymoo.factory import get_sampling, get_crossover, get_mutation, get_algorithm
 from pymoo.operators.mixed_variable_operator import MixedVariableSampling, MixedVariableMutation, MixedVariableCrossover
@@ -25,6 +26,47 @@ from hebo.models.model_factory import get_model, model_dict
 from hebo.optimizers.abstract_optimizer import AbstractOptimizer
 
 
+def voronoi_violation(x : np.ndarray, center : np.ndarray, sites : np.ndarray, scale : float = 1.0) -> np.ndarray:
+    """
+    For each row of `x`, number of `sites` closer to it than `scale` times
+    its distance to `center`, a row is in the (scaled) Voronoi cell of
+    `center` if the count is zero
+    """
+    x  = np.atleast_2d(x)
+    ds = np.linalg.norm(x - center, axis = 1)
+    if len(sites) == 0:
+        return np.zeros(x.shape[0], dtype = int)
+    dss = cdist(x, np.atleast_2d(sites))
+    return (scale * ds[:, None] > dss).sum(axis = 1)
+
+class IncrementalKDTree:
+    """
+    KDTree over a growing set of points
+
+    Points are appended to a buffer searched by brute force, the tree is
+    only rebuilt when the buffer is as large as the indexed points, so that
+    the total rebuilding cost is O(n log n) over n insertions
+    """
+    def __init__(self, dims : int, min_leaf : int = 64):
+        self.X        = np.zeros((0, dims))
+        self.tree     = None
+        self.n_tree   = 0
+        self.min_leaf = min_leaf
+
+    def add(self, X : np.ndarray):
+        self.X = np.vstack([self.X, X])
+        if self.X.shape[0] - self.n_tree >= max(self.min_leaf, self.n_tree):
+            self.tree   = KDTree(self.X)
+            self.n_tree = self.X.shape[0]
+
+    def query_ball_point(self, x : np.ndarray, r : float) -> np.ndarray:
+        """
+        Sorted indices of the points within distance `r` of `x`
+        """
+        idx = [] if self.tree is None else self.tree.query_ball_point(x, r)
+        buf = self.n_tree + np.where(np.linalg.norm(self.X[self.n_tree:] - x, axis = 1) <= r)[0]
+        return np.sort(np.concatenate([np.asarray(idx, dtype = int), buf]))
+
 class MyProblem_gplocal(Problem):
     def __init__(self, gp_model, y_min, local_info, var_num=10, kappa=1.5, xi=1e-4,
                  lb=np.array([-1]*10), ub=np.array([1]*10), noise_level=0.0):
@@ -37,22 +79,19 @@ class MyProblem_gplocal(Problem):
         self.lb = lb
         self.ub = ub
         self.noise_level = noise_level
-        super().__init__(n_var=self.var_num, n_obj=1, n_constr=4, xl=self.lb, xu=self.ub, elementwise_evaluation=True)
+        super().__init__(n_var=self.var_num, n_obj=1, n_constr=2, xl=self.lb, xu=self.ub)
 
     def _evaluate(self, x, out, *args, **kwargs):
+        x = np.atleast_2d(x).astype('float64')
         with torch.no_grad():
-            mean, var = self.gp_model.predict(torch.FloatTensor(x.astype('float64')).reshape(1, -1), None)
+            mean, var = self.gp_model.predict(torch.FloatTensor(x), None)
             std = var.sqrt()
-        out["F"] = mean.numpy() + self.noise_level*np.random.randn() - std.numpy()
+        out["F"] = mean.numpy() + self.noise_level*np.random.randn(x.shape[0], 1) - std.numpy()
 
         # in selected voronoi cell
-        d_one = []
-        for k in self.local_info[3]:
-            ds = np.linalg.norm(x - self.local_info[4][self.local_info[0]])
-            dss = np.linalg.norm(x - self.local_info[4][k])
-            d_one.append(self.local_info[2]*ds <= dss)
-        g1       = 1.0 * len(self.local_info[3]) - sum(np.array(d_one) == 1)
-        g2       = np.linalg.norm(x - self.local_info[4][self.local_info[0]]) - self.local_info[1]
+        center   = self.local_info[4][self.local_info[0]]
+        g1       = 1.0 * voronoi_violation(x, center, self.local_info[4][self.local_info[3]], self.local_info[2])
+        g2       = np.linalg.norm(x - center, axis = 1) - self.local_info[1]
         out['G'] = np.column_stack([g1, g2])
 
 
@@ -76,6 +115,7 @@ class VCBO(AbstractOptimizer):
         self.dim_delta   = 0.3 * np.mean(self.var_ub - self.var_lb) if dim_delta is None else dim_delta
         self.X           = np.zeros((0, self.dims))
         self.Y           = []
+        self.tree        = IncrementalKDTree(self.dims)
         self.shrink      = False
 
         for k, p in self.space.paras.items():
@@ -122,22 +162,24 @@ class VCBO(AbstractOptimizer):
         Xc, _  = self.space.transform(param)
         self.X = np.vstack([self.X, Xc.numpy()])
         self.Y = self.Y + y.reshape(-1).tolist()
-
-    def random_sample(self, d_ball):
-        output_flag = 0
-        while output_flag == 0:
-            pone = self.random_state.uniform(self.random_bound_lb, self.random_bound_ub)
-            ds = np.linalg.norm(pone - self.X[self.local_constraints[0]])
-            if ds >= d_ball:
-                continue
-            d_one = []
-            for k in self.indices_nb_sites:
-                dss = np.linalg.norm(pone - self.X[k])
-                d_one.append(self.local_constraints[2] * ds <= dss)
-            if sum(np.array(d_one) == 1) < 1.0 * len(self.indices_nb_sites):
-                continue
-            output_flag = 1
-        return pone
+        self.tree.add(Xc.numpy())
+
+    def random_sample(self, d_ball, batch_size = 64, max_batch_size = 16384):
+        """
+        Rejection sampling of one point of the Voronoi cell within `d_ball`
+        of the center, candidates are drawn in batches whose size doubles
+        after each fully rejected batch
+        """
+        center = self.X[self.local_constraints[0]]
+        sites  = self.X[self.indices_nb_sites]
+        while True:
+            pts    = self.random_state.uniform(self.random_bound_lb, self.random_bound_ub, size = (batch_size, self.dims))
+            accept = np.linalg.norm(pts - center, axis = 1) < d_ball
+            if accept.any():
+                accept[accept] = voronoi_violation(pts[accept], center, sites, self.local_constraints[2]) == 0
+            if accept.any():
+                return pts[np.argmax(accept)]
+            batch_size = min(2 * batch_size, max_batch_size)
 
     def check_shrink_state(self):
         if self.shrink:
@@ -148,36 +190,27 @@ class VCBO(AbstractOptimizer):
     def construct_voronoi_cell(self, tree, ref_point, print_or_not=False):
         self.local_constraints = [ref_point, self.radius, self.scale]
         # points in radius-ball and bad nb sites
-        indices = tree.query_ball_point(self.X[self.local_constraints[0]], self.local_constraints[1])
-        dmean_ball = np.mean([np.linalg.norm(self.X[idx] - self.X[self.local_constraints[0]]) for idx in indices])
-        self.indices_nb_sites = [index for index in indices if
-                                 np.linalg.norm(self.X[index] - self.X[self.local_constraints[0]]) > dmean_ball]
+        center  = self.X[self.local_constraints[0]]
+        indices = np.asarray(tree.query_ball_point(center, self.local_constraints[1]), dtype = int)
+        dist    = np.linalg.norm(self.X[indices] - center, axis = 1)
+        is_nb   = dist > dist.mean()
+        self.indices_nb_sites = indices[is_nb].tolist()
 
         # local points in constrained area
-        self.indices_local_points = []
-        for idx in indices:
-            if idx in self.indices_nb_sites:
-                continue
-            d_one = []
-            for k in self.indices_nb_sites:
-                ds = np.linalg.norm(self.X[idx] - self.X[self.local_constraints[0]])
-                dss = np.linalg.norm(self.X[idx] - self.X[k])
-                d_one.append(ds <= dss)
-            if sum(np.array(d_one) == 1) >= 1.0 * len(self.indices_nb_sites):
-                if print_or_not:
-                    print(idx, self.Y[idx])
-                self.indices_local_points.append(idx)
+        cand     = indices[~is_nb]
+        in_cell  = voronoi_violation(self.X[cand], center, self.X[self.indices_nb_sites]) == 0
+        self.indices_local_points = cand[in_cell].tolist()
         if print_or_not:
+            for idx in self.indices_local_points:
+                print(idx, self.Y[idx])
             print(len(self.indices_local_points))
             print('-----------nb sites-------------')
             print(len(self.indices_nb_sites))
             for k in range(len(self.indices_nb_sites)):
                 print(self.indices_nb_sites[k], self.Y[self.indices_nb_sites[k]])
 
-        self.random_bound_lb = np.array([np.max([self.var_lb[idx], self.X[self.local_constraints[0]][idx] - self.dim_delta])
-                                    for idx in range(self.dims)])
-        self.random_bound_ub = np.array([np.min([self.var_ub[idx], self.X[self.local_constraints[0]][idx] + self.dim_delta])
-                                    for idx in range(self.dims)])
+        self.random_bound_lb = np.maximum(self.var_lb, center - self.dim_delta)
+        self.random_bound_ub = np.minimum(self.var_ub, center + self.dim_delta)
 
     def gpbo_in_vcell(self, gp_model, d_ball, kappa = 1.0, noise_level = 0.1):
         xi = 0.0
@@ -192,8 +225,7 @@ class VCBO(AbstractOptimizer):
         if res.X is None:
             x_opt = self.random_sample(d_ball)
         else:
-            check = np.array([int((res.X == self.X[knum]).all()) for knum in range(len(self.X))])
-            if sum(check == 1) >= 1:
+            if (self.X == np.asarray(res.X).reshape(1, -1)).all(axis = 1).any():
                 x_opt = self.random_sample(d_ball)
             else:           
                 x_opt = np.asarray(res.X).astype(float)
@@ -202,11 +234,10 @@ class VCBO(AbstractOptimizer):
     def search(self):
         # # selected best one and construct voronoi cell
         min_one = np.argmin(self.Y)
-        tree = KDTree(self.X)
         self.check_shrink_state()
-        self.construct_voronoi_cell(tree, min_one)
-        self.Xs = np.array([self.X[idx] for idx in self.indices_local_points + self.indices_nb_sites]).astype('float64')
-        self.Ys_real = np.array([self.Y[idx] for idx in self.indices_local_points + self.indices_nb_sites]).astype('float64').reshape(-1, 1)
+        self.construct_voronoi_cell(self.tree, min_one)
+        self.Xs = self.X[self.indices_local_points + self.indices_nb_sites].astype('float64')
+        self.Ys_real = np.array(self.Y)[self.indices_local_points + self.indices_nb_sites].astype('float64').reshape(-1, 1)
 
         # simple y transformation
         self.Ys = self.Ys_real.copy() - np.mean(self.Ys_real)
@@ -217,8 +248,7 @@ class VCBO(AbstractOptimizer):
         if len(self.indices_local_points) == 0:
             d_ball = self.radius / 2
         else:
-            d_max = np.max([np.linalg.norm(self.X[idx] - self.X[self.local_constraints[0]])
-                            for idx in self.indices_local_points if idx not in self.indices_nb_sites])
+            d_max = np.linalg.norm(self.X[self.indices_local_points] - self.X[self.local_constraints[0]], axis = 1).max()
             d_ball = self.radius / 2 if len(self.indices_local_points) < 10 else d_max
 
         shrink_threshold = 30
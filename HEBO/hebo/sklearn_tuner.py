@@ -7,9 +7,13 @@
 # WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
 # PARTICULAR PURPOSE. See the MIT License for more details.
 
+import time
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import cross_val_predict, KFold
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.base import is_classifier
+from sklearn.model_selection import KFold, check_cv
+from sklearn.utils import _safe_indexing
 from typing import Callable
 
 from hebo.design_space.design_space import DesignSpace
@@ -18,18 +22,87 @@ from hebo.optimizers.hebo import HEBO
 import warnings
 warnings.filterwarnings('ignore')
 
+_worker_data = {}
+
+def _init_worker(X, y, metric : Callable, sign : float):
+    """
+    Data shipped once to each worker process instead of once per trial
+    """
+    _worker_data.update(X = X, y = y, metric = metric, sign = sign)
+
+def _evaluate_worker(model_class, hyp : dict, cv, stop_folds : int, stop_score : float) -> dict:
+    d = _worker_data
+    return evaluate_cv(model_class, hyp, d['X'], d['y'], d['metric'], d['sign'], cv, stop_folds, stop_score)
+
+def evaluate_cv(
+        model_class,
+        hyp        : dict,
+        X,
+        y,
+        metric     : Callable,
+        sign       : float,
+        cv,
+        stop_folds : int   = None,
+        stop_score : float = None,
+        ) -> dict:
+    """Cross-validated score of one configuration, equivalent to
+    `metric(y, cross_val_predict(model_class(**hyp), X, y, cv = cv))`
+
+    After `stop_folds` folds, the evaluation is stopped if the (signed,
+    to be minimized) score of the out-of-fold predictions so far is worse
+    than `stop_score`
+
+    `X` and `y` can be anything `cross_val_predict` accepts (arrays,
+    DataFrames...), folds are sliced with `_safe_indexing`
+
+    Returns:
+    -------------------
+    dict with the signed score, the per-fold fitting times and whether the
+    evaluation was stopped early
+    """
+    pred       = None
+    seen       = np.zeros(len(y), dtype = bool)
+    fold_times = []
+    stopped    = False
+    splits     = list(cv.split(X, y))
+
+    def score() -> float:
+        seen_id = np.flatnonzero(seen)
+        return sign * metric(_safe_indexing(y, seen_id), pred[seen_id])
+
+    for i, (train_id, test_id) in enumerate(splits):
+        t0    = time.time()
+        model = model_class(**hyp)
+        model.fit(_safe_indexing(X, train_id), _safe_indexing(y, train_id))
+        fold_pred = np.asarray(model.predict(_safe_indexing(X, test_id)))
+        if pred is None:
+            pred = np.zeros((len(y), ) + fold_pred.shape[1:], dtype = fold_pred.dtype)
+        pred[test_id] = fold_pred
+        seen[test_id] = True
+        fold_times.append(time.time() - t0)
+        if stop_folds is not None and stop_score is not None and i + 1 == stop_folds and i + 1 < len(splits):
+            if score() > stop_score:
+                stopped = True
+                break
+    return {'score' : score(), 'fold_times' : fold_times, 'stopped' : stopped}
+
 def sklearn_tuner(
-        model_class, 
-        space_config : [dict], 
-        X : np.ndarray,
-        y : np.ndarray,
-        metric : Callable, 
-        greater_is_better : bool = True, 
+        model_class,
+        space_config : [dict],
+        X,
+        y,
+        metric : Callable,
+        greater_is_better : bool = True,
         cv       = None,
-        max_iter = 16, 
+        max_iter = 16,
         report   = False,
-        hebo_cfg = None, 
-        verbose  = True, 
+        hebo_cfg = None,
+        verbose  = True,
+        n_jobs   = 1,
+        n_suggestions = None,
+        asynchronous  = False,
+        early_stop_folds    = None,
+        early_stop_quantile = 0.5,
         ) -> (dict, pd.DataFrame):
     """Tuning sklearn estimator
 
@@ -42,10 +115,22 @@ def sklearn_tuner(
     greater_is_better: whether a larger metric value is better
     cv: the 'cv' parameter in `cross_val_predict`
     max_iter: number of trials
+    n_jobs: number of worker processes evaluating trials concurrently
+    n_suggestions: number of configurations suggested by HEBO per batch,
+        default to `n_jobs`
+    asynchronous: if True, a new configuration is suggested as soon as a
+        worker is free, otherwise batches of `n_suggestions` are evaluated
+        synchronously, suggestions duplicating a configuration still under
+        evaluation are rejected
+    early_stop_folds: stop the evaluation of a configuration after this
+        number of folds if its score is worse than the `early_stop_quantile`
+        quantile of the fully evaluated configurations
 
     Returns:
     -------------------
-    Best hyper-parameters and all visited data
+    Best hyper-parameters and all visited data, the report has one row per
+    trial (in completion order) with the per-fold fitting times and whether
+    the evaluation was stopped early, failed trials have a NaN metric
 
 
     Example:
@@ -67,27 +152,80 @@ def sklearn_tuner(
     """
     if hebo_cfg is None:
         hebo_cfg = {}
+    if n_suggestions is None:
+        n_suggestions = n_jobs
     space = DesignSpace().parse(space_config)
     opt   = HEBO(space, **hebo_cfg)
     if cv is None:
         cv = KFold(n_splits = 5, shuffle = True, random_state = 42)
-    for i in range(max_iter):
-        rec     = opt.suggest()
-        hyp     = rec.iloc[0].to_dict()
-        for k in hyp:
-            if space.paras[k].is_numeric and space.paras[k].is_discrete:
-                hyp[k] = int(hyp[k])
-        model   = model_class(**hyp)
-        pred    = cross_val_predict(model, X, y, cv = cv)
-        score_v = metric(y, pred)
-        sign    = -1. if greater_is_better else 1.0
-        opt.observe(rec, np.array([sign * score_v]))
-        if verbose:
-            print('Iter %d, best metric: %g' % (i, sign * opt.y.min()), flush = True)
+    cv    = check_cv(cv, y, classifier = is_classifier(model_class))
+    sign  = -1. if greater_is_better else 1.0
+    trials = []
+
+    def to_hyp(rec : pd.DataFrame) -> [dict]:
+        hyps = rec.to_dict('records')
+        for hyp in hyps:
+            for k in hyp:
+                if space.paras[k].is_numeric and space.paras[k].is_discrete:
+                    hyp[k] = int(hyp[k])
+        return hyps
+
+    def stop_score() -> float:
+        complete = [t['score'] for t in trials if not t['stopped'] and np.isfinite(t['score'])]
+        if early_stop_folds is None or len(complete) < 2:
+            return None
+        return np.quantile(complete, early_stop_quantile)
+
+    def finish(rec : pd.DataFrame, result : dict):
+        # NaN scores are dropped by `observe`, the report is built from `trials`
+        opt.observe(rec, np.array([result['score']]))
+        trials.append(dict(result, rec = rec))
+        if verbose and opt.y.shape[0] > 0:
+            print('Iter %d, best metric: %g' % (len(trials) - 1, sign * opt.y.min()), flush = True)
+
+    def suggest_new(num_new : int, pending : [pd.DataFrame]) -> pd.DataFrame:
+        """
+        Suggest `num_new` configurations that are not under evaluation, random
+        ones complete the batch if HEBO keeps suggesting pending configurations
+        """
+        if len(pending) == 0:
+            return opt.suggest(n_suggestions = num_new)
+        rec  = opt.suggest(n_suggestions = num_new + len(pending))
+        busy = set(opt.store.hash_rows(pd.concat(pending)).tolist())
+        keep = [h not in busy for h in opt.store.hash_rows(rec).tolist()]
+        rec  = rec[keep].iloc[:num_new]
+        if rec.shape[0] < num_new:
+            rec = pd.concat([rec, space.sample(num_new - rec.shape[0])], ignore_index = True)
+        return rec
+
+    if n_jobs <= 1:
+        while len(trials) < max_iter:
+            rec = opt.suggest(n_suggestions = min(n_suggestions, max_iter - len(trials)))
+            for i, hyp in enumerate(to_hyp(rec)):
+                finish(rec.iloc[[i]], evaluate_cv(model_class, hyp, X, y, metric, sign, cv, early_stop_folds, stop_score()))
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs, initializer = _init_worker, initargs = (X, y, metric, sign)) as pool:
+            pending   = {}
+            submitted = 0
+            while len(trials) < max_iter:
+                num_free = n_jobs - len(pending)
+                if (asynchronous or len(pending) == 0) and num_free > 0 and submitted < max_iter:
+                    num_new = min(n_suggestions if not asynchronous else num_free, max_iter - submitted)
+                    rec     = suggest_new(num_new, list(pending.values()))
+                    for i, hyp in enumerate(to_hyp(rec)):
+                        fut = pool.submit(_evaluate_worker, model_class, hyp, cv, early_stop_folds, stop_score())
+                        pending[fut] = rec.iloc[[i]]
+                    submitted += rec.shape[0]
+                done, _ = wait(list(pending), return_when = FIRST_COMPLETED)
+                for fut in done:
+                    finish(pending.pop(fut), fut.result())
+
     best_id   = np.argmin(opt.y.reshape(-1))
     best_hyp  = opt.X.iloc[best_id]
-    df_report = opt.X.copy()
-    df_report['metric'] = sign * opt.y
+    df_report = pd.concat([t['rec'] for t in trials], ignore_index = True)
+    df_report['metric']     = [sign * t['score'] for t in trials]
+    df_report['fold_times'] = [t['fold_times'] for t in trials]
+    df_report['stopped']    = [t['stopped'] for t in trials]
     if report:
         return best_hyp.to_dict(), df_report
     return best_hyp.to_dict()
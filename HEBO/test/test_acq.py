@@ -13,6 +13,7 @@ import torch
 import pytest
 
 from hebo.models.rf.rf import RF
+from hebo.models.model_factory import get_model
 from hebo.acquisitions.acq import Mean, Sigma, LCB, MOMeanSigmaLCB, MACE, GeneralAcq, SingleObjectiveAcq, NoisyAcq
 
 X = torch.randn(10, 1)
@@ -41,8 +42,18 @@ def test_mace():
     acq   = MACE(model, best_y = 0.)
     acq_v = acq(X, None)
     assert torch.isfinite(acq_v).all()
+    assert not acq_v.requires_grad
     assert acq.num_obj    == 3
     assert acq.num_constr == 0
+
+def test_mace_grad():
+    gp = get_model('gp', 1, 0, 1, num_epochs = 10)
+    gp.fit(X, None, y)
+    x   = X.clone().requires_grad_(True)
+    acq = MACE(gp, best_y = y.min())
+    acq(x, None).numpy()
+    acq.eval_grad(x, None).sum().backward()
+    assert torch.isfinite(x.grad).all()
     
 def test_general():
     acq   = GeneralAcq(model, 1, 0)
@@ -10,12 +10,15 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
 import pytest
+from pytest import approx
 
 import torch
 import numpy as np
 
 from hebo.models.base_model import BaseModel
+from hebo.design_space.design_space import DesignSpace
 from hebo.models.model_factory import get_model, get_model_class, model_dict
+from hebo.models.gp.svgp import kmeans_pp
 from .util import check_prediction
 
 
@@ -136,3 +139,116 @@ def test_fit_with_nan(model_name):
     with torch.no_grad():
         py, ps2 = model.predict(x, None)
         check_prediction(y, py, ps2)
+
+def test_gpy_warm_start():
+    Xc    = torch.randn(30, 2)
+    y     = (Xc**2).sum(dim = 1, keepdim = True) + 0.01 * torch.randn(Xc.shape[0], 1)
+    model = get_model('gpy', 2, 0, 1, warp = False, restart_every = 3)
+    for i in range(4):
+        model.fit(Xc, None, y)
+        assert model.num_fits == i + 1
+        assert np.isfinite(model.lik_per_data)
+    with torch.no_grad():
+        py, ps2 = model.predict(Xc, None)
+        check_prediction(y, py, ps2)
+
+def test_gpy_restart_every(monkeypatch):
+    import GPy
+    Xc    = torch.randn(30, 2)
+    y     = (Xc**2).sum(dim = 1, keepdim = True) + 0.01 * torch.randn(Xc.shape[0], 1)
+    model = get_model('gpy', 2, 0, 1, warp = False, restart_every = 3, restart_tol = np.inf)
+
+    num_restarts     = []
+    optimize_restart = model.optimize_restarts
+    monkeypatch.setattr(model, 'optimize_restarts', lambda : num_restarts.append(1) or optimize_restart())
+
+    starts   = []
+    optimize = GPy.models.GPRegression.optimize
+    monkeypatch.setattr(GPy.models.GPRegression, 'optimize', lambda gp, *args, **kwargs: starts.append(gp.param_array.copy()) or optimize(gp, *args, **kwargs))
+
+    # restarts at the first fit and every third refit, other refits start from the previous solution
+    for i, expected in enumerate([1, 1, 1, 2, 2]):
+        prev_params = model.gp.param_array.copy() if model.gp is not None else None
+        starts.clear()
+        model.fit(Xc, None, y)
+        assert len(num_restarts) == expected
+        if prev_params is not None:
+            assert np.array_equal(starts[0], prev_params)
+
+@pytest.mark.parametrize('warp', [True, False])
+def test_gpy_posterior_cache(warp):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 3}, 
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}])
+    X     = space.sample(30)
+    y     = torch.FloatTensor(X['x0'].values**2 + (X['x1'] == 'a').values).view(-1, 1)
+    model = get_model('gpy', 1, 1, 1, num_uniqs = [3], space = space, warp = warp)
+    model.fit(*space.transform(X), y)
+
+    Xtest   = space.sample(50)
+    py, ps2 = model.predict_mean_var(*space.transform(Xtest))
+    py_gpy, ps2_gpy = model.gp.predict(model.trans(*space.transform(Xtest)))
+    assert py.numpy()  == approx(model.yscaler.inverse_transform(torch.FloatTensor(py_gpy)).numpy(), rel = 1e-4, abs = 1e-4)
+    assert ps2.numpy() == approx((torch.FloatTensor(ps2_gpy) * model.yscaler.std**2).numpy(), rel = 1e-4, abs = 1e-4)
+
+@pytest.mark.parametrize('num_workers, executor', [(1, 'thread'), (2, 'thread'), (2, 'process')])
+def test_gpy_parallel_restarts(num_workers, executor):
+    Xc    = torch.randn(30, 2)
+    y     = (Xc**2).sum(dim = 1, keepdim = True) + 0.01 * torch.randn(Xc.shape[0], 1)
+    model = get_model('gpy', 2, 0, 1, warp = False, num_restarts = 3, num_epochs = 20, seed = 42, 
+            num_workers = num_workers, restart_executor = executor)
+    model.fit(Xc, None, y)
+    ref   = get_model('gpy', 2, 0, 1, warp = False, num_restarts = 3, num_epochs = 20, seed = 42)
+    ref.fit(Xc, None, y)
+    assert model.gp.param_array == approx(ref.gp.param_array, rel = 1e-4)
+    with torch.no_grad():
+        py, ps2 = model.predict(Xc, None)
+        check_prediction(y, py, ps2)
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_rf_leaf_table(n_jobs):
+    Xc    = torch.randn(50, 2)
+    Xe    = torch.randint(3, (50, 1))
+    y     = (Xc**2).sum(dim = 1, keepdim = True) + Xe.float()
+    model = get_model('rf', 2, 1, 1, num_uniqs = [3], n_estimators = 20, n_jobs = n_jobs)
+    model.fit(Xc, Xe, y)
+    py, ps2 = model.predict(Xc, Xe)
+    X       = model.xtrans(Xc, Xe)
+    preds   = np.vstack([est.predict(X) for est in model.rf.estimators_])
+    assert py.numpy().reshape(-1)  == approx(model.rf.predict(X), abs = 1e-5)
+    assert ps2.numpy().reshape(-1) == approx(preds.var(axis = 0) + model.noise.numpy(), abs = 1e-5)
+
+def test_kmeans_pp():
+    x   = torch.cat([torch.zeros(20, 2), torch.randn(30, 2)])
+    idx = kmeans_pp(x, 16)
+    assert len(idx) == 16
+    assert len(set(idx.tolist())) == 16
+    assert (idx < 20).sum() <= 1 # duplicated rows are selected at most once
+    assert len(kmeans_pp(torch.zeros(5, 2), 8)) == 5
+
+@pytest.mark.parametrize('warp', [True, False])
+def test_svgp_warm_start(warp):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 3}, 
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}])
+    X     = space.sample(60)
+    y     = torch.FloatTensor(X['x0'].values**2 + (X['x1'] == 'a').values).view(-1, 1)
+    model = get_model('svgp', 1, 1, 1, num_uniqs = [3], space = space, warp = warp, num_inducing = 16, num_epochs = 50, warm_epochs = 0)
+    model.fit(*space.transform(X[:50]), y[:50])
+    gp    = model.gp
+    py, ps2 = model.predict(*space.transform(X))
+
+    # the rescaled posterior is unchanged without training
+    model.fit(*space.transform(X), y)
+    assert model.gp is gp
+    assert model.num_fits == 2
+    py_warm, ps2_warm = model.predict(*space.transform(X))
+    assert py_warm.detach().numpy()  == approx(py.detach().numpy(), rel = 1e-3, abs = 1e-3)
+    assert ps2_warm.detach().numpy() == approx(ps2.detach().numpy(), rel = 1e-3, abs = 1e-3)
+
+    model.warm_epochs = 10
+    model.fit(*space.transform(X), y)
+    assert model.gp is gp
+    with torch.no_grad():
+        py, ps2 = model.predict(*space.transform(X))
+        check_prediction(y, py, ps2)
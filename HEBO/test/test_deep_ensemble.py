@@ -12,7 +12,7 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
 import pytest
 import torch
 
-from hebo.models.nn.deep_ensemble import BaseNet, DeepEnsemble
+from hebo.models.nn.deep_ensemble import BaseNet, DeepEnsemble, StackedNet
 from hebo.models.nn.fe_deep_ensemble import FeDeepEnsemble
 from hebo.models.nn.gumbel_linear import GumbelDeepEnsemble
 from .util import check_prediction
@@ -87,3 +87,37 @@ def test_verbose(capsys):
     out, err = capsys.readouterr()
     assert(out == '')
     assert(err == '')
+
+@pytest.mark.parametrize('num_enum',   [0, 2])
+@pytest.mark.parametrize('enum_trans', ['embedding', 'onehot'])
+@pytest.mark.parametrize('output_noise', [True, False])
+@pytest.mark.parametrize('rand_prior', [True, False])
+def test_stacked_net(num_enum, enum_trans, output_noise, rand_prior):
+    conf    = {'num_uniqs' : [3, 4], 'enum_trans' : enum_trans, 'output_noise' : output_noise, 'rand_prior' : rand_prior, 'num_layers' : 2}
+    members = [BaseNet(2, num_enum, 1, **conf) for _ in range(3)]
+    net     = StackedNet(members)
+    xc      = torch.randn(10, 2)
+    xe      = torch.randint(3, (10, num_enum))
+    with torch.no_grad():
+        out = net(xc, xe)
+        ref = torch.stack([m(xc, xe) for m in members])
+    assert out.shape == ref.shape
+    assert torch.allclose(out, ref, atol = 1e-5)
+
+@pytest.mark.parametrize('bootstrap',  [True, False])
+@pytest.mark.parametrize('rand_prior', [True, False])
+def test_stacked_deep_ens(bootstrap, rand_prior):
+    xc    = torch.randn(40, 1)
+    xe    = torch.randint(2, (40, 1))
+    y     = xc ** 2 + xe.float()
+    model = DeepEnsemble(1, 1, 1, num_uniqs = [2], stacked = True, bootstrap = bootstrap, rand_prior = rand_prior, num_epochs = 20)
+    model.fit(xc, xe, y)
+    assert len(model.models) == model.num_ensembles
+    with torch.no_grad():
+        py, ps2 = model.predict(xc, xe)
+        check_prediction(y, py, ps2)
+        xc_t, xe_t = model.trans(xc, xe)
+        preds      = torch.stack([m(xc_t, xe_t) for m in model.models])
+        assert torch.allclose(model.stacked_net(xc_t, xe_t), preds, atol = 1e-5)
+        f = model.sample_f()
+        assert f(xc, xe).shape == y.shape
@@ -11,6 +11,7 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
 
 import pytest
+import torch
 
 from hebo.design_space.design_space import DesignSpace
 
@@ -73,3 +74,60 @@ def test_design_space():
             samp = para.sample(5)
             x    = para.transform(samp)
             assert (x == x.round()).all()
+
+def test_transform_plan():
+    space = DesignSpace().parse(
+        [{'name' : f'num{i}',  'type' : 'num', 'lb' : -1 * i, 'ub' : i + 1} for i in range(3)] + 
+        [{'name' : f'int{i}',  'type' : 'int', 'lb' : -3 * i, 'ub' : 3 + i} for i in range(3)] + 
+        [{'name' : f'pow{i}',  'type' : 'pow', 'lb' : 1e-4, 'ub' : 1e-2, 'base' : 2 + 8 * i} for i in range(2)] + 
+        [{'name' : f'powi{i}', 'type' : 'pow_int', 'lb' : 1, 'ub' : 1000, 'base' : 2 + 8 * i} for i in range(2)] + 
+        [{'name' : f'exp{i}',  'type' : 'int_exponent', 'lb' : 2, 'ub' : 1024, 'base' : 2} for i in range(2)] + 
+        [{'name' : f'step{i}', 'type' : 'step_int', 'lb' : i, 'ub' : 9 + i, 'step' : 1 + i} for i in range(2)] + 
+        [{'name' : f'cat{i}',  'type' : 'cat', 'categories' : ['a', 'b', 'c', f'd{i}']} for i in range(3)] + 
+        [{'name' : f'bool{i}', 'type' : 'bool'} for i in range(2)]
+        )
+    samp  = space.sample(20)
+    x, xe = space.transform(samp)
+    for i, name in enumerate(space.numeric_names):
+        para = space.paras[name]
+        assert x[:, i].numpy() == pytest.approx(para.transform(samp[name].values.astype(float)), abs = 1e-6)
+    for i, name in enumerate(space.enum_names):
+        para = space.paras[name]
+        assert (xe[:, i].numpy() == para.transform(samp[name].values)).all()
+
+    rec = space.inverse_transform(x, xe)
+    for name in space.para_names:
+        if space.paras[name].is_discrete:
+            assert (rec[name].values == samp[name].values).all()
+        else:
+            assert rec[name].values.astype(float) == pytest.approx(samp[name].values.astype(float))
+
+    x_rand   = space.opt_lb[:space.num_numeric] + (space.opt_ub - space.opt_lb)[:space.num_numeric] * torch.rand(20, space.num_numeric)
+    xe_rand  = torch.randint(3, (20, space.num_categorical))
+    x_p, xe_p = space.project(x_rand, xe_rand)
+    x_t, xe_t = space.transform(space.inverse_transform(x_rand, xe_rand))
+    assert (x_p - x_t).abs().max() < 1e-5
+    assert (xe_p == xe_t).all()
+
+def test_categorical_transform_batch():
+    space = DesignSpace().parse(
+        [{'name' : f'cat{i}', 'type' : 'cat', 'categories' : ['a', 'b', 'c']} for i in range(3)] + 
+        [{'name' : 'other',   'type' : 'cat', 'categories' : ['c', 'a', 'x', 'y']}] + 
+        [{'name' : 'ints',    'type' : 'cat', 'categories' : [3, 1, 2]}]
+        )
+    paras = [space.paras[name] for name in space.para_names]
+    para_cls = type(paras[0])
+    samp  = space.sample(50)
+    xe    = para_cls.transform_batch(paras, samp[space.para_names].values)
+    for i, para in enumerate(paras):
+        assert (xe[:, i] == para.transform(samp[para.name].values)).all()
+
+    rec = para_cls.inverse_transform_batch(paras, xe)
+    for i, para in enumerate(paras):
+        assert (rec[i] == samp[para.name].values).all()
+        assert (rec[i] == para.inverse_transform(xe[:, i])).all()
+
+    bad = samp[space.para_names].values.copy()
+    bad[0, 1] = 'd'
+    with pytest.raises(KeyError):
+        para_cls.transform_batch(paras, bad)
@@ -0,0 +1,62 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import numpy  as np
+import pandas as pd
+import pytest
+from pytest import approx
+from pymoo.factory import get_performance_indicator
+
+from hebo.acquisitions.ehvi import BoxDecomposition, box_hvi, greedy_qehvi
+from hebo.design_space.design_space import DesignSpace
+from hebo.optimizers.general import GeneralBO
+
+@pytest.mark.parametrize('num_obj', [2, 3, 4])
+def test_box_hvi(num_obj):
+    front = np.random.rand(20, num_obj)
+    ref   = 1.1 * np.ones(num_obj)
+    hv    = get_performance_indicator('hv', ref_point = ref)
+    dec   = BoxDecomposition(ref, front)
+    cand  = np.vstack([np.random.rand(30, num_obj), front[:2], 2 * np.ones((1, num_obj))])
+    base  = hv.do(front)
+    hvi   = np.array([hv.do(np.vstack([front, c])) - base for c in cand])
+    assert dec.hvi(cand) == approx(hvi, abs = 1e-10)
+    assert (dec.hvi(front) == 0).all()
+
+    dec2 = dec.copy()
+    dec2.update(cand[0])
+    hvi2 = np.array([hv.do(np.vstack([front, cand[[0]], c])) - hv.do(np.vstack([front, cand[[0]]])) for c in cand])
+    assert dec2.hvi(cand) == approx(hvi2, abs = 1e-10)
+    assert dec.hvi(cand) == approx(hvi, abs = 1e-10)
+
+    stacked = box_hvi(np.stack([cand, cand]), [dec, dec2])
+    assert stacked[0] == approx(hvi, abs = 1e-10)
+    assert stacked[1] == approx(hvi2, abs = 1e-10)
+
+def test_greedy_qehvi():
+    front  = np.array([[0., 1.], [1., 0.]])
+    y_samp = np.array([[[0.5, 0.5], [0.5, 0.5], [0.2, 0.9], [2., 2.]]]).repeat(3, axis = 0)
+    select = greedy_qehvi(front, np.array([2., 2.]), y_samp, 3)
+    assert select[0] in [0, 1]
+    assert select[1] == 2
+    assert len(set(select)) == 3
+
+def test_general_ehvi():
+    def f(param : pd.DataFrame) -> np.ndarray:
+        x  = param[['x0']].values
+        return np.hstack([x**2, (x - 2)**2])
+    space = DesignSpace().parse([{'name' : 'x0', 'type' : 'num', 'lb' : -1, 'ub' : 4.0}])
+    opt   = GeneralBO(space, 2, 0, rand_sample = 4, ref_point = np.array([10., 10.]), evo_pop = 20, evo_iters = 20)
+    for _ in range(2):
+        rec = opt.suggest(4)
+        assert rec.shape[0] == 4
+        opt.observe(rec, f(rec))
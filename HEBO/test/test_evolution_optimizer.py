@@ -10,7 +10,7 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
 
-from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt
+from hebo.acq_optimizers.evolution_optimizer import EvolutionOpt, ParallelEvaluator
 from hebo.acquisitions.acq import  Acquisition 
 from hebo.design_space.design_space import DesignSpace 
 
@@ -18,6 +18,7 @@ import pytest
 from pytest import approx
 
 import torch
+import numpy as np
 
 class ToyExample(Acquisition):
     def __init__(self, constr_v = 1.0):
@@ -56,6 +57,10 @@ class ToyExampleMO(Acquisition):
         o2 = ((x-1)**2).sum(dim = 1).view(-1, 1)
         return torch.cat([o1, o2], dim = 1)
 
+class NoisyToyExample(ToyExampleMO):
+    def eval(self, x, xe):
+        return super().eval(x, xe) + torch.randn(x.shape[0], 2)
+
 @pytest.mark.parametrize('constr_v', [1.0, 100.0], ids = ['feasible', 'infeasible'])
 @pytest.mark.parametrize('sobol_init', [True, False], ids = ['sobol', 'rand'])
 def test_opt(constr_v, sobol_init):
@@ -99,3 +104,81 @@ def test_mo():
     opt = EvolutionOpt(space, acq, pop = 10)
     rec = opt.optimize()
     assert(rec.shape[0] == 10)
+
+def test_opt_fix_mixed():
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}, 
+        {'name' : 'x2', 'type' : 'int', 'lb' : -3, 'ub' : 3}, 
+        {'name' : 'x3', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}, 
+        ])
+    acq = ToyExample()
+    opt = EvolutionOpt(space, acq, pop = 10, iters = 10)
+    rec = opt.optimize(initial_suggest = space.sample(3), fix_input = {'x2' : 2, 'x3' : 'b'})
+    assert opt.res.problem.n_var == 1
+    assert (rec['x2'] == 2).all()
+    assert (rec['x3'] == 'b').all()
+    assert rec['x1'].abs().max() <= 3.0
+
+    rec = opt.optimize(fix_input = {'x1' : 0.5, 'x2' : 2, 'x3' : 'b'})
+    assert rec.shape[0] == 1
+    assert rec['x1'].values == approx(0.5)
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_evaluator(executor):
+    acq = ToyExample()
+    x   = torch.randn(100, 2)
+    xe  = torch.zeros(100, 0).long()
+    with ParallelEvaluator(acq, num_workers = 3, executor = executor) as evaluator:
+        out = evaluator(x, xe)
+        assert out.shape == (100, 2)
+        assert out == approx(acq(x, xe).numpy())
+        assert evaluator(x[:5], xe[:5]) == approx(acq(x[:5], xe[:5]).numpy())
+    assert evaluator.pool is None
+
+def test_parallel_evaluator_seed():
+    acq = NoisyToyExample()
+    x   = torch.randn(100, 2)
+    xe  = torch.zeros(100, 0).long()
+    out = []
+    for _ in range(2):
+        torch.manual_seed(0)
+        with ParallelEvaluator(acq, num_workers = 3, executor = 'process') as evaluator:
+            out.append(np.concatenate([evaluator(x, xe), evaluator(x, xe)]))
+    assert (out[0] == out[1]).all()
+    assert not (out[0][:100] == out[0][100:]).all()
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_opt_parallel(executor):
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}
+        ])
+    acq   = ToyExample()
+    opt   = EvolutionOpt(space, acq, pop = 40, iters = 20, num_workers = 2, executor = executor)
+    rec   = opt.optimize()
+    assert(approx(1.0, 1e-2) == acq(*space.transform(rec))[:, 0].squeeze().item())
+
+@pytest.mark.parametrize('acq_cls', [ToyExample, ToyExampleMO], ids = ['so', 'mo'])
+def test_early_stop(acq_cls):
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0},
+        {'name' : 'x2', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}
+        ])
+    opt = EvolutionOpt(space, acq_cls(), pop = 20, iters = 500, early_stop = True)
+    rec = opt.optimize()
+    assert opt.stats['reason'] in ['stagnation', 'hv', 'diversity']
+    assert opt.stats['n_gen'] < 500
+    assert opt.stats['n_eval'] <= 20 * opt.stats['n_gen']
+
+    opt = EvolutionOpt(space, acq_cls(), pop = 20, iters = 10)
+    rec = opt.optimize()
+    assert opt.stats['reason'] == 'max_gen'
+    assert opt.stats['n_gen'] == 10
+
+def test_max_time():
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}
+        ])
+    opt = EvolutionOpt(space, ToyExample(), pop = 10, iters = 10**6, max_time = 0.2)
+    rec = opt.optimize()
+    assert opt.stats['reason'] == 'max_time'
+    assert opt.stats['time'] < 5
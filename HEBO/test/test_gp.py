@@ -55,3 +55,36 @@ def test_verbose(capsys):
     out, err = capsys.readouterr()
     assert(out == '')
     assert(err == '')
+
+@pytest.mark.parametrize('pred_likeli', [True, False])
+def test_posterior_cache(pred_likeli):
+    X = torch.randn(20, 3)
+    y = (X**2).sum(dim = 1).view(-1, 1) + 0.01 * torch.randn(20, 1)
+    model = GP(3, 0, 1, num_epochs = 10, pred_likeli = pred_likeli)
+    model.fit(X, None, y)
+
+    Xtest  = torch.randn(50, 3)
+    py, ps2 = model.predict_mean_var(Xtest, None)
+    Xc, Xe = model.xtrans(Xtest, None)
+    with torch.no_grad():
+        pred = model.gp(Xc, Xe)
+        if pred_likeli:
+            pred = model.lik(pred)
+    assert py.detach().numpy()  == approx(model.yscaler.inverse_transform(pred.mean.view(-1, 1)).numpy(), abs = 1e-3)
+    assert ps2.detach().numpy() == approx((pred.variance.view(-1, 1) * model.yscaler.std**2).numpy(), abs = 1e-3)
+
+    Xtest.requires_grad = True
+    py, ps2 = model.predict_mean_var(Xtest, None)
+    (py - ps2.sqrt()).sum().backward()
+    assert torch.isfinite(Xtest.grad).all()
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_restarts(num_workers):
+    X = torch.randn(20, 3)
+    y = (X**2).sum(dim = 1).view(-1, 1) + 0.01 * torch.randn(20, 1)
+    model = GP(3, 0, 1, num_epochs = 20, num_restarts = 4, num_workers = num_workers, probe_epochs = 5, abandon_tol = 0., seed = 0)
+    model.fit(X, None, y)
+    with torch.no_grad():
+        py, ps2 = model.predict(X, None)
+    assert torch.isfinite(py).all()
+    assert (ps2 > 0).all()
@@ -0,0 +1,132 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+from hebo.acq_optimizers.gradient_optimizer import GradientOpt
+from hebo.acquisitions.acq import  Acquisition 
+from hebo.design_space.design_space import DesignSpace 
+
+import pytest
+from pytest import approx
+
+import torch
+
+class ToyExample(Acquisition):
+    def __init__(self, constr_v = 1.0):
+        super().__init__(None)
+        self.constr_v = constr_v
+    
+    @property
+    def num_obj(self):
+        return 1
+
+    @property
+    def num_constr(self):
+        return 1
+
+    def eval(self, x, xe):
+        # minimize L2norm(x) + xe s.t. L2norm(x) > constr_v
+        out    = (x**2).sum(dim = 1).view(-1, 1)
+        constr = self.constr_v - out  
+        if xe.shape[1] > 0:
+            out = out + xe.sum(dim = 1).view(-1, 1)
+        return torch.cat([out, constr], dim = 1)
+
+class ToyExampleMO(Acquisition):
+    def __init__(self):
+        super().__init__(None)
+    
+    @property
+    def num_obj(self):
+        return 2
+
+    @property
+    def num_constr(self):
+        return 0
+
+    def eval(self, x, xe):
+        o1 = (x**2).sum(dim = 1).view(-1, 1)
+        o2 = ((x-1)**2).sum(dim = 1).view(-1, 1)
+        return torch.cat([o1, o2], dim = 1)
+
+class LinearExample(Acquisition):
+    def __init__(self):
+        super().__init__(None)
+
+    @property
+    def num_obj(self):
+        return 1
+
+    @property
+    def num_constr(self):
+        return 0
+
+    def eval(self, x, xe):
+        # unbounded below, the optimum is on the bounds of the space
+        return -1 * x.sum(dim = 1).view(-1, 1)
+
+@pytest.mark.parametrize('optimizer', ['adam', 'lbfgs'])
+def test_opt(optimizer):
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}
+        ])
+    acq   = ToyExample()
+    opt   = GradientOpt(space, acq, n_starts = 10, iters = 50, optimizer = optimizer)
+    rec   = opt.optimize(initial_suggest = space.sample(3))
+    assert rec.shape[0] == 1
+    assert(approx(1.0, 1e-2) == acq(*space.transform(rec))[:, 0].squeeze().item())
+
+    space = DesignSpace().parse([
+        {'name' : 'a', 'type' : 'num', 'lb' : 0.0,  'ub' : 1.0},
+        {'name' : 'b', 'type' : 'num', 'lb' : -2.0, 'ub' : 3.0}
+        ])
+    opt = GradientOpt(space, LinearExample(), n_starts = 10, iters = 50, optimizer = optimizer)
+    rec = opt.optimize(return_pop = True)
+    assert ((rec['a'] >= 0.0) & (rec['a'] <= 1.0)).all()
+    assert ((rec['b'] >= -2.0) & (rec['b'] <= 3.0)).all()
+    assert rec['a'].max() == approx(1.0, 1e-3)
+    assert rec['b'].max() == approx(3.0, 1e-3)
+
+def test_opt_mixed():
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}, 
+        {'name' : 'x2', 'type' : 'int', 'lb' : -3, 'ub' : 3}, 
+        {'name' : 'x3', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}, 
+        ])
+    acq = ToyExample(constr_v = 4.0)
+    opt = GradientOpt(space, acq, n_starts = 10, iters = 50)
+    rec = opt.optimize()
+    assert (rec['x3'] == 'a').all()
+    assert(approx(4.0, 1e-2) == acq(*space.transform(rec))[:, 0].squeeze().item())
+
+def test_opt_fix():
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}, 
+        {'name' : 'x2', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}, 
+        {'name' : 'x3', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}, 
+        ])
+    acq = ToyExample()
+    opt = GradientOpt(space, acq, n_starts = 10, iters = 10)
+    rec = opt.optimize(fix_input = {'x1' : 1.0, 'x3' : 'b'})
+    assert (rec['x1'].values == approx(1.0, 1e-3))
+    assert (rec['x3'] == 'b').all()
+
+def test_mo():
+    space = DesignSpace().parse([
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3.0, 'ub' : 3.0}, 
+        {'name' : 'x2', 'type' : 'int', 'lb' : -3, 'ub' : 3}
+        ])
+    acq = ToyExampleMO()
+    opt = GradientOpt(space, acq, n_starts = 10, iters = 50)
+    rec = opt.optimize()
+    assert 1 <= rec.shape[0] <= 10
+    assert opt.optimize(return_pop = True).shape[0] == 10
+    assert rec['x1'].between(-0.2, 1.2).all()
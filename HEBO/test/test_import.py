@@ -0,0 +1,58 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+import subprocess
+import pytest
+
+from hebo.models.base_model import BaseModel
+from hebo.models.model_factory import get_model, get_model_class, model_dict
+
+heavy_modules = ['GPy', 'gpytorch', 'pymoo', 'catboost']
+
+def import_time(stmt : str) -> (float, set):
+    """
+    Wall time of `stmt` in a fresh interpreter and the modules it imported
+    """
+    code = 'import sys, time; t0 = time.time(); %s; print(time.time() - t0); print(",".join(sys.modules))' % stmt
+    out  = subprocess.run([sys.executable, '-c', code], cwd = os.path.abspath(os.path.dirname(__file__)) + '/../',
+            capture_output = True, text = True, check = True).stdout.strip().split('\n')
+    return float(out[-2]), set(m.split('.')[0] for m in out[-1].split(','))
+
+@pytest.mark.parametrize('stmt', [
+    'import hebo',
+    'from hebo.optimizers.hebo import HEBO',
+    'from hebo.models.model_factory import get_model; get_model("rf", 1, 0, 1)',
+    ])
+def test_lazy_import(stmt):
+    t, modules = import_time(stmt)
+    print('%s: %.2fs' % (stmt, t))
+    assert not modules.intersection(heavy_modules)
+
+def test_import_time():
+    stmt   = 'from hebo.optimizers.hebo import HEBO'
+    eager  = stmt + '; from hebo.models.model_factory import get_model_class, model_names; [get_model_class(n) for n in model_names]; import hebo.acq_optimizers.pymoo_problem'
+    t_lazy, _  = import_time(stmt)
+    t_eager, _ = import_time(eager)
+    print('HEBO import: %.2fs, with every model and pymoo: %.2fs' % (t_lazy, t_eager))
+    assert t_lazy < t_eager
+
+def test_model_registry():
+    assert all(issubclass(get_model_class(name), BaseModel) for name in model_dict)
+    class MyModel(BaseModel):
+        def fit(self, Xc, Xe, y):
+            pass
+        def predict(self, Xc, Xe):
+            pass
+    model_dict['my_model'] = MyModel
+    try:
+        assert isinstance(get_model('my_model', 1, 0, 1), MyModel)
+    finally:
+        del model_dict['my_model']
@@ -0,0 +1,69 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import pytest
+import numpy  as np
+import pandas as pd
+
+from hebo.design_space.design_space import DesignSpace
+from hebo.optimizers.observation_store import ObservationStore
+
+@pytest.fixture
+def space():
+    return DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'int', 'lb' : 0, 'ub' : 5},
+        {'name' : 'x2', 'type' : 'pow', 'lb' : 1e-4, 'ub' : 1e-2},
+        {'name' : 'x3', 'type' : 'cat', 'categories' : ['a', 'b', 'c']},
+        {'name' : 'x4', 'type' : 'bool'},
+        ])
+
+def test_append(space):
+    store = ObservationStore(space, 2, capacity = 3)
+    X_all = []
+    for _ in range(5):
+        X = space.sample(4)
+        store.append(X, np.random.randn(4, 2))
+        X_all.append(X)
+    X_all = pd.concat(X_all, ignore_index = True)
+    assert len(store) == 20
+    assert store.capacity >= 20
+    assert store.y.shape == (20, 2)
+    y = store.y
+    y[:] = np.nan
+    assert np.isfinite(store.y).all()
+    assert (store.X.values == X_all.values).all()
+    assert (store.rows([3, 7]).values == X_all.iloc[[3, 7]].values).all()
+
+    xc, xe   = store.transformed()
+    xc_, xe_ = space.transform(X_all)
+    assert (xc == xc_).all()
+    assert (xe == xe_).all()
+
+def test_empty(space):
+    store = ObservationStore(space)
+    assert store.X.shape == (0, space.num_paras)
+    assert store.y.shape == (0, 1)
+    xc, xe = store.transformed()
+    assert xc.shape == (0, space.num_numeric)
+    assert xe.shape == (0, space.num_categorical)
+
+def test_check_unique(space):
+    store = ObservationStore(space)
+    X     = space.sample(10)
+    store.append(X, np.random.randn(10, 1))
+
+    rec    = pd.concat([space.sample(3), X.iloc[[2, 5]], space.sample(1)], ignore_index = True)
+    rec    = pd.concat([rec, rec.iloc[[0]]], ignore_index = True)
+    expect = (~pd.concat([X, rec], axis = 0).duplicated().tail(rec.shape[0]).values).tolist()
+    assert store.check_unique(rec) == expect
+    assert store.check_unique(rec) == [True, True, True, False, False, True, False]
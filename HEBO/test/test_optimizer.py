@@ -14,6 +14,7 @@ import pytest
 
 import numpy as np
 import pandas as pd
+import torch
 
 from hebo.optimizers.noisy_opt import NoisyOpt
 from hebo.optimizers.hebo import HEBO
@@ -23,6 +24,7 @@ from hebo.optimizers.general import GeneralBO
 from hebo.optimizers.evolution import Evolution
 from hebo.optimizers.hebo_contextual import HEBO_VectorContextual
 from hebo.optimizers.cmaes import CMAES
+from hebo.optimizers.thompson import ThompsonBO
 from hebo.optimizers.util import parse_space_from_bayesmark
 
 from hebo.design_space.design_space      import DesignSpace
@@ -68,6 +70,18 @@ def test_vcbo():
         if num_suggest > 11:
             break
 
+def test_vcbo_observe():
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        ])
+    opt = VCBO(space, rand_sample = 8)
+    for i in range(12):
+        rec = opt.suggest()
+        assert rec.shape == (1, 2)
+        opt.observe(rec, (rec.values**2).sum(axis = 1))
+    assert opt.tree.query_ball_point(opt.X[0], 3.).tolist() == np.where(np.linalg.norm(opt.X - opt.X[0], axis = 1) <= 3.)[0].tolist()
+
 @pytest.mark.parametrize('start_from_mu', [True, False])
 def test_cmaes(start_from_mu):
     space = DesignSpace().parse([
@@ -89,6 +103,28 @@ def test_cmaes(start_from_mu):
     assert (opt.p_c.norm() == 0)
     assert ((mu_old - opt.mu).norm() == 0) == start_from_mu
 
+@pytest.mark.parametrize('sep', [True, False])
+def test_cmaes_sep(sep):
+    space = DesignSpace().parse([{'name' : 'x%d' % i, 'type' : 'num', 'lb' : -3, 'ub' : 7} for i in range(4)])
+    opt   = CMAES(space, sep = sep)
+    for i in range(5):
+        rec = opt.suggest()
+        assert ((rec.values >= -3) & (rec.values <= 7)).all()
+        opt.observe(rec, (rec.values**2).sum(axis = 1, keepdims = True))
+    assert opt.C.shape == ((4, ) if sep else (4, 4))
+    assert opt.C_diag.shape == (4, )
+    assert torch.isfinite(opt.C).all()
+
+def test_cmaes_reflect():
+    lb     = torch.tensor([-1., 0., 2.])
+    ub     = torch.tensor([1., 5., 2.])
+    sample = 20 * torch.randn(100, 3)
+    refl   = CMAES.reflect(sample.clone(), lb, ub)
+    assert ((refl >= lb) & (refl <= ub)).all()
+    inner  = (sample[:, :2] >= lb[:2]) & (sample[:, :2] <= ub[:2])
+    assert (refl[:, :2][inner] == sample[:, :2][inner]).all()
+    assert CMAES.reflect(torch.tensor([[1.5, -1., 2.], [-4.5, 12., 0.]]), lb, ub).tolist() == [[0.5, 1., 2.], [-0.5, 2., 2.]]
+
 @pytest.mark.parametrize('opt_cls', [BO, HEBO, GeneralBO, Evolution], ids = ['bo', 'hebo', 'general', 'evolution'])
 def test_contextual_opt(opt_cls):
     space = DesignSpace().parse([
@@ -179,7 +215,7 @@ def test_int_exponent():
     rec   = opt.suggest(100)
     assert np.all(np.log2(rec.values) == np.log2(rec.values).round())
 
-@pytest.mark.parametrize('opt_cls', [BO, HEBO, CMAES, Evolution], ids = ['bo', 'hebo', 'cmaes', 'evolution'])
+@pytest.mark.parametrize('opt_cls', [BO, HEBO, CMAES, Evolution, ThompsonBO], ids = ['bo', 'hebo', 'cmaes', 'evolution', 'ts'])
 def test_best_xy(opt_cls):
     space = DesignSpace().parse([{'name' : 'x', 'type' : 'num', 'lb' : 0, 'ub' : 1}])
     opt   = opt_cls(space, rand_sample = 100)
@@ -195,3 +231,161 @@ def test_best_xy(opt_cls):
 
     assert isinstance(opt.best_x, pd.DataFrame)
     assert isinstance(opt.best_y, float) or isinstance(opt.best_y, np.ndarray)
+
+@pytest.mark.parametrize('model_name', ['gpy', 'rf'])
+def test_hebo_warm_start(model_name):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}
+        ])
+    opt    = HEBO(space, rand_sample = 4, model_name = model_name, warm_start = True)
+    models = []
+    for i in range(7):
+        rec = opt.suggest(n_suggestions = 2)
+        opt.observe(rec, obj(rec))
+        if opt.model is not None:
+            models.append(opt.model)
+    assert opt.warm_start == opt.model.support_warm_start
+    assert len(models) > 1
+    assert all(m is models[0] for m in models) == opt.warm_start
+
+@pytest.mark.parametrize('model_name', ['gp', 'rf'])
+def test_hebo_grad_acq_opt(model_name):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}
+        ])
+    opt = HEBO(space, rand_sample = 4, model_name = model_name, acq_opt = 'grad')
+    for i in range(6):
+        rec = opt.suggest(n_suggestions = 2)
+        assert rec.shape[0] == 2
+        assert rec['x0'].between(-3, 7).all()
+        opt.observe(rec, obj(rec))
+
+def test_hebo_thread_budget():
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}
+        ])
+    num_threads = torch.get_num_threads()
+    opt = HEBO(space, rand_sample = 4, model_name = 'rf', num_threads = 1, eval_workers = 2)
+    for i in range(3):
+        rec = opt.suggest(n_suggestions = 2)
+        opt.observe(rec, obj(rec))
+    assert torch.get_num_threads() == num_threads
+
+@pytest.mark.parametrize('opt_cls', [HEBO, GeneralBO], ids = ['hebo', 'general'])
+def test_acq_opt_early_stop(opt_cls):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        ])
+    opt = opt_cls(space, rand_sample = 4, model_name = 'rf', acq_opt_conf = {'early_stop' : True, 'max_time' : 10})
+    for i in range(6):
+        rec = opt.suggest(n_suggestions = 1)
+        opt.observe(rec, obj(rec))
+    assert opt.acq_opt_stats['reason'] in ['max_gen', 'max_time', 'stagnation', 'hv', 'diversity']
+    assert opt.acq_opt_stats['n_eval'] > 0
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_thompson(num_workers):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}
+        ])
+    opt = ThompsonBO(space, rand_sample = 4, model_config = {'num_epochs' : 10, 'num_ensembles' : 2}, pop = 20, iters = 10, num_workers = num_workers)
+    for i in range(2):
+        rec = opt.suggest(n_suggestions = 8)
+        assert rec.shape[0] == 8
+        assert not rec.duplicated().any()
+        opt.observe(rec, obj(rec))
+
+    # one ensemble member, i.e., one posterior draw, per suggestion
+    assert opt.model.num_ensembles == 8
+    funcs = []
+    optimize_one = opt.optimize_one
+    opt.optimize_one = lambda f, *args : funcs.append(f) or optimize_one(f, *args)
+    opt.suggest(n_suggestions = 3)
+    assert opt.model.num_ensembles == 3
+    assert len(funcs) == 3
+    opt.suggest(n_suggestions = 1)
+    assert opt.model.num_ensembles == 2
+    assert len(funcs) == 4
+    assert np.all(opt.store.check_unique(opt.suggest(n_suggestions = 8)))
+    with pytest.raises(AssertionError):
+        ThompsonBO(space, model_name = 'rf')
+
+def test_hebo_sparse_switch():
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'cat', 'categories' : ['a', 'b', 'c']}
+        ])
+    opt    = HEBO(space, rand_sample = 4, model_name = 'gp', sparse_threshold = 8, model_config = {'num_epochs' : 10})
+    models = []
+    for i in range(6):
+        rec = opt.suggest(n_suggestions = 2)
+        opt.observe(rec, obj(rec))
+        if opt.model is not None:
+            models.append(opt.model)
+    assert opt.surrogate_name == 'svgp'
+    assert type(models[0]).__name__ == 'GP'
+    assert type(models[-1]).__name__ == 'SVGP'
+    assert models[-1] is models[-2]
+    assert models[-1].num_fits == 2
+
+@pytest.mark.parametrize('opt_cls', [HEBO, GeneralBO, CMAES, Evolution, BO, ThompsonBO], ids = ['hebo', 'general', 'cmaes', 'evolution', 'bo', 'thompson'])
+def test_save_load_state(opt_cls, tmp_path):
+    space = DesignSpace().parse([
+        {'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7},
+        {'name' : 'x1', 'type' : 'int', 'lb' : 0, 'ub' : 5},
+        {'name' : 'x2', 'type' : 'cat', 'categories' : ['a', 'b', 'c']},
+        {'name' : 'x3', 'type' : 'bool'}
+        ])
+    def make():
+        if opt_cls is HEBO:
+            return HEBO(space, rand_sample = 4, model_name = 'rf', acq_opt_conf = {'iters' : 10})
+        if opt_cls is GeneralBO:
+            return GeneralBO(space, rand_sample = 4, model_name = 'rf', evo_iters = 10)
+        if opt_cls is Evolution:
+            return Evolution(space, pop_size = 4)
+        if opt_cls is BO:
+            return BO(space, rand_sample = 4, model_name = 'rf')
+        if opt_cls is ThompsonBO:
+            return ThompsonBO(space, rand_sample = 4, model_config = {'num_epochs' : 10}, pop = 20, iters = 10)
+        return opt_cls(space)
+    n_suggestions = 1 if opt_cls in [CMAES, Evolution, BO] else 4
+    opt = make()
+    for i in range(3):
+        rec = opt.suggest(n_suggestions = n_suggestions) if n_suggestions > 1 else opt.suggest()
+        opt.observe(rec, obj(rec))
+    path = str(tmp_path / 'state.npz')
+    opt.save_state(path, save_model = True)
+    rec1 = opt.suggest(n_suggestions = n_suggestions) if n_suggestions > 1 else opt.suggest()
+
+    restored = make()
+    restored.load_state(path)
+    if opt_cls is ThompsonBO:
+        assert type(restored.model) is type(opt.model)
+    rec2 = restored.suggest(n_suggestions = n_suggestions) if n_suggestions > 1 else restored.suggest()
+    if opt_cls is not ThompsonBO:
+        # deep ensembles reseed torch at each fit, their suggestions are not reproducible
+        assert (rec1.values == rec2.values).all()
+    assert (opt.best_x.values == restored.best_x.values).all()
+    assert np.all(opt.best_y == restored.best_y)
+    if hasattr(opt, 'store'):
+        pd.testing.assert_frame_equal(opt.X, restored.X)
+        assert (opt.y == restored.y).all()
+        assert not any(restored.store.check_unique(opt.X))
+
+    with pytest.raises(RuntimeError):
+        (CMAES if opt_cls is BO else BO)(space).load_state(path)
+
+def test_checkpoint_not_supported(tmp_path):
+    space = DesignSpace().parse([{'name' : 'x0', 'type' : 'num', 'lb' : -3, 'ub' : 7}])
+    path  = str(tmp_path / 'state.npz')
+    opt   = VCBO(space)
+    assert not opt.support_checkpoint
+    with pytest.raises(NotImplementedError):
+        opt.save_state(path)
+    assert not os.path.exists(path)
+    with pytest.raises(NotImplementedError):
+        opt.load_state(path)
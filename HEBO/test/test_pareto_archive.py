@@ -0,0 +1,59 @@
+# Copyright (C) 2020. Huawei Technologies Co., Ltd. All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the MIT license.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the MIT License for more details.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
+
+import pytest
+import numpy  as np
+import pandas as pd
+from pymoo.util.dominator import Dominator
+
+from hebo.design_space.design_space import DesignSpace
+from hebo.optimizers.pareto_archive import ParetoArchive
+from hebo.optimizers.general import GeneralBO
+
+def reference_mask(y : np.ndarray, num_obj : int) -> np.ndarray:
+    feasible = (y[:, num_obj:] <= 0).all(axis = 1)
+    optimal  = np.zeros(y.shape[0], dtype = bool)
+    if feasible.any():
+        dom_mat = Dominator().calc_domination_matrix(y[feasible, :num_obj], None)
+        optimal[np.where(feasible)[0][(dom_mat >= 0).all(axis = 1)]] = True
+    return optimal
+
+@pytest.mark.parametrize('num_obj',    [2, 3])
+@pytest.mark.parametrize('num_constr', [0, 1])
+def test_archive(num_obj, num_constr):
+    y       = np.random.randn(200, num_obj + num_constr).round(1)
+    y[-5:]  = y[:5]
+    archive = ParetoArchive(num_obj, num_constr)
+    for i in range(0, 200, 7):
+        archive.update(y[i:i+7], offset = i)
+    ref = reference_mask(y, num_obj)
+    assert (archive.mask(200) == ref).all()
+    assert (archive.idx == np.where(ref)[0]).all()
+    assert (archive.y == y[ref]).all()
+    assert (ParetoArchive.nondominated(y[:, :num_obj]) == reference_mask(y[:, :num_obj], num_obj)).all()
+
+def test_archive_infeasible():
+    archive = ParetoArchive(2, 1)
+    archive.update(np.array([[0., 0., 1.], [1., 1., 2.]]))
+    assert len(archive) == 0
+    assert archive.y.shape == (0, 3)
+
+def test_general_best_xy():
+    space = DesignSpace().parse([{'name' : 'x0', 'type' : 'num', 'lb' : -1, 'ub' : 4.0}])
+    opt   = GeneralBO(space, 2, 1, rand_sample = 10)
+    X     = pd.DataFrame({'x0' : [0., 1., 2., 3.]})
+    y     = np.array([[0., 3., 1.], [1., 2., -1.], [2., 1., -1.], [3., 3., -1.]])
+    opt.observe(X, y)
+    assert (opt.best_y == y[[1, 2]]).all()
+    assert (opt.best_x['x0'].values == [1., 2.]).all()
+    assert (opt.get_pf(y, return_optimal = True) == [False, True, True, False]).all()
+    assert (opt.get_pf(y) == opt.best_y).all()
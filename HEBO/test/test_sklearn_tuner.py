@@ -10,11 +10,16 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.dirname(__file__)) + '/../')
 import pytest
+import numpy  as np
+import pandas as pd
 
 from sklearn.datasets import load_boston
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
 from sklearn.metrics import r2_score
-from hebo.sklearn_tuner import sklearn_tuner
+from sklearn.model_selection import KFold, cross_val_predict
+from pytest import approx
+from hebo.sklearn_tuner import sklearn_tuner, evaluate_cv
 
 
 @pytest.mark.parametrize('report', [True, False], ids = ['report', 'no-report'])
@@ -28,3 +33,54 @@ def test_sklearn_tuner(report):
             ]
     X, y = load_boston(return_X_y = True)
     _    = sklearn_tuner(RandomForestRegressor, space_cfg, X, y, metric = r2_score, max_iter = 1, report = report)
+
+def test_evaluate_cv():
+    X, y = load_boston(return_X_y = True)
+    cv   = KFold(n_splits = 5, shuffle = True, random_state = 42)
+    hyp  = {'max_depth' : 3, 'random_state' : 0}
+    res  = evaluate_cv(DecisionTreeRegressor, hyp, X, y, r2_score, -1., cv)
+    pred = cross_val_predict(DecisionTreeRegressor(**hyp), X, y, cv = cv)
+    assert res['score'] == approx(-1 * r2_score(y, pred))
+    assert len(res['fold_times']) == 5
+    assert not res['stopped']
+
+    res  = evaluate_cv(DecisionTreeRegressor, hyp, X, y, r2_score, -1., cv, stop_folds = 2, stop_score = -1.)
+    assert res['stopped']
+    assert len(res['fold_times']) == 2
+
+@pytest.mark.parametrize('asynchronous', [True, False], ids = ['async', 'sync'])
+def test_sklearn_tuner_parallel(asynchronous):
+    space_cfg = [
+            {'name' : 'max_depth',        'type' : 'int', 'lb' : 1, 'ub' : 10},
+            {'name' : 'min_samples_leaf', 'type' : 'num', 'lb' : 1e-4, 'ub' : 0.5},
+            ]
+    X, y      = load_boston(return_X_y = True)
+    _, report = sklearn_tuner(DecisionTreeRegressor, space_cfg, X, y, metric = r2_score, max_iter = 6, report = True, 
+            n_jobs = 2, asynchronous = asynchronous, early_stop_folds = 2, hebo_cfg = {'rand_sample' : 4}, verbose = False)
+    assert report.shape[0] == 6
+    assert report['fold_times'].apply(len).isin([2, 5]).all()
+    assert (report['fold_times'].apply(len) == 2).equals(report['stopped'])
+
+class FrameTree(DecisionTreeRegressor):
+    def fit(self, X, y):
+        assert isinstance(X, pd.DataFrame)
+        return super().fit(X, y)
+
+def test_evaluate_cv_dataframe():
+    X, y = load_boston(return_X_y = True)
+    cv   = KFold(n_splits = 5, shuffle = True, random_state = 42)
+    hyp  = {'max_depth' : 3, 'random_state' : 0}
+    res  = evaluate_cv(DecisionTreeRegressor, hyp, X, y, r2_score, -1., cv)
+    res_ = evaluate_cv(FrameTree, hyp, pd.DataFrame(X).add_prefix('x'), pd.Series(y), r2_score, -1., cv)
+    assert res_['score'] == approx(res['score'])
+
+def test_sklearn_tuner_nan_score():
+    space_cfg = [{'name' : 'max_depth', 'type' : 'int', 'lb' : 1, 'ub' : 10}]
+    calls     = []
+    def metric(y, pred):
+        calls.append(1)
+        return np.nan if len(calls) % 2 else r2_score(y, pred)
+    X, y      = load_boston(return_X_y = True)
+    _, report = sklearn_tuner(DecisionTreeRegressor, space_cfg, X, y, metric = metric, max_iter = 4, report = True, verbose = False)
+    assert report.shape[0] == 4
+    assert report['metric'].isna().sum() == 2